@@ -0,0 +1,253 @@
+"""
+Нагрузочный стенд для конкурентных пополнений и списаний баланса.
+
+Запуск против локального PostgreSQL (параметры подключения берутся из тех же переменных
+окружения, что и у сервиса):
+
+    python -m benchmark.balance_contention --clients 200 --organizations 1 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from opentelemetry import metrics, trace
+
+from infrastructure.pg.pg import PG
+from internal import interface, model
+from internal.config.config import Config
+from internal.repo.organization.repo import OrganizationRepo
+from internal.service.organization.debit_coalescer import DebitCoalescer
+from internal.service.organization.service import OrganizationService
+
+
+class _BenchmarkLogger(interface.IOtelLogger):
+    def debug(self, message: str, fields: dict = None) -> None:
+        pass
+
+    def info(self, message: str, fields: dict = None) -> None:
+        pass
+
+    def warning(self, message: str, fields: dict = None) -> None:
+        pass
+
+    def error(self, message: str, fields: dict = None) -> None:
+        print(f"ERROR: {message}", flush=True)
+
+
+class _BenchmarkTelemetry(interface.ITelemetry):
+    # Без настроенных провайдеров OpenTelemetry отдает no-op tracer и meter,
+    # поэтому стенду не нужен коллектор
+    def __init__(self):
+        self._logger = _BenchmarkLogger()
+
+    def tracer(self) -> trace.Tracer:
+        return trace.get_tracer("loom-organization-benchmark")
+
+    def meter(self) -> metrics.Meter:
+        return metrics.get_meter("loom-organization-benchmark")
+
+    def logger(self) -> interface.IOtelLogger:
+        return self._logger
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _zipf_weights(count: int, skew: float) -> list[float]:
+    # skew = 0 дает равномерное распределение, чем больше skew, тем горячее первые организации
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    cfg = Config()
+    tel = _BenchmarkTelemetry()
+    db = PG(
+        tel,
+        args.db_user or cfg.db_user,
+        args.db_pass or cfg.db_pass,
+        args.db_host or cfg.db_host,
+        args.db_port or cfg.db_port,
+        args.db_name or cfg.db_name
+    )
+    await db.multi_query(model.create_organization_tables_queries)
+
+    organization_repo = OrganizationRepo(tel, db)
+    debit_coalescer = None
+    if args.write_behind:
+        debit_coalescer = DebitCoalescer(
+            tel=tel,
+            organization_repo=organization_repo,
+            flush_interval_ms=args.flush_interval_ms,
+            max_batch_size=args.max_batch_size,
+            check_balance=args.check_balance,
+        )
+    organization_service = OrganizationService(
+        tel=tel,
+        organization_repo=organization_repo,
+        check_sufficient_balance=args.check_balance,
+        debit_coalescer=debit_coalescer,
+    )
+
+    initial_balance = Decimal(args.initial_balance)
+    amount = Decimal(args.amount)
+    organization_ids = []
+    for index in range(args.organizations):
+        organization_id = await organization_service.create_organization(f"benchmark-{uuid.uuid4().hex[:8]}-{index}")
+        if initial_balance:
+            await organization_service.top_up_balance(organization_id, initial_balance)
+        organization_ids.append(organization_id)
+
+    weights = _zipf_weights(len(organization_ids), args.skew)
+    expected_delta = {organization_id: Decimal(0) for organization_id in organization_ids}
+    latencies: list[float] = []
+    errors: Counter = Counter()
+    rng = random.Random(args.seed)
+
+    async def client():
+        for _ in range(args.operations_per_client):
+            organization_id = rng.choices(organization_ids, weights)[0]
+            is_debit = rng.random() < args.debit_ratio
+            start = time.perf_counter()
+            try:
+                if is_debit:
+                    await organization_service.debit_balance(organization_id, amount)
+                    expected_delta[organization_id] -= amount
+                else:
+                    await organization_service.top_up_balance(organization_id, amount)
+                    expected_delta[organization_id] += amount
+            except Exception as err:
+                errors[err.__class__.__name__] += 1
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    if debit_coalescer is not None:
+        await debit_coalescer.start()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    if debit_coalescer is not None:
+        await debit_coalescer.stop()
+
+    # Проверка корректности: итоговый баланс и журнал должны сойтись с успешными операциями
+    mismatches = []
+    for organization_id in organization_ids:
+        # Баланс, пересчитанный из снимка и журнала после него, проверяет и сами снимки
+        reconciliation = await organization_repo.rebuild_organization_balance(organization_id)
+        actual_balance = reconciliation.rub_balance
+        ledger_balance = reconciliation.rebuilt_rub_balance
+        expected_balance = initial_balance + expected_delta[organization_id]
+
+        if actual_balance != expected_balance or ledger_balance != expected_balance:
+            mismatches.append({
+                "organization_id": organization_id,
+                "expected_balance": str(expected_balance),
+                "actual_balance": str(actual_balance),
+                "ledger_balance": str(ledger_balance),
+            })
+
+    latencies.sort()
+    total_operations = len(latencies)
+    return {
+        "benchmark": "balance_contention",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "config": {
+            "clients": args.clients,
+            "operations_per_client": args.operations_per_client,
+            "organizations": args.organizations,
+            "skew": args.skew,
+            "debit_ratio": args.debit_ratio,
+            "amount": args.amount,
+            "initial_balance": args.initial_balance,
+            "check_balance": args.check_balance,
+            "write_behind": args.write_behind,
+            "flush_interval_ms": args.flush_interval_ms if args.write_behind else None,
+            "max_batch_size": args.max_batch_size if args.write_behind else None,
+        },
+        "operations": total_operations,
+        "errors": dict(errors),
+        "duration_sec": elapsed,
+        "throughput_ops_per_sec": total_operations / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / total_operations * 1000 if total_operations else 0.0,
+            "p50": _percentile(latencies, 50) * 1000,
+            "p90": _percentile(latencies, 90) * 1000,
+            "p99": _percentile(latencies, 99) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000,
+        },
+        "correctness": {
+            "ok": not mismatches,
+            "organizations_checked": len(organization_ids),
+            "mismatches": mismatches,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный стенд конкурентных операций с балансом")
+    parser.add_argument("--clients", type=int, default=200, help="Количество конкурентных клиентов")
+    parser.add_argument("--operations-per-client", type=int, default=50)
+    parser.add_argument("--organizations", type=int, default=1, help="Количество организаций в тесте")
+    parser.add_argument("--skew", type=float, default=0.0, help="Параметр Zipf для горячих организаций, 0 - равномерно")
+    parser.add_argument("--debit-ratio", type=float, default=0.9, help="Доля списаний среди операций")
+    parser.add_argument("--amount", default="1.25", help="Сумма одной операции")
+    parser.add_argument("--initial-balance", default="1000000", help="Стартовый баланс каждой организации")
+    parser.add_argument("--check-balance", action="store_true", help="Включить проверку достаточности средств")
+    parser.add_argument("--write-behind", action="store_true", help="Объединять списания через DebitCoalescer")
+    parser.add_argument("--flush-interval-ms", type=int, default=50)
+    parser.add_argument("--max-batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-host")
+    parser.add_argument("--db-port")
+    parser.add_argument("--db-name")
+    parser.add_argument("--db-user")
+    parser.add_argument("--db-pass")
+    parser.add_argument("--output", help="Путь для JSON с результатами")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    print(
+        f"ops={result['operations']} "
+        f"throughput={result['throughput_ops_per_sec']:.1f}/s "
+        f"p50={result['latency_ms']['p50']:.2f}ms "
+        f"p99={result['latency_ms']['p99']:.2f}ms "
+        f"errors={result['errors']} "
+        f"correct={result['correctness']['ok']}",
+        flush=True
+    )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+    if not result["correctness"]["ok"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Сравнение накладных расходов на запрос: PG (AsyncSession + text()) против AsyncpgDB.
+
+Оба клиента гоняют одинаковые запросы репозитория против одной базы, поэтому разница
+в латентности - это стоимость слоя доступа, а не самого запроса:
+
+    python -m benchmark.db_overhead --iterations 5000 --concurrency 10 --output db_overhead.json
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+from infrastructure.pg.asyncpg_db import AsyncpgDB
+from infrastructure.pg.pg import PG
+from internal import interface, model
+from internal.config.config import Config
+from internal.repo.organization.repo import OrganizationRepo
+from benchmark.balance_contention import _BenchmarkTelemetry, _percentile, _git_revision
+
+
+async def _measure(
+        name: str,
+        operation,
+        iterations: int,
+        concurrency: int
+) -> dict:
+    latencies: list[float] = []
+    remaining = iterations
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            await operation()
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "operation": name,
+        "operations": len(latencies),
+        "throughput_ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "p50": _percentile(latencies, 50) * 1000,
+            "p90": _percentile(latencies, 90) * 1000,
+            "p99": _percentile(latencies, 99) * 1000,
+        },
+    }
+
+
+async def _run_client(db: interface.IDB, tel: interface.ITelemetry, args: argparse.Namespace) -> list[dict]:
+    organization_repo = OrganizationRepo(tel, db)
+    organization_id = await organization_repo.create_organization(f"benchmark-{uuid.uuid4().hex[:8]}")
+
+    # Прогрев: пул соединений и кэш prepared statements
+    for _ in range(args.warmup):
+        await organization_repo.get_organization_by_id(organization_id)
+
+    counter = 0
+
+    async def update():
+        nonlocal counter
+        counter += 1
+        await organization_repo.update_organization(organization_id, name=f"benchmark-{counter}")
+
+    results = [
+        await _measure(
+            "get_organization_by_id",
+            lambda: organization_repo.get_organization_by_id(organization_id),
+            args.iterations,
+            args.concurrency
+        ),
+        await _measure("update_organization", update, args.iterations, args.concurrency),
+        await _measure(
+            "select_1",
+            lambda: db.select("SELECT 1", {}),
+            args.iterations,
+            args.concurrency
+        ),
+    ]
+
+    await organization_repo.delete_organization(organization_id)
+    return results
+
+
+async def run(args: argparse.Namespace) -> dict:
+    cfg = Config()
+    tel = _BenchmarkTelemetry()
+    connection = (
+        args.db_user or cfg.db_user,
+        args.db_pass or cfg.db_pass,
+        args.db_host or cfg.db_host,
+        args.db_port or cfg.db_port,
+        args.db_name or cfg.db_name,
+    )
+
+    pg = PG(tel, *connection)
+    await pg.multi_query(model.create_organization_tables_queries)
+    asyncpg_db = AsyncpgDB(tel, *connection)
+
+    pg_results = await _run_client(pg, tel, args)
+    asyncpg_results = await _run_client(asyncpg_db, tel, args)
+    await asyncpg_db.close()
+
+    comparison = []
+    for pg_result, asyncpg_result in zip(pg_results, asyncpg_results):
+        comparison.append({
+            "operation": pg_result["operation"],
+            "pg_mean_ms": pg_result["latency_ms"]["mean"],
+            "asyncpg_mean_ms": asyncpg_result["latency_ms"]["mean"],
+            "saved_per_query_ms": pg_result["latency_ms"]["mean"] - asyncpg_result["latency_ms"]["mean"],
+        })
+
+    return {
+        "benchmark": "db_overhead",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "config": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+        },
+        "pg": pg_results,
+        "asyncpg": asyncpg_results,
+        "comparison": comparison,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы слоя доступа к БД на один запрос")
+    parser.add_argument("--iterations", type=int, default=5000, help="Запросов на каждую операцию")
+    parser.add_argument("--concurrency", type=int, default=10, help="Конкурентных корутин")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--db-host")
+    parser.add_argument("--db-port")
+    parser.add_argument("--db-name")
+    parser.add_argument("--db-user")
+    parser.add_argument("--db-pass")
+    parser.add_argument("--output", help="Путь для JSON с результатами")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    for row in result["comparison"]:
+        print(
+            f"{row['operation']}: "
+            f"pg={row['pg_mean_ms']:.3f}ms "
+            f"asyncpg={row['asyncpg_mean_ms']:.3f}ms "
+            f"saved={row['saved_per_query_ms']:.3f}ms",
+            flush=True
+        )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
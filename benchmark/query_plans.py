@@ -0,0 +1,347 @@
+"""
+Проверка планов всех зарегистрированных SQL-запросов на реалистичном объеме данных.
+
+Наполняет локальный PostgreSQL синтетическими организациями, снимает EXPLAIN (FORMAT JSON)
+для каждого запроса из sql_query.py и DML из миграций и сравнивает с закоммиченным baseline.
+Падает на Seq Scan по большим таблицам и на росте стоимости плана:
+
+    python -m benchmark.query_plans --seed --organizations 1000000
+    python -m benchmark.query_plans --update-baseline
+
+--seed очищает таблицы организаций (TRUNCATE), запускать только против локальной базы.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from infrastructure.pg.pg import PG
+from infrastructure.pg.statement import register_statements, registered_statements
+from internal import model
+from internal.config.config import Config
+from internal.repo.organization import sql_query as organization_sql_query
+from benchmark.balance_contention import _BenchmarkTelemetry, _git_revision
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "query_plans.json"
+
+# Запросы, которым полный проход по таблице нужен по смыслу
+SEQ_SCAN_ALLOWED = {
+    "organization.get_all_organizations": "полная выгрузка без LIMIT",
+    "organization.get_all_organizations_projection": "полная выгрузка без LIMIT",
+}
+# Бэкфиллы миграций проходят всю таблицу один раз
+SEQ_SCAN_ALLOWED_PREFIXES = ("migration.",)
+# DML миграций, которые на текущей схеме не разбираются по смыслу; любая другая ошибка EXPLAIN - провал
+EXPLAIN_FAILURE_ALLOWED = {
+    "migration.v0_0_5_balance_ledger.insert_initial_balance_snapshots":
+        "читает organizations.rub_balance, которую удаляет v0_0_6",
+    "migration.v0_0_6_organization_balances.copy_rub_balance_to_organization_balances":
+        "читает organizations.rub_balance, которую удаляет эта же миграция",
+    "migration.v0_0_6_organization_balances.copy_rub_balance_to_organizations":
+        "down-миграция, колонку до нее восстанавливает alter_organizations_restore_rub_balance",
+}
+
+_explainable = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_bind_param = re.compile(r"(?<![:\w]):([a-z_]+)")
+
+# Сидирование целиком на стороне сервера; триггеры выключены, rollup-таблицы заполняются напрямую
+seed_queries = [
+    "SET LOCAL session_replication_role = replica;",
+    """
+    TRUNCATE organizations, organization_balances, balance_operations, balance_snapshots,
+        organization_spend_hourly, organization_spend_daily RESTART IDENTITY CASCADE;
+    """,
+    """
+    INSERT INTO organizations (name, brand_rules, audience_insights, additional_info, created_at)
+    SELECT
+        'organization-' || n,
+        ARRAY['brand rule ' || n],
+        ARRAY['audience insight ' || (n % 1000)],
+        ARRAY['additional info ' || (n % 100)],
+        TIMESTAMP '2024-01-01' + n * INTERVAL '1 second'
+    FROM generate_series(1, {organizations}) AS n;
+    """,
+    """
+    INSERT INTO organization_balances (organization_id, rub_balance)
+    SELECT id, 1000 FROM organizations;
+    """,
+    """
+    INSERT INTO balance_operations (organization_id, idempotency_key, operation_type, amount_rub, rub_balance_after, created_at)
+    SELECT
+        o.id,
+        'seed-' || o.id || '-' || k,
+        CASE WHEN k % 2 = 0 THEN 'debit' ELSE 'top_up' END,
+        1,
+        1000,
+        o.created_at + k * INTERVAL '1 hour'
+    FROM organizations o, generate_series(1, {operations_per_organization}) AS k;
+    """,
+    """
+    INSERT INTO balance_snapshots (organization_id, last_operation_id, rub_balance)
+    SELECT organization_id, MAX(id), 1000
+    FROM balance_operations
+    GROUP BY organization_id;
+    """,
+    """
+    INSERT INTO organization_spend_hourly (organization_id, bucket_start, top_up_rub, debit_rub, operations_count)
+    SELECT organization_id, date_trunc('hour', created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'),
+        SUM(CASE WHEN operation_type = 'top_up' THEN amount_rub ELSE 0 END),
+        SUM(CASE WHEN operation_type = 'debit' THEN amount_rub ELSE 0 END),
+        COUNT(*)
+    FROM balance_operations
+    GROUP BY 1, 2;
+    """,
+    """
+    INSERT INTO organization_spend_daily (organization_id, bucket_start, top_up_rub, debit_rub, operations_count)
+    SELECT organization_id, date_trunc('day', bucket_start),
+        SUM(top_up_rub), SUM(debit_rub), SUM(operations_count)
+    FROM organization_spend_hourly
+    GROUP BY 1, 2;
+    """,
+    "ANALYZE;",
+]
+
+relation_sizes_query = """
+SELECT c.relname, c.reltuples
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind = 'r' AND n.nspname = current_schema();
+"""
+
+
+def _register_migration_statements() -> None:
+    migration_dir = Path(__file__).parent.parent / "internal" / "migration" / "version"
+    for file_path in sorted(migration_dir.glob("v*.py")):
+        module = importlib.import_module(f"internal.migration.version.{file_path.stem}")
+        register_statements(module, f"migration.{file_path.stem}")
+
+
+def _sample_params(query: str, organizations: int) -> dict:
+    # Значения из середины диапазона: планировщик видит типичную, а не крайнюю селективность
+    organization_id = max(organizations // 2, 1)
+    organization_ids = list(range(organization_id, organization_id + 100))
+    now = datetime(2024, 1, 1) + timedelta(seconds=organization_id)
+    samples = {
+        "organization_id": organization_id,
+        "organization_ids": organization_ids,
+        "name": "benchmark",
+        "names": [f"benchmark-{index}" for index in range(100)],
+        "limit": 100,
+        "after_created_at": now,
+        "after_id": organization_id,
+        "amount_rub": Decimal("1"),
+        "deltas_rub": [Decimal("-1")] * len(organization_ids),
+        "idempotency_key": f"seed-{organization_id}-1",
+        "idempotency_keys": [f"seed-{organization_id}-{k}" for k in range(1, 101)],
+        "snapshot_interval": 100,
+        "date_from": now,
+        "date_to": now + timedelta(days=30),
+        "patches": [json.dumps({"name": "benchmark"})] * len(organization_ids),
+        "query": "organization-5000",
+        "name_prefix": "organization-5000%",
+        "after_rank": 1.0,
+    }
+    return {name: samples.get(name) for name in dict.fromkeys(_bind_param.findall(query))}
+
+
+def _render(query: str) -> str:
+    # Проекции проверяем в самом широком варианте: все поля и JOIN баланса
+    if "{columns}" not in query:
+        return query
+    columns = ", ".join(
+        "b.rub_balance" if name == "rub_balance" else f"o.{name}" for name in model.ORGANIZATION_FIELDS
+    )
+    return query.format(columns=columns, join=organization_sql_query.organization_balance_join)
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def _summarize(plan: dict) -> dict:
+    return {
+        "total_cost": plan["Total Cost"],
+        "plan_rows": plan["Plan Rows"],
+        "nodes": [
+            " ".join(part for part in (
+                node["Node Type"],
+                f"using {node['Index Name']}" if "Index Name" in node else None,
+                f"on {node['Relation Name']}" if "Relation Name" in node else None,
+            ) if part)
+            for node in _nodes(plan)
+        ],
+    }
+
+
+def _seq_scans(plan: dict, relation_sizes: dict[str, float], min_rows: int) -> list[str]:
+    return [
+        node["Relation Name"]
+        for node in _nodes(plan)
+        if node["Node Type"] == "Seq Scan" and relation_sizes.get(node.get("Relation Name"), 0) >= min_rows
+    ]
+
+
+def _seq_scan_allowed(name: str) -> bool:
+    return name in SEQ_SCAN_ALLOWED or name.startswith(SEQ_SCAN_ALLOWED_PREFIXES)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    cfg = Config()
+    tel = _BenchmarkTelemetry()
+    db = PG(
+        tel,
+        args.db_user or cfg.db_user,
+        args.db_pass or cfg.db_pass,
+        args.db_host or cfg.db_host,
+        args.db_port or cfg.db_port,
+        args.db_name or cfg.db_name
+    )
+    await db.multi_query(model.create_organization_tables_queries)
+
+    if args.seed:
+        await db.multi_query([
+            query.format(
+                organizations=args.organizations,
+                operations_per_organization=args.operations_per_organization
+            )
+            for query in seed_queries
+        ])
+
+    register_statements(organization_sql_query, "organization")
+    _register_migration_statements()
+
+    relation_sizes = {row.relname: row.reltuples for row in await db.select(relation_sizes_query, {})}
+    organizations = int(relation_sizes.get("organizations", 0))
+
+    baseline = {}
+    failures = []
+    if not args.update_baseline:
+        if BASELINE_PATH.exists():
+            baseline = json.loads(BASELINE_PATH.read_text()).get("statements", {})
+        else:
+            failures.append(f"baseline {BASELINE_PATH} not found, run with --update-baseline")
+
+    statements = {}
+    skipped = []
+    for name, query in sorted(registered_statements().items()):
+        if not _explainable.match(query):
+            continue
+
+        query = _render(query)
+        try:
+            # EXPLAIN без ANALYZE не исполняет запрос, записи безопасны; сессия select не коммитится
+            rows = await db.select("EXPLAIN (FORMAT JSON) " + query, _sample_params(query, organizations))
+        except Exception as err:
+            statements[name] = {"error": f"{err.__class__.__name__}: {str(err).splitlines()[0]}"}
+            if name in EXPLAIN_FAILURE_ALLOWED:
+                skipped.append(f"{name}: {EXPLAIN_FAILURE_ALLOWED[name]} ({statements[name]['error']})")
+            else:
+                failures.append(f"{name}: EXPLAIN failed: {statements[name]['error']}")
+            continue
+
+        plan_json = rows[0][0]
+        plan = (json.loads(plan_json) if isinstance(plan_json, str) else plan_json)[0]["Plan"]
+        summary = _summarize(plan)
+        statements[name] = summary
+
+        seq_scans = _seq_scans(plan, relation_sizes, args.seq_scan_min_rows)
+        if seq_scans and not _seq_scan_allowed(name):
+            failures.append(f"{name}: Seq Scan on {', '.join(seq_scans)}")
+
+        if args.update_baseline:
+            continue
+        baseline_summary = baseline.get(name)
+        if not baseline_summary or "total_cost" not in baseline_summary:
+            # Новый запрос без плана в baseline не проверен на регрессию - baseline нужно обновить
+            failures.append(f"{name}: no baseline plan, run with --update-baseline")
+            continue
+        summary["baseline_total_cost"] = baseline_summary["total_cost"]
+        summary["plan_changed"] = summary["nodes"] != baseline_summary["nodes"]
+
+        # Мелкие абсолютные колебания стоимости - шум статистики, а не регрессия
+        cost_delta = summary["total_cost"] - baseline_summary["total_cost"]
+        if (cost_delta > args.min_cost_delta and
+                summary["total_cost"] > baseline_summary["total_cost"] * (1 + args.cost_tolerance)):
+            failures.append(
+                f"{name}: cost {baseline_summary['total_cost']:.1f} -> {summary['total_cost']:.1f}"
+                f"{' (plan changed)' if summary['plan_changed'] else ''}"
+            )
+
+    result = {
+        "benchmark": "query_plans",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "config": {
+            "organizations": organizations,
+            "seq_scan_min_rows": args.seq_scan_min_rows,
+            "cost_tolerance": args.cost_tolerance,
+        },
+        "baseline": str(BASELINE_PATH) if BASELINE_PATH.exists() and not args.update_baseline else None,
+        "statements": statements,
+        "skipped": skipped,
+        "failures": failures,
+    }
+
+    if args.update_baseline:
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps({
+            "git_revision": result["git_revision"],
+            "organizations": organizations,
+            "statements": {
+                name: {"total_cost": summary["total_cost"], "nodes": summary["nodes"]}
+                for name, summary in statements.items()
+                if "total_cost" in summary
+            },
+        }, ensure_ascii=False, indent=2) + "\n")
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Регрессия планов SQL-запросов на синтетических данных")
+    parser.add_argument("--seed", action="store_true", help="Очистить таблицы и наполнить синтетикой")
+    parser.add_argument("--organizations", type=int, default=1_000_000)
+    parser.add_argument("--operations-per-organization", type=int, default=5)
+    parser.add_argument("--seq-scan-min-rows", type=int, default=10_000, help="Seq Scan по таблице меньше - не ошибка")
+    parser.add_argument("--cost-tolerance", type=float, default=0.2, help="Допустимый относительный рост стоимости")
+    parser.add_argument("--min-cost-delta", type=float, default=10.0, help="Допустимый абсолютный рост стоимости")
+    parser.add_argument("--update-baseline", action="store_true", help="Перезаписать baseline текущими планами")
+    parser.add_argument("--db-host")
+    parser.add_argument("--db-port")
+    parser.add_argument("--db-name")
+    parser.add_argument("--db-user")
+    parser.add_argument("--db-pass")
+    parser.add_argument("--output", help="Путь для JSON с результатами")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    print(
+        f"statements={len(result['statements'])} "
+        f"organizations={result['config']['organizations']} "
+        f"baseline={'yes' if result['baseline'] else 'no'} "
+        f"skipped={len(result['skipped'])} "
+        f"failures={len(result['failures'])}",
+        flush=True
+    )
+    for skipped in result["skipped"]:
+        print(f"SKIP {skipped}", flush=True)
+    for failure in result["failures"]:
+        print(f"FAIL {failure}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+    if result["failures"] and not args.update_baseline:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Sequence, AsyncIterator, Awaitable, Callable
+
+import asyncpg
+import orjson
+
+from internal import interface, common
+from .pg import _asyncpg_dsn
+
+# :name, но не :: из приведения типов и не := из plpgsql
+_BIND_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\$\$.*?\$\$", re.DOTALL)
+
+
+class Record(asyncpg.Record):
+    # Строки ведут себя как строки SQLAlchemy: row.name и row._mapping.get("name")
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def _mapping(self) -> 'Record':
+        return self
+
+
+@lru_cache(maxsize=1024)
+def compile_query(query: str) -> tuple[str, tuple[str, ...]]:
+    """Переводит :name в позиционные $n asyncpg; результат кэшируется по тексту запроса."""
+    param_names: list[str] = []
+
+    def replace(match: re.Match) -> str:
+        name = match.group(1)
+        if name not in param_names:
+            param_names.append(name)
+        return f"${param_names.index(name) + 1}"
+
+    parts = []
+    position = 0
+    # Литералы и тела функций не трогаем: двоеточия внутри них не параметры
+    for quoted in _QUOTED.finditer(query):
+        parts.append(_BIND_PARAM.sub(replace, query[position:quoted.start()]))
+        parts.append(quoted.group(0))
+        position = quoted.end()
+    parts.append(_BIND_PARAM.sub(replace, query[position:]))
+
+    return "".join(parts), tuple(param_names)
+
+
+@asynccontextmanager
+async def _unique_violation() -> AsyncIterator[None]:
+    # Репозиторий различает гонку по уникальному ключу, не зная о драйвере
+    try:
+        yield
+    except asyncpg.UniqueViolationError as err:
+        raise common.ErrUniqueViolation(err.constraint_name or "") from err
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    # Репозиторий передает jsonb уже сериализованным, как требует SQLAlchemy; объекты кодируем сами
+    payload = value.encode() if isinstance(value, str) else orjson.dumps(value)
+    return b"\x01" + payload
+
+
+def _decode_jsonb(value: bytes) -> Any:
+    return orjson.loads(value[1:])
+
+
+def _encode_json(value: Any) -> bytes:
+    return value.encode() if isinstance(value, str) else orjson.dumps(value)
+
+
+async def _init_connection(connection: asyncpg.Connection) -> None:
+    # Кодек элемента используется и для массивов, поэтому jsonb[] тоже идет через orjson
+    await connection.set_type_codec(
+        "jsonb",
+        schema="pg_catalog",
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        format="binary"
+    )
+    await connection.set_type_codec(
+        "json",
+        schema="pg_catalog",
+        encoder=_encode_json,
+        decoder=orjson.loads,
+        format="binary"
+    )
+
+
+@dataclass
+class _Transaction:
+    connection: asyncpg.Connection
+    after_commit: list[Callable[[], None]] = field(default_factory=list)
+
+
+class AsyncpgDB(interface.IDB):
+    """
+    IDB поверх пула asyncpg без AsyncSession и text().
+
+    Запросы prepare-ятся на соединении и переиспользуются из кэша именованных
+    statement'ов asyncpg, поэтому текст запроса должен быть стабильным.
+    """
+
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            db_user,
+            db_pass,
+            db_host,
+            db_port,
+            db_name,
+            min_size: int = 5,
+            max_size: int = 30,
+            statement_cache_size: int = 1024,
+            deadline: ContextVar[float | None] = None,
+    ):
+        self.tracer = tel.tracer()
+        # Несколько хостов через запятую: соединения идут к тому, что принимает запись
+        target_session_attrs = "read-write" if "," in str(db_host) else None
+        self.dsn = _asyncpg_dsn(db_user, db_pass, db_host, db_port, db_name, target_session_attrs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        # Дедлайн HTTP запроса (time.monotonic()): asyncpg отменяет запрос на сервере по таймауту вызова
+        self.deadline = deadline
+
+        self._pool: asyncpg.Pool | None = None
+        self._pool_lock = asyncio.Lock()
+        self._transaction: ContextVar[_Transaction | None] = ContextVar(
+            f"asyncpg_transaction_{id(self)}",
+            default=None
+        )
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        if self._transaction.get() is not None:
+            yield
+            return
+
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            transaction = _Transaction(connection=connection)
+            token = self._transaction.set(transaction)
+            try:
+                async with connection.transaction():
+                    yield
+            finally:
+                self._transaction.reset(token)
+
+        for callback in transaction.after_commit:
+            callback()
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        transaction = self._transaction.get()
+        if transaction is None:
+            callback()
+        else:
+            transaction.after_commit.append(callback)
+
+    @asynccontextmanager
+    async def primary(self) -> AsyncIterator[None]:
+        # Реплик у этого драйвера нет, все запросы и так идут в primary
+        yield
+
+    async def insert(self, query: str, query_params: dict) -> int:
+        sql, args = self._bind(query, query_params)
+        executor = await self._executor()
+        async with _unique_violation():
+            return await executor.fetchval(sql, *args, timeout=self._timeout())
+
+    async def delete(self, query: str, query_params: dict) -> None:
+        sql, args = self._bind(query, query_params)
+        executor = await self._executor()
+        await executor.execute(sql, *args, timeout=self._timeout())
+
+    async def update(self, query: str, query_params: dict) -> None:
+        sql, args = self._bind(query, query_params)
+        executor = await self._executor()
+        async with _unique_violation():
+            await executor.execute(sql, *args, timeout=self._timeout())
+
+    async def update_returning(self, query: str, query_params: dict) -> Sequence[Any]:
+        sql, args = self._bind(query, query_params)
+        executor = await self._executor()
+        async with _unique_violation():
+            return await executor.fetch(sql, *args, timeout=self._timeout())
+
+    async def select(self, query: str, query_params: dict) -> Sequence[Any]:
+        sql, args = self._bind(query, query_params)
+        executor = await self._executor()
+        return await executor.fetch(sql, *args, timeout=self._timeout())
+
+    async def stream(
+            self,
+            query: str,
+            query_params: dict,
+            chunk_size: int = 1000
+    ) -> AsyncIterator[Sequence[Any]]:
+        sql, args = self._bind(query, query_params)
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            # Серверный курсор живет только внутри транзакции
+            async with connection.transaction():
+                cursor = await connection.cursor(sql, *args)
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    async def listen(
+            self,
+            channel: str,
+            on_notify: Callable[[str], None],
+            on_disconnect: Callable[[], None]
+    ) -> Callable[[], Awaitable[None]]:
+        connection = await asyncpg.connect(self.dsn)
+        connection.add_termination_listener(lambda _connection: on_disconnect())
+        await connection.add_listener(
+            channel,
+            lambda _connection, _pid, _channel, payload: on_notify(payload)
+        )
+
+        async def close() -> None:
+            if not connection.is_closed():
+                await connection.close()
+
+        return close
+
+    async def multi_query(
+            self,
+            queries: list[str]
+    ) -> None:
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                for query in queries:
+                    await connection.execute(query)
+        return None
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def _timeout(self) -> float | None:
+        deadline = self.deadline.get() if self.deadline is not None else None
+        if deadline is None:
+            return None
+
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise common.ErrDeadlineExceeded()
+        return timeout
+
+    async def _executor(self) -> asyncpg.Pool | asyncpg.Connection:
+        # Внутри db.transaction() все запросы идут через соединение транзакции
+        transaction = self._transaction.get()
+        if transaction is not None:
+            return transaction.connection
+        return await self._get_pool()
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            # Пул создается в работающем цикле событий воркера, а не при импорте main
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                        max_inactive_connection_lifetime=300,
+                        record_class=Record,
+                        init=_init_connection
+                    )
+        return self._pool
+
+    @staticmethod
+    def _bind(query: str, query_params: dict) -> tuple[str, list[Any]]:
+        sql, param_names = compile_query(query)
+        return sql, [query_params[name] for name in param_names]
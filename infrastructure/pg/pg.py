@@ -1,10 +1,22 @@
-from typing import Any, Sequence
+import asyncio
+import contextvars
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Sequence, AsyncIterator, Awaitable, Callable
 
+import asyncpg
+from opentelemetry import context, trace
 from opentelemetry.trace import Status, StatusCode, SpanKind
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from internal import interface
+from internal import interface, common
+from .statement import statement_name, is_read_only
 
 
 def NewPool(
@@ -12,15 +24,27 @@ def NewPool(
         db_pass,
         db_host
         , db_port,
-        db_name
+        db_name,
+        pool_size: int = 15,
+        max_overflow: int = 15,
+        target_session_attrs: str = None,
+        statement_timeout_sec: float = None
 ):
+    connect_args = {}
+    if statement_timeout_sec:
+        # Базовый statement_timeout соединения: под него попадает обычный бюджет запроса без SET на каждый вызов
+        connect_args["server_settings"] = {"statement_timeout": str(int(statement_timeout_sec * 1000))}
+
     async_engine = create_async_engine(
-        f"postgresql+asyncpg://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}",
+        _sqlalchemy_url(db_user, db_pass, db_host, db_port, db_name, target_session_attrs),
         echo=False,
         future=True,
-        pool_size=15,
-        max_overflow=15,
-        pool_recycle=300
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=300,
+        # После переключения primary старые соединения пула отбраковываются до выдачи
+        pool_pre_ping=True,
+        connect_args=connect_args
     )
 
     pool = async_sessionmaker(
@@ -32,40 +56,603 @@ def NewPool(
     return pool
 
 
+def _redact(query_params: dict) -> dict:
+    # {"name": "str", "organization_ids": "list[120]"}
+    redacted = {}
+    for name, value in query_params.items():
+        if value is None:
+            redacted[name] = None
+        elif isinstance(value, (list, tuple)):
+            redacted[name] = f"{type(value).__name__}[{len(value)}]"
+        else:
+            redacted[name] = type(value).__name__
+    return redacted
+
+
+def _unique_violation(err: BaseException) -> str | None:
+    # SQLAlchemy оборачивает ошибку asyncpg в IntegrityError, исходная лежит в цепочке причин
+    while err is not None:
+        if isinstance(err, asyncpg.UniqueViolationError):
+            return err.constraint_name or ""
+        err = getattr(err, "orig", None) or err.__cause__
+    return None
+
+
+def _connection_lost(err: BaseException) -> bool:
+    # Отказ сервера или соединения, а не ошибка самого запроса: его можно повторить на другом хосте
+    while err is not None:
+        if isinstance(err, (OSError, asyncpg.PostgresConnectionError, asyncpg.ConnectionDoesNotExistError)):
+            return True
+        if isinstance(err, DBAPIError) and err.connection_invalidated:
+            return True
+        err = getattr(err, "orig", None) or err.__cause__
+    return False
+
+
+def _hosts(db_host: str, db_port) -> list[str]:
+    # "pg-1,pg-2:5433" -> ["pg-1:5432", "pg-2:5433"]
+    return [
+        host.strip() if ":" in host else f"{host.strip()}:{db_port}"
+        for host in str(db_host).split(",")
+        if host.strip()
+    ]
+
+
+def _sqlalchemy_url(db_user, db_pass, db_host, db_port, db_name, target_session_attrs: str = None) -> str:
+    hosts = _hosts(db_host, db_port)
+    if len(hosts) == 1 and target_session_attrs is None:
+        return f"postgresql+asyncpg://{db_user}:{db_pass}@{hosts[0]}/{db_name}"
+
+    # Несколько хостов: asyncpg перебирает их по очереди и берет тот, что подходит по target_session_attrs
+    query = "&".join(f"host={host}" for host in hosts)
+    if target_session_attrs is not None:
+        query += f"&target_session_attrs={target_session_attrs}"
+    return f"postgresql+asyncpg://{db_user}:{db_pass}@/{db_name}?{query}"
+
+
+def _asyncpg_dsn(db_user, db_pass, db_host, db_port, db_name, target_session_attrs: str = None) -> str:
+    dsn = f"postgresql://{db_user}:{db_pass}@{','.join(_hosts(db_host, db_port))}/{db_name}"
+    if target_session_attrs is not None:
+        dsn += f"?target_session_attrs={target_session_attrs}"
+    return dsn
+
+
+# Насколько оставшийся бюджет может быть меньше базового statement_timeout, чтобы не ставить свой:
+# запрос, переживший дедлайн, все равно отменит middleware
+_DEADLINE_SLACK_SEC = 1.0
+
+set_statement_timeout = """
+SELECT set_config('statement_timeout', :timeout, true);
+"""
+
+explain_analyze = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+replica_lag_query = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END;
+"""
+
+
+@dataclass
+class _Call:
+    name: str
+    operation: str
+    started: float = field(default_factory=time.perf_counter)
+    pool_wait: float = 0.0
+    # Для stream - только время ожидания строк от БД, без времени потребителя
+    execution: float | None = None
+    rows: int | None = None
+    # Реплика, на которой исполнялось чтение; None - primary
+    replica: "_Replica | None" = None
+
+
+@dataclass
+class _Replica:
+    host: str
+    pool: async_sessionmaker
+    healthy: bool = False
+    lag_sec: float | None = None
+
+
+@dataclass
+class _Transaction:
+    session: AsyncSession
+    after_commit: list[Callable[[], None]] = field(default_factory=list)
+
+
 class PG(interface.IDB):
 
-    def __init__(self, tel: interface.ITelemetry, db_user, db_pass, db_host, db_port, db_name):
-        self.pool = NewPool(db_user, db_pass, db_host, db_port, db_name)
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            db_user,
+            db_pass,
+            db_host,
+            db_port,
+            db_name,
+            replica_hosts: list[str] = None,
+            read_your_writes_sec: float = 2.0,
+            max_replica_lag_sec: float = 5.0,
+            replica_check_interval_sec: float = 2.0,
+            replica_check_timeout_sec: float = 1.0,
+            deadline: ContextVar[float | None] = None,
+            slow_query_ms: float = 200.0,
+            explain_sample_rate: float = 0.0,
+            explain_interval_sec: float = 60.0,
+            statement_timeout_sec: float = None,
+    ):
+        multi_host = len(_hosts(db_host, db_port)) > 1
+        # С несколькими хостами primary - тот, что принимает запись; при failover asyncpg найдет новый
+        target_session_attrs = "read-write" if multi_host else None
+        self.pool = NewPool(
+            db_user, db_pass, db_host, db_port, db_name,
+            target_session_attrs=target_session_attrs,
+            statement_timeout_sec=statement_timeout_sec
+        )
         self.tracer = tel.tracer()
+        self.logger = tel.logger()
+        self.meter = tel.meter()
+        self.dsn = _asyncpg_dsn(db_user, db_pass, db_host, db_port, db_name, target_session_attrs)
+        self.db_name = db_name
+        # Транзакция текущего запроса: все вызовы внутри db.transaction() идут через одну сессию
+        self._transaction: ContextVar[_Transaction | None] = ContextVar(f"pg_transaction_{id(self)}", default=None)
+
+        self.replicas = [
+            _Replica(
+                host=host,
+                pool=NewPool(
+                    db_user, db_pass, host, db_port, db_name,
+                    pool_size=10,
+                    max_overflow=10,
+                    statement_timeout_sec=statement_timeout_sec
+                )
+            )
+            for host in (replica_hosts or [])
+        ]
+        self.read_your_writes_sec = read_your_writes_sec
+        self.max_replica_lag_sec = max_replica_lag_sec
+        self.replica_check_interval_sec = replica_check_interval_sec
+        self.replica_check_timeout_sec = replica_check_timeout_sec
+        self._replica_cursor = 0
+        self._replica_check_task: asyncio.Task | None = None
+        # До какого момента чтения текущего запроса идут в primary, чтобы видеть свои записи
+        self._primary_until: ContextVar[float] = ContextVar(f"pg_primary_until_{id(self)}", default=0.0)
+        # Дедлайн HTTP запроса (time.monotonic()), превращается в statement_timeout транзакции
+        self.deadline = deadline
+        self.statement_timeout_sec = statement_timeout_sec
+
+        self.slow_query_sec = slow_query_ms / 1000
+        # Доля медленных SELECT, для которых снимается EXPLAIN ANALYZE, и не чаще раза в интервал на запрос
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval_sec = explain_interval_sec
+        self._explained_at: dict[str, float] = {}
+        self._explain_tasks: set[asyncio.Task] = set()
+
+        self.duration_histogram = self.meter.create_histogram(
+            name="db.client.operation.duration",
+            unit="s",
+            description="Длительность запроса к БД по имени запроса, включая ожидание соединения"
+        )
+        self.pool_wait_histogram = self.meter.create_histogram(
+            name="db.client.connection.wait_time",
+            unit="s",
+            description="Ожидание соединения из пула перед запросом"
+        )
+        self.routed_counter = self.meter.create_counter(
+            name="db.client.reads.routed",
+            unit="{query}",
+            description="Чтения по месту исполнения: replica, primary"
+        )
+        self.replica_lag_gauge = self.meter.create_gauge(
+            name="db.client.replica.lag",
+            unit="s",
+            description="Отставание реплики от primary"
+        )
+
+    async def start(self) -> None:
+        if self.replicas:
+            await self._check_replicas()
+            self._replica_check_task = asyncio.create_task(self._check_replicas_loop())
+
+    async def stop(self) -> None:
+        if self._replica_check_task is None:
+            return
+        self._replica_check_task.cancel()
+        await asyncio.gather(self._replica_check_task, return_exceptions=True)
+        self._replica_check_task = None
+
+    @asynccontextmanager
+    async def primary(self) -> AsyncIterator[None]:
+        token = self._primary_until.set(float("inf"))
+        try:
+            yield
+        finally:
+            self._primary_until.reset(token)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        if self._transaction.get() is not None:
+            # Вложенный вызов присоединяется к внешней транзакции и коммитится вместе с ней
+            yield
+            return
 
-    async def insert(self, query: str, query_params: dict) -> int:
         async with self.pool() as session:
-            result = await session.execute(text(query), query_params)
-            await session.commit()
-            rows = result.all()
-            return rows[0][0]
+            transaction = _Transaction(session=session)
+            token = self._transaction.set(transaction)
+            try:
+                await self._apply_deadline(session)
+                yield
+                await session.commit()
+            except BaseException:
+                await session.rollback()
+                raise
+            finally:
+                self._transaction.reset(token)
+
+        for callback in transaction.after_commit:
+            callback()
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        transaction = self._transaction.get()
+        if transaction is None:
+            callback()
+        else:
+            transaction.after_commit.append(callback)
+
+    async def insert(self, query: str, query_params: dict) -> int:
+        self._pin_primary()
+        async with self._observe(query, query_params) as call:
+            async with self._session(call=call) as (session, owned):
+                result = await session.execute(text(query), query_params)
+                if owned:
+                    await session.commit()
+                rows = result.all()
+                call.rows = len(rows)
+                return rows[0][0]
 
     async def delete(self, query: str, query_params: dict) -> None:
-        async with self.pool() as session:
-            await session.execute(text(query), query_params)
-            await session.commit()
+        self._pin_primary()
+        async with self._observe(query, query_params) as call:
+            async with self._session(call=call) as (session, owned):
+                result = await session.execute(text(query), query_params)
+                call.rows = result.rowcount
+                if owned:
+                    await session.commit()
 
     async def update(self, query: str, query_params: dict) -> None:
-        async with self.pool() as session:
-            await session.execute(text(query), query_params)
-            await session.commit()
+        self._pin_primary()
+        async with self._observe(query, query_params) as call:
+            async with self._session(call=call) as (session, owned):
+                result = await session.execute(text(query), query_params)
+                call.rows = result.rowcount
+                if owned:
+                    await session.commit()
+
+    async def update_returning(self, query: str, query_params: dict) -> Sequence[Any]:
+        self._pin_primary()
+        async with self._observe(query, query_params) as call:
+            async with self._session(call=call) as (session, owned):
+                result = await session.execute(text(query), query_params)
+                rows = result.all()
+                call.rows = len(rows)
+                if owned:
+                    await session.commit()
+                return rows
 
     async def select(self, query: str, query_params: dict) -> Sequence[Any]:
-        async with self.pool() as session:
+        async with self._observe(query, query_params) as call:
+            try:
+                return await self._select(query, query_params, call)
+            except Exception as err:
+                if not self._replica_failed(call, err):
+                    raise
+            # Реплика отказала - то же чтение повторяем в primary
+            async with self.primary():
+                return await self._select(query, query_params, call)
+
+    async def _select(self, query: str, query_params: dict, call: _Call) -> Sequence[Any]:
+        async with self._session(read_only=True, call=call) as (session, _):
             result = await session.execute(text(query), query_params)
             rows = result.all()
+            call.rows = len(rows)
             return rows
 
+    async def stream(
+            self,
+            query: str,
+            query_params: dict,
+            chunk_size: int = 1000
+    ) -> AsyncIterator[Sequence[Any]]:
+        # Span не делаем текущим: генератор возобновляется между чанками в чужом контексте
+        async with self._observe(query, query_params, current=False) as call:
+            call.execution, call.rows = 0.0, 0
+            try:
+                async for rows in self._stream(query, query_params, chunk_size, call):
+                    yield rows
+                return
+            except Exception as err:
+                # После отданных строк повтор продублировал бы их у потребителя
+                if call.rows or not self._replica_failed(call, err):
+                    raise
+            async with self.primary():
+                async for rows in self._stream(query, query_params, chunk_size, call):
+                    yield rows
+
+    async def _stream(
+            self,
+            query: str,
+            query_params: dict,
+            chunk_size: int,
+            call: _Call
+    ) -> AsyncIterator[Sequence[Any]]:
+        # Серверный курсор: строки приходят частями, память не растет с размером выборки
+        async with self._session(read_only=True, call=call) as (session, _):
+            started = time.perf_counter()
+            result = await session.stream(
+                text(query),
+                query_params,
+                execution_options={"yield_per": chunk_size}
+            )
+            async for rows in result.partitions(chunk_size):
+                call.execution += time.perf_counter() - started
+                call.rows += len(rows)
+                yield rows
+                started = time.perf_counter()
+            call.execution += time.perf_counter() - started
+
+    @asynccontextmanager
+    async def _observe(
+            self,
+            query: str,
+            query_params: dict,
+            current: bool = True
+    ) -> AsyncIterator[_Call]:
+        name, operation = statement_name(query)
+        call = _Call(name=name, operation=operation)
+        span = self.tracer.start_span(
+            name,
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system.name": "postgresql",
+                "db.namespace": self.db_name,
+                "db.operation.name": operation,
+                "db.query.summary": name,
+            }
+        )
+        token = context.attach(trace.set_span_in_context(span)) if current else None
+        error_type = None
+        try:
+            yield call
+            span.set_status(Status(StatusCode.OK))
+        except GeneratorExit:
+            # Потребитель stream остановился раньше - это не ошибка запроса
+            raise
+        except BaseException as err:
+            error_type = err.__class__.__name__
+            span.set_status(Status(StatusCode.ERROR, str(err)))
+            span.record_exception(err)
+            constraint = _unique_violation(err)
+            if constraint is not None:
+                raise common.ErrUniqueViolation(constraint) from err
+            raise
+        finally:
+            if token is not None:
+                context.detach(token)
+            self._record_call(call, span, error_type, query, query_params)
+            span.end()
+
+    def _record_call(
+            self,
+            call: _Call,
+            span: trace.Span,
+            error_type: str | None,
+            query: str,
+            query_params: dict
+    ) -> None:
+        duration = time.perf_counter() - call.started
+        execution = call.execution if call.execution is not None else max(duration - call.pool_wait, 0.0)
+
+        span.set_attributes({
+            "db.client.connection.wait_time": call.pool_wait,
+            "db.client.execution_time": execution,
+        })
+        if call.rows is not None and call.rows >= 0:
+            span.set_attribute("db.response.returned_rows", call.rows)
+
+        attributes = {"db.query.summary": call.name, "db.operation.name": call.operation}
+        if error_type is not None:
+            attributes["error.type"] = error_type
+        self.duration_histogram.record(duration, attributes)
+        self.pool_wait_histogram.record(call.pool_wait, {"db.query.summary": call.name})
+
+        if execution < self.slow_query_sec:
+            return
+
+        self.logger.warning(f"Медленный запрос к БД: {call.name}", {
+            "db.query.summary": call.name,
+            "db.client.execution_time_ms": round(execution * 1000, 1),
+            "db.client.connection.wait_time_ms": round(call.pool_wait * 1000, 1),
+            "db.response.returned_rows": call.rows,
+            # Значения параметров не пишем: в них имена и тексты организаций
+            "db.query.parameters": json.dumps(_redact(query_params)),
+        })
+        self._maybe_explain(call.name, query, query_params)
+
+    def _maybe_explain(self, name: str, query: str, query_params: dict) -> None:
+        # ANALYZE исполняет запрос, поэтому план снимаем только для чтений
+        if not self.explain_sample_rate or not is_read_only(query) or random.random() >= self.explain_sample_rate:
+            return
+
+        now = time.monotonic()
+        if now - self._explained_at.get(name, float("-inf")) < self.explain_interval_sec:
+            return
+        self._explained_at[name] = now
+
+        # Без дедлайна и транзакции запроса, который оказался медленным
+        task = asyncio.create_task(self._explain(name, query, query_params), context=contextvars.Context())
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, name: str, query: str, query_params: dict) -> None:
+        try:
+            async with self.pool() as session:
+                result = await session.execute(text(explain_analyze + query), query_params)
+                plan = result.scalar()
+                await session.rollback()
+        except Exception as err:
+            self.logger.warning(f"Не удалось снять план медленного запроса {name}: {str(err)}")
+            return
+
+        self.logger.warning(f"План медленного запроса к БД: {name}", {
+            "db.query.summary": name,
+            "db.query.plan": plan if isinstance(plan, str) else json.dumps(plan),
+        })
+
+    @asynccontextmanager
+    async def _session(
+            self,
+            read_only: bool = False,
+            call: _Call = None
+    ) -> AsyncIterator[tuple[AsyncSession, bool]]:
+        # Вне db.transaction() каждый вызов берет свою сессию и коммитит сам
+        transaction = self._transaction.get()
+        if transaction is not None:
+            yield transaction.session, False
+            return
+
+        replica = self._read_replica() if read_only else None
+        if call is not None:
+            call.replica = replica
+        pool = replica.pool if replica is not None else self.pool
+        async with pool() as session:
+            # Соединение берем явно, чтобы отделить ожидание пула от исполнения запроса
+            started = time.perf_counter()
+            await session.connection()
+            if call is not None:
+                call.pool_wait = time.perf_counter() - started
+            await self._apply_deadline(session)
+            yield session, True
+
+    async def _apply_deadline(self, session: AsyncSession) -> None:
+        deadline = self.deadline.get() if self.deadline is not None else None
+        if deadline is None:
+            return
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise common.ErrDeadlineExceeded()
+        # Бюджет почти равен базовому таймауту соединения - лишний запрос к БД не нужен.
+        # Короче - ужесточаем, длиннее (маршрут с увеличенным дедлайном) - ослабляем
+        if self.statement_timeout_sec and \
+                self.statement_timeout_sec - _DEADLINE_SLACK_SEC <= remaining <= self.statement_timeout_sec:
+            return
+
+        timeout_ms = int(remaining * 1000)
+        # SET LOCAL действует до конца транзакции сессии и не протекает в следующий запрос из пула
+        await session.execute(text(set_statement_timeout), {'timeout': f"{timeout_ms}ms"})
+
+    def _read_replica(self) -> _Replica | None:
+        if not self.replicas or time.monotonic() < self._primary_until.get():
+            self.routed_counter.add(1, {"target": "primary"})
+            return None
+
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self.routed_counter.add(1, {"target": "primary"})
+            return None
+
+        self._replica_cursor = (self._replica_cursor + 1) % len(healthy)
+        self.routed_counter.add(1, {"target": "replica"})
+        return healthy[self._replica_cursor]
+
+    def _replica_failed(self, call: _Call, err: Exception) -> bool:
+        if call.replica is None or not _connection_lost(err):
+            return False
+        # Не ждем следующей проверки: остальные чтения сразу уходят на другие хосты
+        self._mark_replica_unavailable(call.replica, err)
+        return True
+
+    def _mark_replica_unavailable(self, replica: _Replica, err: BaseException) -> None:
+        if replica.healthy:
+            # У таймаута проверки пустой текст - пишем хотя бы тип ошибки
+            self.logger.warning(
+                f"Реплика {replica.host} недоступна и выведена из ротации: {str(err) or err.__class__.__name__}"
+            )
+        replica.healthy = False
+        replica.lag_sec = None
+
+    def _pin_primary(self) -> None:
+        # Read-your-writes: после записи чтения этого запроса какое-то время идут в primary
+        if self.replicas:
+            self._primary_until.set(max(self._primary_until.get(), time.monotonic() + self.read_your_writes_sec))
+
+    async def _check_replicas_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.replica_check_interval_sec)
+            try:
+                await self._check_replicas()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self.logger.error(f"Ошибка проверки реплик: {str(err)}")
+
+    async def _check_replicas(self) -> None:
+        # Реплики проверяются параллельно: зависшая не задерживает проверку остальных
+        await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+
+    async def _check_replica(self, replica: _Replica) -> None:
+        try:
+            lag_sec = await asyncio.wait_for(self._replica_lag(replica), self.replica_check_timeout_sec)
+        except Exception as err:
+            self._mark_replica_unavailable(replica, err)
+            return
+
+        self.replica_lag_gauge.set(lag_sec, {"host": replica.host})
+        healthy = lag_sec <= self.max_replica_lag_sec
+        if replica.healthy and not healthy:
+            self.logger.warning(f"Реплика {replica.host} отстает на {lag_sec:.1f} с и выведена из ротации")
+        elif not replica.healthy and healthy:
+            self.logger.info(f"Реплика {replica.host} возвращена в ротацию")
+        replica.healthy = healthy
+        replica.lag_sec = lag_sec
+
+    @staticmethod
+    async def _replica_lag(replica: _Replica) -> float:
+        async with replica.pool() as session:
+            result = await session.execute(text(replica_lag_query))
+            return float(result.scalar())
+
+    async def listen(
+            self,
+            channel: str,
+            on_notify: Callable[[str], None],
+            on_disconnect: Callable[[], None]
+    ) -> Callable[[], Awaitable[None]]:
+        # LISTEN держит отдельное соединение вне пула: оно живет, пока подписка не закрыта
+        connection = await asyncpg.connect(self.dsn)
+        connection.add_termination_listener(lambda _connection: on_disconnect())
+        await connection.add_listener(
+            channel,
+            lambda _connection, _pid, _channel, payload: on_notify(payload)
+        )
+
+        async def close() -> None:
+            if not connection.is_closed():
+                await connection.close()
+
+        return close
+
     async def multi_query(
             self,
             queries: list[str]
     ) -> None:
         async with self.pool() as session:
+            if self.statement_timeout_sec:
+                # Миграции (построение индексов, перезапись таблиц) не ограничены таймаутом запросов
+                await session.execute(text(set_statement_timeout), {'timeout': "0"})
             for query in queries:
                 await session.execute(text(query))
             await session.commit()
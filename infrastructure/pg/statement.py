@@ -0,0 +1,71 @@
+import re
+from functools import lru_cache
+from types import ModuleType
+
+# Имя запроса -> текст; шаблоны с {columns}/{join} хранятся как есть и сопоставляются регуляркой
+_statements: dict[str, str] = {}
+_by_text: dict[str, str] = {}
+_templates: list[tuple[re.Pattern, int, str]] = []
+
+_placeholder = re.compile(r"\{\w+\}")
+_operation = re.compile(r"\b(SELECT|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_table = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+([a-z_][a-z0-9_]*)", re.IGNORECASE)
+_write = re.compile(r"\b(INSERT|DELETE|(?<!FOR )UPDATE)\b", re.IGNORECASE)
+
+
+def register_statements(module: ModuleType, prefix: str = "") -> None:
+    """Регистрирует строковые константы модуля с SQL как именованные запросы."""
+    for name, value in vars(module).items():
+        if name.startswith("_") or not isinstance(value, str) or not _operation.search(value):
+            continue
+
+        full_name = f"{prefix}.{name}" if prefix else name
+        _statements[full_name] = value
+        if _placeholder.search(value):
+            parts = _placeholder.split(value)
+            pattern = re.compile(".*?".join(re.escape(part) for part in parts), re.DOTALL)
+            _templates.append((pattern, sum(len(part) for part in parts), full_name))
+        else:
+            _by_text[value] = full_name
+    statement_name.cache_clear()
+
+
+def registered_statements() -> dict[str, str]:
+    return dict(_statements)
+
+
+@lru_cache(maxsize=4096)
+def statement_name(query: str) -> tuple[str, str]:
+    """Возвращает (имя запроса, операция) для меток метрик и имени span'а.
+
+    Незарегистрированный запрос называется по операции и первой таблице, чтобы
+    число значений метки оставалось ограниченным.
+    """
+    operation = _statement_operation(query)
+
+    name = _by_text.get(query)
+    if name is None:
+        # Под шаблон с более коротким текстом может подойти и чужой запрос - берем самый конкретный
+        matched = [(length, template_name) for pattern, length, template_name in _templates if pattern.fullmatch(query)]
+        if matched:
+            name = max(matched)[1]
+
+    if name is None:
+        table = _table.search(query)
+        name = f"{operation} {table.group(1)}" if table else operation
+
+    return name, operation
+
+
+def _statement_operation(query: str) -> str:
+    # Запрос с изменяющим CTE - запись, даже если внешний запрос SELECT
+    write = _write.search(query)
+    if write is not None:
+        return write.group(1).upper()
+    if _operation.search(query):
+        return "SELECT"
+    return query.strip().split(None, 1)[0].upper() if query.strip() else "UNKNOWN"
+
+
+def is_read_only(query: str) -> bool:
+    return _statement_operation(query) == "SELECT" and not re.search(r"\bFOR\s+UPDATE\b", query, re.IGNORECASE)
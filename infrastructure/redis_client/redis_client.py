@@ -1,6 +1,6 @@
 import redis.asyncio as aioredis
 from redis.connection import ConnectionPool
-from typing import Any
+from typing import Any, AsyncIterator, Callable
 import json
 import asyncio
 
@@ -57,6 +57,123 @@ class RedisClient(interface.IRedis):
         except Exception as e:
             return default
 
+    async def mget(self, *keys: str) -> list[Any]:
+        try:
+            client = await self.get_async_client()
+            values = await client.mget(keys)
+            return [self._deserialize_value(value) if value is not None else None for value in values]
+        except Exception as e:
+            raise e
+
+    async def incr(self, key: str) -> int:
+        try:
+            client = await self.get_async_client()
+            return await client.incr(key)
+        except Exception as e:
+            raise e
+
+    async def publish(self, channel: str, message: Any) -> int:
+        try:
+            client = await self.get_async_client()
+            return await client.publish(channel, self._serialize_value(message))
+        except Exception as e:
+            raise e
+
+    async def subscribe(self, channel: str, on_subscribed: Callable[[], None] = None) -> AsyncIterator[Any]:
+        client = await self.get_async_client()
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield self._deserialize_value(message["data"])
+                elif message["type"] == "subscribe" and on_subscribed is not None:
+                    # Подтверждение от сервера: с этого момента сообщения канала не теряются
+                    on_subscribed()
+        finally:
+            await pubsub.aclose()
+
+    async def xadd(self, stream: str, fields: dict, maxlen: int = None) -> str:
+        try:
+            client = await self.get_async_client()
+            serialized_fields = {key: self._serialize_value(value) for key, value in fields.items()}
+            return await client.xadd(stream, serialized_fields, maxlen=maxlen, approximate=True)
+        except Exception as e:
+            raise e
+
+    async def xgroup_create(self, stream: str, group: str, start_id: str = "0") -> None:
+        try:
+            client = await self.get_async_client()
+            await client.xgroup_create(stream, group, id=start_id, mkstream=True)
+        except aioredis.ResponseError as e:
+            # Группа уже создана другим воркером
+            if "BUSYGROUP" not in str(e):
+                raise e
+
+    async def xreadgroup(
+            self,
+            stream: str,
+            group: str,
+            consumer: str,
+            start_id: str = ">",
+            count: int = 100,
+            block_ms: int = None
+    ) -> list[tuple[str, dict]]:
+        try:
+            client = await self.get_async_client()
+            response = await client.xreadgroup(
+                group,
+                consumer,
+                {stream: start_id},
+                count=count,
+                block=block_ms
+            )
+            if not response:
+                return []
+            return [entry for _, entries in response for entry in entries]
+        except Exception as e:
+            raise e
+
+    async def xack(self, stream: str, group: str, *entry_ids: str) -> int:
+        try:
+            if not entry_ids:
+                return 0
+            client = await self.get_async_client()
+            return await client.xack(stream, group, *entry_ids)
+        except Exception as e:
+            raise e
+
+    async def xautoclaim(
+            self,
+            stream: str,
+            group: str,
+            consumer: str,
+            min_idle_ms: int,
+            start_id: str = "0-0",
+            count: int = 100
+    ) -> tuple[str, list[tuple[str, dict]]]:
+        try:
+            client = await self.get_async_client()
+            response = await client.xautoclaim(
+                stream,
+                group,
+                consumer,
+                min_idle_ms,
+                start_id=start_id,
+                count=count
+            )
+            # Записи, удаленные из стрима, но оставшиеся в PEL, приходят пустыми
+            return response[0], [entry for entry in response[1] if entry and entry[1] is not None]
+        except Exception as e:
+            raise e
+
+    async def xinfo_groups(self, stream: str) -> list[dict]:
+        try:
+            client = await self.get_async_client()
+            return await client.xinfo_groups(stream)
+        except Exception as e:
+            raise e
+
     async def get_async_client(self) -> aioredis.Redis:
         if self.async_client is None:
             self.async_pool = aioredis.ConnectionPool.from_url(
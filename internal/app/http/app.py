@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from internal import model, interface
@@ -8,9 +10,11 @@ def NewHTTP(
         db: interface.IDB,
         organization_controller: interface.IOrganizationController,
         http_middleware: interface.IHttpMiddleware,
-        prefix: str
+        prefix: str,
+        background_workers: list[interface.IBackgroundWorker] = None
 ):
     app = FastAPI(
+        lifespan=lifespan(background_workers or []),
         title="Organization Service API",
         description="API для управления организациями",
         version="1.0.0",
@@ -25,13 +29,30 @@ def NewHTTP(
     return app
 
 
+def lifespan(background_workers: list[interface.IBackgroundWorker]):
+    @asynccontextmanager
+    async def _lifespan(app: FastAPI):
+        for worker in background_workers:
+            await worker.start()
+        try:
+            yield
+        finally:
+            # Останавливаем в обратном порядке, чтобы дочитать очереди до закрытия зависимостей
+            for worker in reversed(background_workers):
+                await worker.stop()
+
+    return _lifespan
+
+
 def include_middleware(
         app: FastAPI,
         http_middleware: interface.IHttpMiddleware,
 ):
     # Порядок middleware важен - они применяются в обратном порядке регистрации
-    http_middleware.authorization_middleware03(app)
-    http_middleware.logger_middleware02(app)
+    http_middleware.authorization_middleware04(app)
+    http_middleware.logger_middleware03(app)
+    # Дедлайн ставится до авторизации, чтобы ее вызов тоже укладывался в бюджет запроса
+    http_middleware.deadline_middleware02(app)
     http_middleware.trace_middleware01(app)
 
 
@@ -59,7 +80,42 @@ def include_organization_handlers(
         tags=["Organization"],
         response_model=GetAllOrganizationsResponse,
         summary="Получить все организации",
-        description="Возвращает список всех организаций"
+        description="Возвращает организации от новых к старым. С limit отдает страницу и next_cursor "
+                    "для следующего запроса; без limit - весь список"
+    )
+
+    # Потоковая выгрузка всех организаций
+    app.add_api_route(
+        prefix + "/all/stream",
+        organization_controller.stream_all_organizations,
+        methods=["GET"],
+        tags=["Organization"],
+        summary="Выгрузить все организации потоком",
+        description="Отдает все организации в формате NDJSON, читая их из БД частями через серверный курсор"
+    )
+
+    # Пакетное получение организаций по списку ID; регистрируется до /{organization_id}
+    app.add_api_route(
+        prefix + "/batch",
+        organization_controller.get_organizations_by_ids,
+        methods=["GET"],
+        tags=["Organization"],
+        response_model=GetOrganizationsBatchResponse,
+        summary="Получить организации по списку ID",
+        description="Принимает ids через запятую и возвращает организации одним запросом к БД в порядке запроса; "
+                    "ненайденные отдаются как null и перечисляются в missing_ids"
+    )
+
+    # Поиск организаций по названию и описанию; регистрируется до /{organization_id}
+    app.add_api_route(
+        prefix + "/search",
+        organization_controller.search_organizations,
+        methods=["GET"],
+        tags=["Organization"],
+        response_model=SearchOrganizationsResponse,
+        summary="Найти организации",
+        description="Ищет по префиксу и нечеткому совпадению названия (pg_trgm) и полнотекстово по правилам бренда, "
+                    "аудитории и доп. информации; результаты отсортированы по релевантности, пагинация через cursor"
     )
 
     # Получение организации по ID
@@ -73,6 +129,17 @@ def include_organization_handlers(
         description="Возвращает информацию об организации по её идентификатору"
     )
 
+    # Траты организации по часам или дням
+    app.add_api_route(
+        prefix + "/{organization_id}/spend",
+        organization_controller.get_organization_spend,
+        methods=["GET"],
+        tags=["Organization"],
+        response_model=GetOrganizationSpendResponse,
+        summary="Получить траты организации",
+        description="Возвращает предрассчитанные суммы пополнений и списаний по часам или дням"
+    )
+
     # Обновление организации
     app.add_api_route(
         prefix + "",
@@ -93,6 +160,39 @@ def include_organization_handlers(
         description="Удаляет организацию по её идентификатору"
     )
 
+    # Пакетное создание организаций
+    app.add_api_route(
+        prefix + "/bulk/create",
+        organization_controller.create_organizations,
+        methods=["POST"],
+        tags=["Organization"],
+        response_model=OrganizationsBulkResponse,
+        summary="Создать организации пакетом",
+        description="Создает организации одним запросом к БД и возвращает id в порядке переданных имен"
+    )
+
+    # Пакетное обновление организаций
+    app.add_api_route(
+        prefix + "/bulk",
+        organization_controller.update_organizations,
+        methods=["PATCH"],
+        tags=["Organization"],
+        response_model=OrganizationsBulkResponse,
+        summary="Обновить организации пакетом",
+        description="Обновляет переданные поля организаций одним UPDATE, результат по каждому элементу"
+    )
+
+    # Пакетное удаление организаций
+    app.add_api_route(
+        prefix + "/bulk/delete",
+        organization_controller.delete_organizations,
+        methods=["POST"],
+        tags=["Organization"],
+        response_model=OrganizationsBulkResponse,
+        summary="Удалить организации пакетом",
+        description="Удаляет организации одним запросом, результат по каждому идентификатору"
+    )
+
     # Пополнение баланса организации
     app.add_api_route(
         prefix + "/balance/top-up",
@@ -113,6 +213,17 @@ def include_organization_handlers(
         description="Списывает указанную сумму с баланса организации (требует межсервисный ключ)"
     )
 
+    # Пакетное изменение балансов нескольких организаций
+    app.add_api_route(
+        prefix + "/balance/batch",
+        organization_controller.apply_balance_batch,
+        methods=["POST"],
+        tags=["Organization"],
+        response_model=BalanceBatchResponse,
+        summary="Пакетно изменить балансы организаций",
+        description="Применяет пополнения и списания для многих организаций одним запросом в БД (требует межсервисный ключ)"
+    )
+
 
 def include_db_handler(app: FastAPI, db: interface.IDB, prefix: str):
     app.add_api_route(
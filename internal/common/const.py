@@ -10,6 +10,8 @@ HTTP_METHOD_KEY = "http.request.method"
 HTTP_STATUS_KEY = "http.response.status_code"
 HTTP_ROUTE_KEY = "http.route"
 HTTP_REQUEST_DURATION_KEY = "http.server.request.duration"
+# Оставшийся бюджет запроса в миллисекундах: приходит от вызывающего и передается дальше по цепочке
+REQUEST_TIMEOUT_MS_HEADER = "x-request-timeout-ms"
 
 TELEGRAM_CHAT_ID_KEY = "telegram.chat.id"
 TELEGRAM_USER_USERNAME_KEY = "telegram.user.username"
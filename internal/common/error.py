@@ -21,4 +21,25 @@ class ErrOrganizationDelete(Exception):
 class ErrInsufficientBalance(Exception):
     def __init__(self, message="Insufficient balance"):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class ErrIdempotencyKeyConflict(Exception):
+    def __init__(self, message="Idempotency key already used for another balance operation"):
+        self.message = message
+        super().__init__(self.message)
+
+class ErrDeadlineExceeded(Exception):
+    def __init__(self, message="Request deadline exceeded"):
+        self.message = message
+        super().__init__(self.message)
+
+class ErrInvalidDateRange(Exception):
+    def __init__(self, message="date_from must be earlier than date_to"):
+        self.message = message
+        super().__init__(self.message)
+
+class ErrUniqueViolation(Exception):
+    def __init__(self, constraint: str = None, message="Unique constraint violated"):
+        self.constraint = constraint
+        self.message = message
+        super().__init__(self.message)
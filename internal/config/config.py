@@ -14,12 +14,102 @@ class Config:
 
         self.interserver_secret_key = os.getenv("LOOM_INTERSERVER_SECRET_KEY", "")
 
+        # Дедлайн запроса по умолчанию и по маршрутам: "/all/stream=0,/balance/batch=60", 0 - без дедлайна.
+        # Заголовок x-request-timeout-ms от вызывающего может только сократить бюджет
+        self.request_timeout_sec = float(os.getenv("LOOM_ORGANIZATION_REQUEST_TIMEOUT_SEC", "30"))
+        self.route_timeouts_sec = {
+            route.strip(): float(timeout)
+            for route, timeout in (
+                item.split("=", 1)
+                for item in os.getenv("LOOM_ORGANIZATION_ROUTE_TIMEOUTS_SEC", "/all/stream=0").split(",")
+                if "=" in item
+            )
+        }
+
+        # Настройки баланса
+        self.check_sufficient_balance = os.getenv("LOOM_ORGANIZATION_CHECK_SUFFICIENT_BALANCE", "false") == "true"
+        self.balance_snapshot_interval = int(os.getenv("LOOM_ORGANIZATION_BALANCE_SNAPSHOT_INTERVAL", "100"))
+        self.balance_batch_max_size = int(os.getenv("LOOM_ORGANIZATION_BALANCE_BATCH_MAX_SIZE", "10000"))
+        self.organizations_batch_max_size = int(os.getenv("LOOM_ORGANIZATION_ORGANIZATIONS_BATCH_MAX_SIZE", "1000"))
+        self.organizations_bulk_max_size = int(os.getenv("LOOM_ORGANIZATION_ORGANIZATIONS_BULK_MAX_SIZE", "1000"))
+        self.organization_loader_enabled = os.getenv("LOOM_ORGANIZATION_LOADER_ENABLED", "true") == "true"
+        self.organization_loader_max_batch_size = int(os.getenv("LOOM_ORGANIZATION_LOADER_MAX_BATCH_SIZE", "1000"))
+        self.organization_cache_enabled = os.getenv("LOOM_ORGANIZATION_CACHE_ENABLED", "false") == "true"
+        self.organization_cache_ttl_sec = float(os.getenv("LOOM_ORGANIZATION_CACHE_TTL_SEC", "5"))
+        self.organization_cache_max_size = int(os.getenv("LOOM_ORGANIZATION_CACHE_MAX_SIZE", "10000"))
+        # Создание организации сбрасывает промах в других воркерах только через канал общего кэша
+        # (LOOM_ORGANIZATION_SHARED_CACHE_ENABLED); без него они отвечают 404 до истечения TTL
+        self.missing_organization_cache_enabled = os.getenv("LOOM_ORGANIZATION_MISSING_CACHE_ENABLED", "false") == "true"
+        self.missing_organization_cache_ttl_sec = float(os.getenv("LOOM_ORGANIZATION_MISSING_CACHE_TTL_SEC", "5"))
+        self.missing_organization_cache_max_size = int(os.getenv("LOOM_ORGANIZATION_MISSING_CACHE_MAX_SIZE", "100000"))
+        self.organizations_stream_chunk_size = int(os.getenv("LOOM_ORGANIZATION_STREAM_CHUNK_SIZE", "1000"))
+        self.debit_write_behind_enabled = os.getenv("LOOM_ORGANIZATION_DEBIT_WRITE_BEHIND_ENABLED", "false") == "true"
+        self.debit_write_behind_flush_interval_ms = int(os.getenv("LOOM_ORGANIZATION_DEBIT_WRITE_BEHIND_FLUSH_INTERVAL_MS", "50"))
+        self.debit_write_behind_max_batch_size = int(os.getenv("LOOM_ORGANIZATION_DEBIT_WRITE_BEHIND_MAX_BATCH_SIZE", "100"))
+
         # Настройки базы данных PostgreSQL
+        # sqlalchemy - PG на AsyncSession, asyncpg - AsyncpgDB на prepared statements
+        self.db_driver = os.getenv("LOOM_ORGANIZATION_DB_DRIVER", "sqlalchemy")
         self.db_host = os.getenv("LOOM_ORGANIZATION_POSTGRES_CONTAINER_NAME", "localhost")
         self.db_port = "5432"
         self.db_name = os.getenv("LOOM_ORGANIZATION_POSTGRES_DB_NAME", "hr_interview")
         self.db_user = os.getenv("LOOM_ORGANIZATION_POSTGRES_USER", "postgres")
         self.db_pass = os.getenv("LOOM_ORGANIZATION_POSTGRES_PASSWORD", "password")
+        # Реплики для чтения через запятую, "host" или "host:port"; пусто - все запросы в primary.
+        # LOOM_ORGANIZATION_POSTGRES_CONTAINER_NAME тоже принимает список хостов для failover primary
+        self.db_replica_hosts = [
+            host.strip()
+            for host in os.getenv("LOOM_ORGANIZATION_POSTGRES_REPLICA_HOSTS", "").split(",")
+            if host.strip()
+        ]
+        self.db_read_your_writes_sec = float(os.getenv("LOOM_ORGANIZATION_DB_READ_YOUR_WRITES_SEC", "2"))
+        self.db_max_replica_lag_sec = float(os.getenv("LOOM_ORGANIZATION_DB_MAX_REPLICA_LAG_SEC", "5"))
+        # Базовый statement_timeout соединений; пока бюджет запроса близок к нему, SET на каждый вызов не нужен.
+        # 0 - не задавать, тогда дедлайн передается в БД перед каждой транзакцией
+        self.db_statement_timeout_sec = float(
+            os.getenv("LOOM_ORGANIZATION_DB_STATEMENT_TIMEOUT_SEC", str(self.request_timeout_sec))
+        )
+        # Запросы дольше порога пишутся в лог медленных запросов; для доли медленных SELECT снимается EXPLAIN ANALYZE
+        self.db_slow_query_ms = float(os.getenv("LOOM_ORGANIZATION_DB_SLOW_QUERY_MS", "200"))
+        self.db_explain_sample_rate = float(os.getenv("LOOM_ORGANIZATION_DB_EXPLAIN_SAMPLE_RATE", "0"))
+
+        # Настройки Redis сервиса
+        self.redis_host = os.getenv("LOOM_ORGANIZATION_REDIS_CONTAINER_NAME", "localhost")
+        self.redis_port = int(os.getenv("LOOM_ORGANIZATION_REDIS_PORT", "6379"))
+        self.redis_db = int(os.getenv("LOOM_ORGANIZATION_REDIS_DB", "0"))
+        self.redis_password = os.getenv("LOOM_ORGANIZATION_REDIS_PASSWORD", "")
+
+        # Настройки in-memory реплики таблицы организаций; требует loom_organization.replica_notify = 'on' в БД
+        self.replica_enabled = os.getenv("LOOM_ORGANIZATION_REPLICA_ENABLED", "false") == "true"
+        self.replica_snapshot_path = os.getenv("LOOM_ORGANIZATION_REPLICA_SNAPSHOT_PATH") or None
+        self.replica_full_resync_interval_sec = float(os.getenv("LOOM_ORGANIZATION_REPLICA_FULL_RESYNC_INTERVAL_SEC", "600"))
+
+        # Настройки общего кэша организаций в Redis
+        self.shared_cache_enabled = os.getenv("LOOM_ORGANIZATION_SHARED_CACHE_ENABLED", "false") == "true"
+        self.shared_cache_ttl_sec = int(os.getenv("LOOM_ORGANIZATION_SHARED_CACHE_TTL_SEC", "300"))
+        self.shared_cache_local_ttl_sec = float(os.getenv("LOOM_ORGANIZATION_SHARED_CACHE_LOCAL_TTL_SEC", "30"))
+        self.shared_cache_invalidation_channel = os.getenv(
+            "LOOM_ORGANIZATION_SHARED_CACHE_INVALIDATION_CHANNEL",
+            "loom-organization:invalidate"
+        )
+
+        # Настройки асинхронного приема списаний через Redis Streams
+        self.balance_stream_enabled = os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_ENABLED", "false") == "true"
+        self.balance_stream_name = os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_NAME", "loom-organization:balance:debits")
+        self.balance_stream_group = os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_GROUP", "loom-organization")
+        self.balance_stream_dead_letter_name = os.getenv(
+            "LOOM_ORGANIZATION_BALANCE_STREAM_DEAD_LETTER_NAME",
+            "loom-organization:balance:debits:dead-letter"
+        )
+        self.balance_stream_batch_size = int(os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_BATCH_SIZE", "500"))
+        self.balance_stream_block_ms = int(os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_BLOCK_MS", "1000"))
+        self.balance_stream_max_attempts = int(os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_MAX_ATTEMPTS", "5"))
+        self.balance_stream_claim_min_idle_ms = int(
+            os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_CLAIM_MIN_IDLE_MS", "60000")
+        )
+        self.balance_stream_claim_interval_sec = float(
+            os.getenv("LOOM_ORGANIZATION_BALANCE_STREAM_CLAIM_INTERVAL_SEC", "30")
+        )
 
         # Настройки телеметрии
         self.alert_tg_bot_token = os.getenv("LOOM_ALERT_TG_BOT_TOKEN", "")
@@ -1,12 +1,19 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
 from decimal import Decimal
+from typing import Literal, AsyncIterator
 
-from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import Request, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from internal import interface
+from internal import interface, model, common
 from internal.controller.http.handler.organization.model import (
     CreateOrganizationBody, UpdateOrganizationBody,
-    TopUpBalanceBody, DebitBalanceBody
+    BulkCreateOrganizationsBody, BulkUpdateOrganizationsBody, BulkDeleteOrganizationsBody,
+    TopUpBalanceBody, DebitBalanceBody, BalanceBatchBody
 )
 from pkg.log_wrapper import auto_log
 
@@ -19,11 +26,19 @@ class OrganizationController(interface.IOrganizationController):
             tel: interface.ITelemetry,
             organization_service: interface.IOrganizationService,
             interserver_secret_key: str,
+            balance_batch_max_size: int = 10000,
+            stream_chunk_size: int = 1000,
+            organizations_batch_max_size: int = 1000,
+            organizations_bulk_max_size: int = 1000,
     ):
         self.tracer = tel.tracer()
         self.logger = tel.logger()
         self.organization_service = organization_service
         self.interserver_secret_key = interserver_secret_key
+        self.balance_batch_max_size = balance_batch_max_size
+        self.stream_chunk_size = stream_chunk_size
+        self.organizations_batch_max_size = organizations_batch_max_size
+        self.organizations_bulk_max_size = organizations_bulk_max_size
 
     @auto_log()
     @traced_method()
@@ -40,8 +55,16 @@ class OrganizationController(interface.IOrganizationController):
 
     @auto_log()
     @traced_method()
-    async def get_organization_by_id(self, request: Request, organization_id: int) -> JSONResponse:
-        organization = await self.organization_service.get_organization_by_id(organization_id)
+    async def get_organization_by_id(
+            self,
+            request: Request,
+            organization_id: int,
+            fields: str = None
+    ) -> JSONResponse:
+        organization = await self.organization_service.get_organization_by_id(
+            organization_id,
+            self._parse_fields(fields)
+        )
         return JSONResponse(
             status_code=200,
             content=organization.to_dict()
@@ -49,15 +72,117 @@ class OrganizationController(interface.IOrganizationController):
 
     @auto_log()
     @traced_method()
-    async def get_all_organizations(self) -> JSONResponse:
-        organizations = await self.organization_service.get_all_organizations()
+    async def get_organizations_by_ids(self, ids: str, fields: str = None) -> JSONResponse:
+        try:
+            organization_ids = [int(organization_id) for organization_id in ids.split(",") if organization_id.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+
+        if not organization_ids:
+            raise HTTPException(status_code=400, detail="ids must not be empty")
+
+        if len(organization_ids) > self.organizations_batch_max_size:
+            self.logger.warning("Превышен размер пакетного запроса организаций")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch size exceeds {self.organizations_batch_max_size} ids"
+            )
+
+        organizations = await self.organization_service.get_organizations_by_ids(
+            organization_ids,
+            self._parse_fields(fields)
+        )
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "organizations": [
+                    organization.to_dict() if organization is not None else None
+                    for organization in organizations
+                ],
+                "missing_ids": list(dict.fromkeys(
+                    organization_id
+                    for organization_id, organization in zip(organization_ids, organizations)
+                    if organization is None
+                ))
+            }
+        )
+
+    @auto_log()
+    @traced_method()
+    async def get_all_organizations(
+            self,
+            limit: int = Query(None, ge=1, le=1000),
+            cursor: str = None,
+            fields: str = None
+    ) -> JSONResponse:
+        after_created_at, after_id = None, None
+        if cursor is not None:
+            after_created_at, after_id = self._decode_cursor(cursor)
+
+        organizations = await self.organization_service.get_all_organizations(
+            limit=limit,
+            after_created_at=after_created_at,
+            after_id=after_id,
+            fields=self._parse_fields(fields)
+        )
+
+        # Неполная страница означает, что дальше ничего нет
+        next_cursor = None
+        if limit is not None and len(organizations) == limit:
+            next_cursor = self._encode_cursor(organizations[-1])
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "organizations": [org.to_dict() for org in organizations],
+                "next_cursor": next_cursor
+            }
+        )
+
+    @auto_log()
+    @traced_method()
+    async def search_organizations(
+            self,
+            q: str = Query(..., min_length=2, max_length=200),
+            limit: int = Query(20, ge=1, le=100),
+            cursor: str = None
+    ) -> JSONResponse:
+        after_rank, after_id = None, None
+        if cursor is not None:
+            after_rank, after_id = self._decode_search_cursor(cursor)
+
+        hits = await self.organization_service.search_organizations(
+            query=q.strip(),
+            limit=limit,
+            after_rank=after_rank,
+            after_id=after_id
+        )
+
+        next_cursor = None
+        if len(hits) == limit:
+            next_cursor = self._encode_search_cursor(hits[-1])
+
         return JSONResponse(
             status_code=200,
             content={
-                "organizations": [org.to_dict() for org in organizations]
+                "organizations": [
+                    {**hit.organization.to_dict(), "rank": hit.rank}
+                    for hit in hits
+                ],
+                "next_cursor": next_cursor
             }
         )
 
+    @auto_log()
+    @traced_method()
+    async def stream_all_organizations(self, fields: str = None) -> StreamingResponse:
+        return StreamingResponse(
+            self._organizations_ndjson(self._parse_fields(fields)),
+            status_code=200,
+            media_type="application/x-ndjson"
+        )
+
     @auto_log()
     @traced_method()
     async def update_organization(self, request: Request, body: UpdateOrganizationBody) -> JSONResponse:
@@ -89,6 +214,50 @@ class OrganizationController(interface.IOrganizationController):
             content={"message": "Organization deleted successfully"}
         )
 
+    @auto_log()
+    @traced_method()
+    async def create_organizations(self, body: BulkCreateOrganizationsBody) -> JSONResponse:
+        self._check_bulk_size(len(body.organizations))
+
+        results = await self.organization_service.create_organizations(
+            [organization.name for organization in body.organizations]
+        )
+        return JSONResponse(
+            status_code=201,
+            content={
+                "results": [result.to_dict() for result in results]
+            }
+        )
+
+    @auto_log()
+    @traced_method()
+    async def update_organizations(self, body: BulkUpdateOrganizationsBody) -> JSONResponse:
+        self._check_bulk_size(len(body.organizations))
+
+        results = await self.organization_service.update_organizations([
+            model.OrganizationUpdate(**organization.model_dump())
+            for organization in body.organizations
+        ])
+        return JSONResponse(
+            status_code=200,
+            content={
+                "results": [result.to_dict() for result in results]
+            }
+        )
+
+    @auto_log()
+    @traced_method()
+    async def delete_organizations(self, body: BulkDeleteOrganizationsBody) -> JSONResponse:
+        self._check_bulk_size(len(body.organization_ids))
+
+        results = await self.organization_service.delete_organizations(body.organization_ids)
+        return JSONResponse(
+            status_code=200,
+            content={
+                "results": [result.to_dict() for result in results]
+            }
+        )
+
     @auto_log()
     @traced_method()
     async def top_up_balance(self, body: TopUpBalanceBody) -> JSONResponse:
@@ -96,16 +265,17 @@ class OrganizationController(interface.IOrganizationController):
             self.logger.warning("Неверный межсервисный ключ для пополнения баланса")
             raise HTTPException(status_code=403, detail="Invalid interserver secret key")
 
-        await self.organization_service.top_up_balance(
-            organization_id=body.organization_id,
-            amount_rub=Decimal(body.amount_rub)
-        )
+        try:
+            operation = await self.organization_service.top_up_balance(
+                organization_id=body.organization_id,
+                amount_rub=Decimal(body.amount_rub),
+                idempotency_key=body.idempotency_key
+            )
+        except common.ErrIdempotencyKeyConflict as err:
+            raise HTTPException(status_code=409, detail=err.message)
         return JSONResponse(
             status_code=200,
-            content={
-                "organization_id": body.organization_id,
-                "amount_rub": body.amount_rub
-            }
+            content=operation.to_dict()
         )
 
     @auto_log()
@@ -115,15 +285,135 @@ class OrganizationController(interface.IOrganizationController):
             self.logger.warning("Неверный межсервисный ключ для списания баланса")
             raise HTTPException(status_code=403, detail="Invalid interserver secret key")
 
-        await self.organization_service.debit_balance(
-            organization_id=body.organization_id,
-            amount_rub=Decimal(body.amount_rub)
+        try:
+            operation = await self.organization_service.debit_balance(
+                organization_id=body.organization_id,
+                amount_rub=Decimal(body.amount_rub),
+                idempotency_key=body.idempotency_key
+            )
+        except common.ErrIdempotencyKeyConflict as err:
+            raise HTTPException(status_code=409, detail=err.message)
+        except common.ErrInsufficientBalance as err:
+            raise HTTPException(status_code=402, detail=err.message)
+
+        return JSONResponse(
+            status_code=200,
+            content=operation.to_dict()
         )
 
+    @auto_log()
+    @traced_method()
+    async def apply_balance_batch(self, body: BalanceBatchBody) -> JSONResponse:
+        if body.interserver_secret_key != self.interserver_secret_key:
+            self.logger.warning("Неверный межсервисный ключ для пакетной операции с балансом")
+            raise HTTPException(status_code=403, detail="Invalid interserver secret key")
+
+        if len(body.operations) > self.balance_batch_max_size:
+            self.logger.warning("Превышен размер пакета операций с балансом")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch size exceeds {self.balance_batch_max_size} operations"
+            )
+
+        results = await self.organization_service.apply_balance_batch([
+            model.BalanceBatchOperation(
+                organization_id=operation.organization_id,
+                delta_rub=Decimal(operation.delta_rub),
+                idempotency_key=operation.idempotency_key
+            )
+            for operation in body.operations
+        ])
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "results": [result.to_dict() for result in results]
+            }
+        )
+
+    @auto_log()
+    @traced_method()
+    async def get_organization_spend(
+            self,
+            organization_id: int,
+            granularity: Literal["hour", "day"] = "day",
+            date_from: datetime = None,
+            date_to: datetime = None
+    ) -> JSONResponse:
+        try:
+            buckets = await self.organization_service.get_organization_spend(
+                organization_id=organization_id,
+                granularity=granularity,
+                date_from=date_from,
+                date_to=date_to
+            )
+        except common.ErrInvalidDateRange as err:
+            raise HTTPException(status_code=400, detail=err.message)
         return JSONResponse(
             status_code=200,
             content={
-                "organization_id": body.organization_id,
-                "amount_rub": body.amount_rub
+                "organization_id": organization_id,
+                "granularity": granularity,
+                "buckets": [bucket.to_dict() for bucket in buckets]
             }
         )
+
+    async def _organizations_ndjson(self, fields: list[str] | None) -> AsyncIterator[bytes]:
+        async for organizations in self.organization_service.stream_all_organizations(
+                self.stream_chunk_size,
+                fields
+        ):
+            yield "".join(
+                json.dumps(org.to_dict(), ensure_ascii=False) + "\n" for org in organizations
+            ).encode()
+
+    def _check_bulk_size(self, size: int) -> None:
+        if size > self.organizations_bulk_max_size:
+            self.logger.warning("Превышен размер пакетного изменения организаций")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Bulk size exceeds {self.organizations_bulk_max_size} organizations"
+            )
+
+    @staticmethod
+    def _encode_cursor(organization: model.Organization) -> str:
+        raw = f"{organization.created_at.isoformat()}|{organization.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+        try:
+            created_at, organization_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.fromisoformat(created_at), int(organization_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    @staticmethod
+    def _encode_search_cursor(hit: model.OrganizationSearchHit) -> str:
+        # repr дает кратчайшую запись float, которая читается обратно без потери точности
+        raw = f"{hit.rank!r}|{hit.organization.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _decode_search_cursor(cursor: str) -> tuple[float, int]:
+        try:
+            rank, organization_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            after_rank = float(rank)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not math.isfinite(after_rank) or not organization_id.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return after_rank, int(organization_id)
+
+    @staticmethod
+    def _parse_fields(fields: str | None) -> list[str] | None:
+        # fields=name,rub_balance -> ["name", "rub_balance"]; пустое значение - все поля
+        if not fields:
+            return None
+
+        parsed = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown_fields = [name for name in parsed if name not in model.ORGANIZATION_FIELDS]
+        if unknown_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown_fields)}")
+
+        return parsed or None
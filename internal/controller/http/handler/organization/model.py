@@ -19,16 +19,41 @@ class UpdateOrganizationBody(BaseModel):
     additional_info: list[str] = None
 
 
+class BulkCreateOrganizationsBody(BaseModel):
+    organizations: list[CreateOrganizationBody]
+
+
+class BulkUpdateOrganizationsBody(BaseModel):
+    organizations: list[UpdateOrganizationBody]
+
+
+class BulkDeleteOrganizationsBody(BaseModel):
+    organization_ids: list[int]
+
+
 class TopUpBalanceBody(BaseModel):
     organization_id: int
     amount_rub: str
     interserver_secret_key: str
+    idempotency_key: str = None
 
 
 class DebitBalanceBody(BaseModel):
     organization_id: int
     interserver_secret_key: str
     amount_rub: str
+    idempotency_key: str = None
+
+
+class BalanceBatchOperationBody(BaseModel):
+    organization_id: int
+    delta_rub: str
+    idempotency_key: str
+
+
+class BalanceBatchBody(BaseModel):
+    interserver_secret_key: str
+    operations: list[BalanceBatchOperationBody]
 
 
 # Response models
@@ -42,3 +67,28 @@ class GetOrganizationResponse(BaseModel):
 
 class GetAllOrganizationsResponse(BaseModel):
     organizations: list[dict]
+    next_cursor: str | None = None
+
+
+class SearchOrganizationsResponse(BaseModel):
+    organizations: list[dict]
+    next_cursor: str | None = None
+
+
+class GetOrganizationsBatchResponse(BaseModel):
+    organizations: list[dict | None]
+    missing_ids: list[int]
+
+
+class OrganizationsBulkResponse(BaseModel):
+    results: list[dict]
+
+
+class BalanceBatchResponse(BaseModel):
+    results: list[dict]
+
+
+class GetOrganizationSpendResponse(BaseModel):
+    organization_id: int
+    granularity: str
+    buckets: list[dict]
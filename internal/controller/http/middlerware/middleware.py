@@ -1,3 +1,4 @@
+import asyncio
 import time
 import traceback
 from contextvars import ContextVar
@@ -19,6 +20,10 @@ class HttpMiddleware(interface.IHttpMiddleware):
             loom_authorization_client: interface.ILoomAuthorizationClient,
             prefix: str,
             log_context: ContextVar[dict],
+            request_deadline: ContextVar[float | None] = None,
+            request_timeout_sec: float = 0.0,
+            route_timeouts_sec: dict[str, float] = None,
+            uncancellable_routes: tuple[str, ...] = ("/balance/",),
     ):
         self.tracer = tel.tracer()
         self.meter = tel.meter()
@@ -26,6 +31,24 @@ class HttpMiddleware(interface.IHttpMiddleware):
         self.prefix = prefix
         self.loom_authorization_client = loom_authorization_client
         self.log_context = log_context
+        self.request_deadline = request_deadline
+        self.request_timeout_sec = request_timeout_sec
+        # Самый длинный префикс пути выигрывает: "/all/stream" важнее "/all"
+        self.route_timeouts_sec = sorted(
+            (route_timeouts_sec or {}).items(),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        # Операции с балансом не прерываются по дедлайну: отмена после коммита вернула бы 504
+        # на уже проведенное списание, а повтор без ключа идемпотентности списал бы дважды.
+        # Дедлайн для них ограничивает только запросы в БД через statement_timeout, до коммита
+        self.uncancellable_routes = uncancellable_routes
+
+        self.deadline_exceeded_counter = self.meter.create_counter(
+            name="http.server.deadline_exceeded",
+            unit="{request}",
+            description="Запросы, прерванные по истечении дедлайна: on_arrival, in_flight"
+        )
 
     def trace_middleware01(self, app: FastAPI):
         @app.middleware("http")
@@ -73,9 +96,43 @@ class HttpMiddleware(interface.IHttpMiddleware):
 
         return _trace_middleware01
 
-    def logger_middleware02(self, app: FastAPI):
+    def deadline_middleware02(self, app: FastAPI):
         @app.middleware("http")
-        async def _logger_middleware02(request: Request, call_next: Callable):
+        async def _deadline_middleware02(request: Request, call_next: Callable):
+            timeout_sec = self._request_timeout_sec(request)
+            if timeout_sec is None:
+                return await call_next(request)
+
+            if timeout_sec <= 0:
+                # Вызывающий уже не дождется ответа - не занимаем очередь и пул соединений
+                self.deadline_exceeded_counter.add(1, {"stage": "on_arrival"})
+                return JSONResponse(status_code=504, content={"error": "deadline exceeded"})
+
+            deadline = time.monotonic() + timeout_sec
+            deadline_token = self.request_deadline.set(deadline)
+            try:
+                if self._is_uncancellable(request):
+                    return await call_next(request)
+                return await asyncio.wait_for(call_next(request), timeout_sec)
+            except (asyncio.TimeoutError, common.ErrDeadlineExceeded):
+                self.deadline_exceeded_counter.add(1, {"stage": "in_flight"})
+                self.logger.warning("Запрос прерван по истечении дедлайна")
+                return JSONResponse(status_code=504, content={"error": "deadline exceeded"})
+            except Exception:
+                # statement_timeout в БД и таймауты upstream после дедлайна - тоже 504, а не 500
+                if time.monotonic() >= deadline:
+                    self.deadline_exceeded_counter.add(1, {"stage": "in_flight"})
+                    self.logger.warning("Запрос прерван по истечении дедлайна")
+                    return JSONResponse(status_code=504, content={"error": "deadline exceeded"})
+                raise
+            finally:
+                self.request_deadline.reset(deadline_token)
+
+        return _deadline_middleware02
+
+    def logger_middleware03(self, app: FastAPI):
+        @app.middleware("http")
+        async def _logger_middleware03(request: Request, call_next: Callable):
             context_token = self.log_context.set({
                 common.TELEGRAM_USER_USERNAME_KEY: request.headers.get(common.TELEGRAM_USER_USERNAME_KEY, ""),
                 common.TELEGRAM_CHAT_ID_KEY: request.headers.get(common.TELEGRAM_CHAT_ID_KEY, "0"),
@@ -95,11 +152,11 @@ class HttpMiddleware(interface.IHttpMiddleware):
             finally:
                 self.log_context.reset(context_token)
 
-        return _logger_middleware02
+        return _logger_middleware03
 
-    def authorization_middleware03(self, app: FastAPI):
+    def authorization_middleware04(self, app: FastAPI):
         @app.middleware("http")
-        async def _authorization_middleware03(
+        async def _authorization_middleware04(
                 request: Request,
                 call_next: Callable
         ):
@@ -135,4 +192,33 @@ class HttpMiddleware(interface.IHttpMiddleware):
                     span.set_status(StatusCode.ERROR, str(e))
                     raise e
 
-        return _authorization_middleware03
+        return _authorization_middleware04
+
+    def _is_uncancellable(self, request: Request) -> bool:
+        path = request.url.path.removeprefix(self.prefix)
+        return request.method != "GET" and path.startswith(self.uncancellable_routes)
+
+    def _request_timeout_sec(self, request: Request) -> float | None:
+        if self.request_deadline is None:
+            return None
+
+        timeout_sec = self.request_timeout_sec
+        path = request.url.path.removeprefix(self.prefix)
+        for route, route_timeout_sec in self.route_timeouts_sec:
+            if path.startswith(route):
+                timeout_sec = route_timeout_sec
+                break
+        # 0 - у маршрута нет собственного дедлайна
+        timeout_sec = timeout_sec or None
+
+        # Заголовок вызывающего может только сократить бюджет маршрута
+        header = request.headers.get(common.REQUEST_TIMEOUT_MS_HEADER)
+        if header is not None:
+            try:
+                header_timeout_sec = int(header) / 1000
+            except ValueError:
+                header_timeout_sec = None
+            if header_timeout_sec is not None and (timeout_sec is None or header_timeout_sec < timeout_sec):
+                timeout_sec = header_timeout_sec
+
+        return timeout_sec
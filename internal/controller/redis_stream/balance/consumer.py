@@ -0,0 +1,264 @@
+import asyncio
+import os
+import socket
+import time
+import traceback
+from decimal import Decimal, InvalidOperation
+
+from internal import interface, model
+
+# organization_id - INTEGER в Postgres
+MAX_ORGANIZATION_ID = 2 ** 31 - 1
+MAX_AMOUNT_RUB = Decimal("1000000000000")
+# Ключ лежит в уникальном btree-индексе, строка индекса ограничена ~2.7 КБ
+MAX_IDEMPOTENCY_KEY_LENGTH = 256
+
+
+class BalanceStreamConsumer(interface.IBackgroundWorker):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            redis: interface.IRedis,
+            organization_service: interface.IOrganizationService,
+            stream: str,
+            group: str,
+            dead_letter_stream: str,
+            batch_size: int = 500,
+            block_ms: int = 1000,
+            max_attempts: int = 5,
+            retry_delay_sec: float = 1.0,
+            lag_report_interval_sec: float = 5.0,
+            consumer: str = None,
+            claim_min_idle_ms: int = 60000,
+            claim_interval_sec: float = 30.0,
+    ):
+        self.logger = tel.logger()
+        self.meter = tel.meter()
+        self.redis = redis
+        self.organization_service = organization_service
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = dead_letter_stream
+        # У каждого процесса свой PEL: воркеры uvicorn на одном хосте не должны делить сообщения.
+        # PEL процесса, который не вернется после рестарта, забирает XAUTOCLAIM
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.max_attempts = max_attempts
+        self.retry_delay_sec = retry_delay_sec
+        self.lag_report_interval_sec = lag_report_interval_sec
+        self.claim_min_idle_ms = claim_min_idle_ms
+        self.claim_interval_sec = claim_interval_sec
+
+        self._lag_reported_at = 0.0
+        self._claimed_at = 0.0
+        # Позиция XAUTOCLAIM внутри текущего прохода по PEL группы
+        self._claim_start_id = "0-0"
+        self._task: asyncio.Task | None = None
+        # Число неудачных попыток применения по id записи стрима
+        self._attempts: dict[str, int] = {}
+
+        self.messages_counter = self.meter.create_counter(
+            name="balance.stream.messages",
+            unit="{message}",
+            description="Обработанные сообщения стрима списаний по статусу"
+        )
+        self.batch_size_histogram = self.meter.create_histogram(
+            name="balance.stream.batch.size",
+            unit="{message}",
+            description="Количество сообщений, примененных одной транзакцией"
+        )
+        self.claimed_counter = self.meter.create_counter(
+            name="balance.stream.claimed",
+            unit="{message}",
+            description="Сообщения, забранные у потребителей, которые не подтвердили их вовремя"
+        )
+        self.lag_gauge = self.meter.create_gauge(
+            name="balance.stream.lag",
+            unit="{message}",
+            description="Сообщения стрима, еще не доставленные группе потребителей"
+        )
+        self.pending_gauge = self.meter.create_gauge(
+            name="balance.stream.pending",
+            unit="{message}",
+            description="Доставленные, но не подтвержденные сообщения группы потребителей"
+        )
+
+    async def start(self) -> None:
+        await self.redis.xgroup_create(self.stream, self.group)
+        self._task = asyncio.create_task(self._run())
+        self.logger.info("Потребитель стрима списаний запущен")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.logger.info("Потребитель стрима списаний остановлен")
+
+    async def _run(self) -> None:
+        # Сначала дочитываем свои неподтвержденные сообщения, затем новые
+        start_id = "0"
+        while True:
+            try:
+                entries = await self.redis.xreadgroup(
+                    self.stream,
+                    self.group,
+                    self.consumer,
+                    start_id=start_id,
+                    count=self.batch_size,
+                    block_ms=self.block_ms
+                )
+                if entries:
+                    await self._process(entries)
+                elif start_id == "0":
+                    start_id = ">"
+
+                await self._claim_stale()
+                await self._record_lag()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self.logger.error(f"Ошибка обработки стрима списаний: {str(err)}", {
+                    "traceback": traceback.format_exc(),
+                })
+                start_id = "0"
+                await asyncio.sleep(self.retry_delay_sec)
+
+    async def _process(self, entries: list[tuple[str, dict]]) -> None:
+        parsed: list[tuple[str, dict, model.BalanceBatchOperation]] = []
+        dead_letters: list[tuple[str, dict, str]] = []
+
+        for entry_id, fields in entries:
+            operation, reason = self._parse(entry_id, fields)
+            if operation is None:
+                dead_letters.append((entry_id, fields, reason))
+            else:
+                parsed.append((entry_id, fields, operation))
+
+        done_ids = []
+        failure = None
+        if parsed:
+            try:
+                results = await self.organization_service.apply_balance_batch(
+                    [operation for _, _, operation in parsed]
+                )
+            except Exception as err:
+                # Одно сообщение, которое не проходит в БД, не должно держать весь батч:
+                # применяем по одному, чтобы найти его и подтвердить остальные
+                self.logger.warning(f"Батч стрима списаний не применен, применяем по одному: {str(err)}")
+                results, failure = await self._apply_one_by_one(parsed)
+
+            applied = 0
+            for (entry_id, fields, _), result in zip(parsed, results):
+                if result is None:
+                    # Неподтвержденное сообщение будет перечитано, исчерпавшее попытки уходит в dead-letter
+                    self._attempts[entry_id] = self._attempts.get(entry_id, 0) + 1
+                    if self._attempts[entry_id] >= self.max_attempts:
+                        dead_letters.append((entry_id, fields, "max attempts exceeded"))
+                elif result.status in (model.BALANCE_BATCH_STATUS_APPLIED, model.BALANCE_BATCH_STATUS_REPLAYED):
+                    applied += 1
+                    done_ids.append(entry_id)
+                    self.messages_counter.add(1, {"status": result.status})
+                else:
+                    dead_letters.append((entry_id, fields, result.status))
+            if applied:
+                self.batch_size_histogram.record(applied)
+
+        for entry_id, fields, reason in dead_letters:
+            await self.redis.xadd(self.dead_letter_stream, {
+                **fields,
+                "source_stream": self.stream,
+                "source_id": entry_id,
+                "error": reason,
+            })
+            done_ids.append(entry_id)
+            self.messages_counter.add(1, {"status": "dead_letter"})
+
+        # ACK только после коммита и записи в dead-letter
+        await self.redis.xack(self.stream, self.group, *done_ids)
+        for entry_id in done_ids:
+            self._attempts.pop(entry_id, None)
+
+        if failure is not None:
+            raise failure
+
+    async def _apply_one_by_one(
+            self,
+            parsed: list[tuple[str, dict, model.BalanceBatchOperation]]
+    ) -> tuple[list[model.BalanceBatchResult | None], Exception | None]:
+        results = []
+        failure = None
+        for entry_id, _, operation in parsed:
+            try:
+                results.append((await self.organization_service.apply_balance_batch([operation]))[0])
+            except Exception as err:
+                self.logger.warning(f"Сообщение стрима списаний {entry_id} не применено: {str(err)}")
+                results.append(None)
+                failure = err
+        return results, failure
+
+    def _parse(self, entry_id: str, fields: dict) -> tuple[model.BalanceBatchOperation | None, str | None]:
+        # Значения проверяются до запроса: вне диапазона колонок они уронили бы весь батч в БД
+        try:
+            organization_id = int(fields["organization_id"])
+            amount_rub = Decimal(fields["amount_rub"])
+            idempotency_key = fields.get("idempotency_key") or f"{self.stream}:{entry_id}"
+        except (KeyError, ValueError, TypeError, InvalidOperation) as err:
+            return None, f"invalid message: {err.__class__.__name__}"
+
+        if not 0 < organization_id <= MAX_ORGANIZATION_ID:
+            return None, "invalid message: organization_id out of range"
+        # Отрицательная сумма превратила бы списание в пополнение, а NaN/Infinity испортили бы баланс
+        if not amount_rub.is_finite() or amount_rub <= 0 or amount_rub > MAX_AMOUNT_RUB:
+            return None, "invalid message: amount_rub out of range"
+        if not isinstance(idempotency_key, str) or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return None, "invalid message: idempotency_key too long"
+
+        return model.BalanceBatchOperation(
+            organization_id=organization_id,
+            delta_rub=-amount_rub,
+            # Без ключа от продюсера идемпотентность дает сам id записи стрима
+            idempotency_key=idempotency_key
+        ), None
+
+    async def _claim_stale(self) -> None:
+        # Сообщения упавшего или переименованного потребителя иначе навсегда остались бы в его PEL
+        now = time.monotonic()
+        if self._claim_start_id == "0-0" and now - self._claimed_at < self.claim_interval_sec:
+            return
+
+        next_id, entries = await self.redis.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            self.claim_min_idle_ms,
+            start_id=self._claim_start_id,
+            count=self.batch_size
+        )
+        if entries:
+            self.claimed_counter.add(len(entries), {"stream": self.stream, "group": self.group})
+            self.logger.warning("Забраны неподтвержденные сообщения стрима списаний", {
+                "count": len(entries),
+            })
+            await self._process(entries)
+
+        self._claim_start_id = next_id
+        if next_id == "0-0":
+            self._claimed_at = now
+
+    async def _record_lag(self) -> None:
+        now = time.monotonic()
+        if now - self._lag_reported_at < self.lag_report_interval_sec:
+            return
+        self._lag_reported_at = now
+
+        groups = await self.redis.xinfo_groups(self.stream)
+        for group in groups:
+            if group.get("name") != self.group:
+                continue
+            attributes = {"stream": self.stream, "group": self.group}
+            if group.get("lag") is not None:
+                self.lag_gauge.set(group["lag"], attributes)
+            self.pending_gauge.set(group.get("pending", 0), attributes)
@@ -1,6 +1,6 @@
 import io
 from abc import abstractmethod
-from typing import Protocol, Sequence, Any
+from typing import Protocol, Sequence, Any, AsyncIterator, AsyncContextManager, Awaitable, Callable
 
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
@@ -48,10 +48,13 @@ class IHttpMiddleware(Protocol):
     def trace_middleware01(self, app: FastAPI): pass
 
     @abstractmethod
-    def logger_middleware02(self, app: FastAPI): pass
+    def deadline_middleware02(self, app: FastAPI): pass
 
     @abstractmethod
-    def authorization_middleware03(self, app: FastAPI): pass
+    def logger_middleware03(self, app: FastAPI): pass
+
+    @abstractmethod
+    def authorization_middleware04(self, app: FastAPI): pass
 
 
 class IRedis(Protocol):
@@ -61,9 +64,72 @@ class IRedis(Protocol):
     @abstractmethod
     async def get(self, key: str, default: Any = None) -> Any: pass
 
+    @abstractmethod
+    async def mget(self, *keys: str) -> list[Any]: pass
+
+    @abstractmethod
+    async def incr(self, key: str) -> int: pass
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Any) -> int: pass
+
+    @abstractmethod
+    def subscribe(self, channel: str, on_subscribed: Callable[[], None] = None) -> AsyncIterator[Any]: pass
+
+    @abstractmethod
+    async def xadd(self, stream: str, fields: dict, maxlen: int = None) -> str: pass
+
+    @abstractmethod
+    async def xgroup_create(self, stream: str, group: str, start_id: str = "0") -> None: pass
+
+    @abstractmethod
+    async def xreadgroup(
+            self,
+            stream: str,
+            group: str,
+            consumer: str,
+            start_id: str = ">",
+            count: int = 100,
+            block_ms: int = None
+    ) -> list[tuple[str, dict]]: pass
+
+    @abstractmethod
+    async def xack(self, stream: str, group: str, *entry_ids: str) -> int: pass
+
+    @abstractmethod
+    async def xautoclaim(
+            self,
+            stream: str,
+            group: str,
+            consumer: str,
+            min_idle_ms: int,
+            start_id: str = "0-0",
+            count: int = 100
+    ) -> tuple[str, list[tuple[str, dict]]]: pass
+
+    @abstractmethod
+    async def xinfo_groups(self, stream: str) -> list[dict]: pass
+
+
+class IBackgroundWorker(Protocol):
+    @abstractmethod
+    async def start(self) -> None: pass
+
+    @abstractmethod
+    async def stop(self) -> None: pass
+
 
 class IDB(Protocol):
 
+    @abstractmethod
+    def transaction(self) -> AsyncContextManager[None]: pass
+
+    @abstractmethod
+    def after_commit(self, callback: Callable[[], None]) -> None: pass
+
+    @abstractmethod
+    def primary(self) -> AsyncContextManager[None]: pass
+
     @abstractmethod
     async def insert(self, query: str, query_params: dict) -> int: pass
 
@@ -73,8 +139,22 @@ class IDB(Protocol):
     @abstractmethod
     async def update(self, query: str, query_params: dict) -> None: pass
 
+    @abstractmethod
+    async def update_returning(self, query: str, query_params: dict) -> Sequence[Any]: pass
+
     @abstractmethod
     async def select(self, query: str, query_params: dict) -> Sequence[Any]: pass
 
+    @abstractmethod
+    def stream(self, query: str, query_params: dict, chunk_size: int = 1000) -> AsyncIterator[Sequence[Any]]: pass
+
+    @abstractmethod
+    async def listen(
+            self,
+            channel: str,
+            on_notify: Callable[[str], None],
+            on_disconnect: Callable[[], None]
+    ) -> Callable[[], Awaitable[None]]: pass
+
     @abstractmethod
     async def multi_query(self, queries: list[str]) -> None: pass
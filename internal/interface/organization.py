@@ -1,11 +1,13 @@
 from abc import abstractmethod
+from datetime import datetime
 from decimal import Decimal
-from typing import Protocol
+from typing import Protocol, AsyncIterator, AsyncContextManager, Awaitable, Callable
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi import Request
 
 from internal import model
+from internal.interface.general import IBackgroundWorker
 from internal.controller.http.handler.organization.model import *
 
 
@@ -18,11 +20,23 @@ class IOrganizationController(Protocol):
         pass
 
     @abstractmethod
-    async def get_organization_by_id(self, request: Request,  organization_id: int) -> JSONResponse:
+    async def get_organization_by_id(self, request: Request,  organization_id: int, fields: str = None) -> JSONResponse:
         pass
 
     @abstractmethod
-    async def get_all_organizations(self) -> JSONResponse:
+    async def get_organizations_by_ids(self, ids: str, fields: str = None) -> JSONResponse:
+        pass
+
+    @abstractmethod
+    async def get_all_organizations(self, limit: int = None, cursor: str = None, fields: str = None) -> JSONResponse:
+        pass
+
+    @abstractmethod
+    async def search_organizations(self, q: str, limit: int = 20, cursor: str = None) -> JSONResponse:
+        pass
+
+    @abstractmethod
+    async def stream_all_organizations(self, fields: str = None) -> StreamingResponse:
         pass
 
     @abstractmethod
@@ -37,6 +51,18 @@ class IOrganizationController(Protocol):
     async def delete_organization(self, organization_id: int) -> JSONResponse:
         pass
 
+    @abstractmethod
+    async def create_organizations(self, body: BulkCreateOrganizationsBody) -> JSONResponse:
+        pass
+
+    @abstractmethod
+    async def update_organizations(self, body: BulkUpdateOrganizationsBody) -> JSONResponse:
+        pass
+
+    @abstractmethod
+    async def delete_organizations(self, body: BulkDeleteOrganizationsBody) -> JSONResponse:
+        pass
+
     @abstractmethod
     async def top_up_balance(self, body: TopUpBalanceBody) -> JSONResponse:
         pass
@@ -45,6 +71,20 @@ class IOrganizationController(Protocol):
     async def debit_balance(self, body: DebitBalanceBody) -> JSONResponse:
         pass
 
+    @abstractmethod
+    async def apply_balance_batch(self, body: BalanceBatchBody) -> JSONResponse:
+        pass
+
+    @abstractmethod
+    async def get_organization_spend(
+            self,
+            organization_id: int,
+            granularity: str = "day",
+            date_from: datetime = None,
+            date_to: datetime = None
+    ) -> JSONResponse:
+        pass
+
 
 class IOrganizationService(Protocol):
     @abstractmethod
@@ -55,11 +95,43 @@ class IOrganizationService(Protocol):
         pass
 
     @abstractmethod
-    async def get_organization_by_id(self, organization_id: int) -> model.Organization:
+    async def get_organization_by_id(self, organization_id: int, fields: list[str] = None) -> model.Organization:
         pass
 
     @abstractmethod
-    async def get_all_organizations(self) -> list[model.Organization]:
+    async def get_organizations_by_ids(
+            self,
+            organization_ids: list[int],
+            fields: list[str] = None
+    ) -> list[model.Organization | None]:
+        pass
+
+    @abstractmethod
+    async def get_all_organizations(
+            self,
+            limit: int = None,
+            after_created_at: datetime = None,
+            after_id: int = None,
+            fields: list[str] = None
+    ) -> list[model.Organization]:
+        pass
+
+    @abstractmethod
+    async def search_organizations(
+            self,
+            query: str,
+            limit: int,
+            after_rank: float = None,
+            after_id: int = None
+    ) -> list[model.OrganizationSearchHit]:
+        pass
+
+    @abstractmethod
+    def stream_all_organizations(
+            self,
+            chunk_size: int = 1000,
+            fields: list[str] = None
+    ) -> AsyncIterator[list[model.Organization]]:
         pass
 
     @abstractmethod
@@ -84,15 +156,137 @@ class IOrganizationService(Protocol):
         pass
 
     @abstractmethod
-    async def top_up_balance(self, organization_id: int, amount_rub: Decimal) -> None:
+    async def create_organizations(self, names: list[str]) -> list[model.OrganizationBulkResult]:
+        pass
+
+    @abstractmethod
+    async def update_organizations(
+            self,
+            updates: list[model.OrganizationUpdate]
+    ) -> list[model.OrganizationBulkResult]:
+        pass
+
+    @abstractmethod
+    async def delete_organizations(self, organization_ids: list[int]) -> list[model.OrganizationBulkResult]:
+        pass
+
+    @abstractmethod
+    async def top_up_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str = None
+    ) -> model.BalanceOperation:
+        pass
+
+    @abstractmethod
+    async def debit_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str = None
+    ) -> model.BalanceOperation:
+        pass
+
+    @abstractmethod
+    async def apply_balance_batch(
+            self,
+            operations: list[model.BalanceBatchOperation]
+    ) -> list[model.BalanceBatchResult]:
+        pass
+
+    @abstractmethod
+    async def get_organization_spend(
+            self,
+            organization_id: int,
+            granularity: str = model.SPEND_GRANULARITY_DAY,
+            date_from: datetime = None,
+            date_to: datetime = None
+    ) -> list[model.SpendBucket]:
+        pass
+
+
+class IDebitCoalescer(IBackgroundWorker, Protocol):
+    @abstractmethod
+    async def debit(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str
+    ) -> model.BalanceOperation | None:
+        pass
+
+
+class IOrganizationLoader(Protocol):
+    @abstractmethod
+    async def load(self, organization_id: int) -> model.Organization | None:
+        pass
+
+    @abstractmethod
+    def clear(self, organization_id: int) -> None:
+        pass
+
+
+class IOrganizationCache(IBackgroundWorker, Protocol):
+    @abstractmethod
+    async def get_or_load(
+            self,
+            organization_id: int,
+            load: Callable[[], Awaitable[model.Organization | None]]
+    ) -> model.Organization | None:
+        pass
+
+    @abstractmethod
+    async def invalidate(self, *organization_ids: int) -> None:
+        pass
+
+
+class IMissingOrganizationCache(Protocol):
+    @abstractmethod
+    def is_missing(self, organization_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    def generation(self, organization_id: int) -> tuple[int, int]:
+        pass
+
+    @abstractmethod
+    def remember(self, organization_id: int, generation: tuple[int, int]) -> None:
+        pass
+
+    @abstractmethod
+    def forget(self, organization_id: int) -> None:
         pass
 
+
+class IOrganizationReplica(IBackgroundWorker, Protocol):
     @abstractmethod
-    async def debit_balance(self, organization_id: int, amount_rub: Decimal) -> None:
+    def is_healthy(self) -> bool:
+        pass
+
+    @abstractmethod
+    def get(self, organization_id: int) -> model.Organization | None:
+        pass
+
+    @abstractmethod
+    def get_many(self, organization_ids: list[int]) -> list[model.Organization]:
+        pass
+
+    @abstractmethod
+    def get_all(
+            self,
+            limit: int = None,
+            after_created_at: datetime = None,
+            after_id: int = None
+    ) -> list[model.Organization]:
         pass
 
 
 class IOrganizationRepo(Protocol):
+    @abstractmethod
+    def transaction(self) -> AsyncContextManager[None]:
+        pass
+
     @abstractmethod
     async def create_organization(
             self,
@@ -101,11 +295,47 @@ class IOrganizationRepo(Protocol):
         pass
 
     @abstractmethod
-    async def get_organization_by_id(self, organization_id: int) -> list[model.Organization]:
+    async def get_organization_by_id(
+            self,
+            organization_id: int,
+            fields: list[str] = None
+    ) -> list[model.Organization]:
         pass
 
     @abstractmethod
-    async def get_all_organizations(self) -> list[model.Organization]:
+    async def get_organizations_by_ids(
+            self,
+            organization_ids: list[int],
+            fields: list[str] = None
+    ) -> list[model.Organization]:
+        pass
+
+    @abstractmethod
+    async def get_all_organizations(
+            self,
+            limit: int = None,
+            after_created_at: datetime = None,
+            after_id: int = None,
+            fields: list[str] = None
+    ) -> list[model.Organization]:
+        pass
+
+    @abstractmethod
+    async def search_organizations(
+            self,
+            query: str,
+            limit: int,
+            after_rank: float = None,
+            after_id: int = None
+    ) -> list[model.OrganizationSearchHit]:
+        pass
+
+    @abstractmethod
+    def stream_all_organizations(
+            self,
+            chunk_size: int = 1000,
+            fields: list[str] = None
+    ) -> AsyncIterator[list[model.Organization]]:
         pass
 
     @abstractmethod
@@ -122,13 +352,79 @@ class IOrganizationRepo(Protocol):
             products: list[dict] = None,
             locale: dict = None,
             additional_info: list[str] = None,
-    ) -> None:
+    ) -> bool:
         pass
 
     @abstractmethod
-    async def delete_organization(self, organization_id: int) -> None:
+    async def delete_organization(self, organization_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def create_organizations(self, names: list[str]) -> list[int]:
+        pass
+
+    @abstractmethod
+    async def update_organizations(self, updates: list[model.OrganizationUpdate]) -> list[int]:
+        pass
+
+    @abstractmethod
+    async def delete_organizations(self, organization_ids: list[int]) -> list[int]:
+        pass
+
+    @abstractmethod
+    async def top_up_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str
+    ) -> list[model.BalanceOperation]:
+        pass
+
+    @abstractmethod
+    async def debit_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str,
+            check_balance: bool = False
+    ) -> list[model.BalanceOperation]:
+        pass
+
+    @abstractmethod
+    async def apply_balance_batch(
+            self,
+            organization_ids: list[int],
+            deltas_rub: list[Decimal],
+            idempotency_keys: list[str],
+            check_balance: bool = False
+    ) -> list[model.BalanceOperation]:
         pass
 
     @abstractmethod
-    async def update_balance(self, organization_id: int, rub_balance: str) -> None:
+    async def rebuild_organization_balance(self, organization_id: int) -> model.BalanceReconciliation | None:
+        pass
+
+    @abstractmethod
+    async def get_balance_operation_by_idempotency_key(self, idempotency_key: str) -> list[model.BalanceOperation]:
+        pass
+
+    @abstractmethod
+    async def get_balance_operations_by_idempotency_keys(
+            self,
+            idempotency_keys: list[str]
+    ) -> list[model.BalanceOperation]:
+        pass
+
+    @abstractmethod
+    async def get_existing_organization_ids(self, organization_ids: list[int]) -> list[int]:
+        pass
+
+    @abstractmethod
+    async def get_organization_spend(
+            self,
+            organization_id: int,
+            granularity: str,
+            date_from: datetime,
+            date_to: datetime
+    ) -> list[model.SpendBucket]:
         pass
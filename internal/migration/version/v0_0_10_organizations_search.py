@@ -0,0 +1,86 @@
+from internal import interface
+from internal.migration.base import Migration, MigrationInfo
+
+
+class OrganizationsSearchMigration(Migration):
+
+    def get_info(self) -> MigrationInfo:
+        return MigrationInfo(
+            version="v0_0_10",
+            name="organizations_search",
+            depends_on="v0_0_9"
+        )
+
+    async def up(self, db: interface.IDB):
+        queries = [
+            create_pg_trgm_extension,
+            create_organization_search_document_function,
+            add_organizations_search_document,
+            create_organizations_search_document_index,
+            create_organizations_name_trgm_index
+        ]
+
+        await db.multi_query(queries)
+
+    async def down(self, db: interface.IDB):
+        queries = [
+            drop_organizations_name_trgm_index,
+            drop_organizations_search_document_index,
+            drop_organizations_search_document,
+            drop_organization_search_document_function
+        ]
+
+        await db.multi_query(queries)
+
+create_pg_trgm_extension = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+"""
+
+# array_to_string помечена STABLE, а выражение генерируемой колонки должно быть IMMUTABLE;
+# для TEXT[] результат от настроек сессии не зависит, поэтому обертка честно IMMUTABLE
+create_organization_search_document_function = """
+CREATE OR REPLACE FUNCTION organization_search_document(
+    brand_rules TEXT[],
+    audience_insights TEXT[],
+    additional_info TEXT[]
+) RETURNS TSVECTOR
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT setweight(to_tsvector('russian'::regconfig, COALESCE(array_to_string(brand_rules, ' '), '')), 'A') ||
+           setweight(to_tsvector('russian'::regconfig, COALESCE(array_to_string(audience_insights, ' '), '')), 'B') ||
+           setweight(to_tsvector('russian'::regconfig, COALESCE(array_to_string(additional_info, ' '), '')), 'C')
+$$;
+"""
+
+# Перезаписывает таблицу целиком: на больших объемах запускать в окно обслуживания
+add_organizations_search_document = """
+ALTER TABLE organizations
+    ADD COLUMN IF NOT EXISTS search_document TSVECTOR
+        GENERATED ALWAYS AS (organization_search_document(brand_rules, audience_insights, additional_info)) STORED;
+"""
+
+create_organizations_search_document_index = """
+CREATE INDEX IF NOT EXISTS organizations_search_document_idx
+    ON organizations USING GIN (search_document);
+"""
+
+# Один индекс обслуживает и префикс (LIKE 'abc%'), и нечеткое совпадение (%)
+create_organizations_name_trgm_index = """
+CREATE INDEX IF NOT EXISTS organizations_name_trgm_idx
+    ON organizations USING GIN (lower(name) gin_trgm_ops);
+"""
+
+drop_organizations_name_trgm_index = """
+DROP INDEX IF EXISTS organizations_name_trgm_idx;
+"""
+
+drop_organizations_search_document_index = """
+DROP INDEX IF EXISTS organizations_search_document_idx;
+"""
+
+drop_organizations_search_document = """
+ALTER TABLE organizations DROP COLUMN IF EXISTS search_document;
+"""
+
+drop_organization_search_document_function = """
+DROP FUNCTION IF EXISTS organization_search_document(TEXT[], TEXT[], TEXT[]);
+"""
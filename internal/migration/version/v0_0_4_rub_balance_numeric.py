@@ -0,0 +1,42 @@
+from internal import interface
+from internal.migration.base import Migration, MigrationInfo
+
+
+class RubBalanceNumericMigration(Migration):
+
+    def get_info(self) -> MigrationInfo:
+        return MigrationInfo(
+            version="v0_0_4",
+            name="rub_balance_numeric",
+            depends_on="v0_0_3"
+        )
+
+    async def up(self, db: interface.IDB):
+        queries = [
+            alter_rub_balance_to_numeric
+        ]
+
+        await db.multi_query(queries)
+
+    async def down(self, db: interface.IDB):
+        queries = [
+            alter_rub_balance_to_text
+        ]
+
+        await db.multi_query(queries)
+
+alter_rub_balance_to_numeric = """
+ALTER TABLE organizations
+    ALTER COLUMN rub_balance DROP DEFAULT,
+    ALTER COLUMN rub_balance TYPE NUMERIC USING COALESCE(NULLIF(TRIM(rub_balance), ''), '0')::NUMERIC,
+    ALTER COLUMN rub_balance SET DEFAULT 0,
+    ALTER COLUMN rub_balance SET NOT NULL;
+"""
+
+alter_rub_balance_to_text = """
+ALTER TABLE organizations
+    ALTER COLUMN rub_balance DROP NOT NULL,
+    ALTER COLUMN rub_balance DROP DEFAULT,
+    ALTER COLUMN rub_balance TYPE TEXT USING rub_balance::TEXT,
+    ALTER COLUMN rub_balance SET DEFAULT '0';
+"""
@@ -0,0 +1,77 @@
+from internal import interface
+from internal.migration.base import Migration, MigrationInfo
+
+
+class BalanceLedgerMigration(Migration):
+
+    def get_info(self) -> MigrationInfo:
+        return MigrationInfo(
+            version="v0_0_5",
+            name="balance_ledger",
+            depends_on="v0_0_4"
+        )
+
+    async def up(self, db: interface.IDB):
+        queries = [
+            create_balance_operations_table,
+            create_balance_operations_organization_index,
+            create_balance_snapshots_table,
+            create_balance_snapshots_organization_index,
+            insert_initial_balance_snapshots
+        ]
+
+        await db.multi_query(queries)
+
+    async def down(self, db: interface.IDB):
+        queries = [
+            drop_balance_snapshots_table,
+            drop_balance_operations_table
+        ]
+
+        await db.multi_query(queries)
+
+create_balance_operations_table = """
+CREATE TABLE IF NOT EXISTS balance_operations (
+    id BIGSERIAL PRIMARY KEY,
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    operation_type TEXT NOT NULL,
+    amount_rub NUMERIC NOT NULL,
+    rub_balance_after NUMERIC NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+create_balance_operations_organization_index = """
+CREATE INDEX IF NOT EXISTS balance_operations_organization_id_idx
+    ON balance_operations (organization_id, id);
+"""
+
+create_balance_snapshots_table = """
+CREATE TABLE IF NOT EXISTS balance_snapshots (
+    id BIGSERIAL PRIMARY KEY,
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    last_operation_id BIGINT NOT NULL,
+    rub_balance NUMERIC NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+create_balance_snapshots_organization_index = """
+CREATE INDEX IF NOT EXISTS balance_snapshots_organization_id_idx
+    ON balance_snapshots (organization_id, last_operation_id DESC);
+"""
+
+# Балансы, накопленные до появления журнала, фиксируются стартовым снимком
+insert_initial_balance_snapshots = """
+INSERT INTO balance_snapshots (organization_id, last_operation_id, rub_balance)
+SELECT id, 0, rub_balance FROM organizations;
+"""
+
+drop_balance_snapshots_table = """
+DROP TABLE IF EXISTS balance_snapshots;
+"""
+
+drop_balance_operations_table = """
+DROP TABLE IF EXISTS balance_operations;
+"""
@@ -0,0 +1,91 @@
+from internal import interface
+from internal.migration.base import Migration, MigrationInfo
+
+
+class OrganizationBalancesMigration(Migration):
+
+    def get_info(self) -> MigrationInfo:
+        return MigrationInfo(
+            version="v0_0_6",
+            name="organization_balances",
+            depends_on="v0_0_5"
+        )
+
+    async def up(self, db: interface.IDB):
+        queries = [
+            create_organization_balances_table,
+            copy_rub_balance_to_organization_balances,
+            alter_organizations_drop_rub_balance,
+            alter_organizations_profile_compression
+        ]
+
+        await db.multi_query(queries)
+
+    async def down(self, db: interface.IDB):
+        queries = [
+            alter_organizations_restore_rub_balance,
+            copy_rub_balance_to_organizations,
+            drop_organization_balances_table
+        ]
+
+        await db.multi_query(queries)
+
+# Узкая горячая таблица: обновление баланса не переписывает строку профиля,
+# а запас места на странице (fillfactor) оставляет обновления HOT
+create_organization_balances_table = """
+CREATE TABLE IF NOT EXISTS organization_balances (
+    organization_id INTEGER PRIMARY KEY REFERENCES organizations(id) ON DELETE CASCADE,
+    rub_balance NUMERIC NOT NULL DEFAULT 0
+) WITH (
+    fillfactor = 70,
+    autovacuum_vacuum_scale_factor = 0.01
+);
+"""
+
+copy_rub_balance_to_organization_balances = """
+INSERT INTO organization_balances (organization_id, rub_balance)
+SELECT id, rub_balance FROM organizations
+ON CONFLICT (organization_id) DO NOTHING;
+"""
+
+alter_organizations_drop_rub_balance = """
+ALTER TABLE organizations
+    DROP COLUMN IF EXISTS rub_balance;
+"""
+
+# lz4 для TOAST доступен с PostgreSQL 14 и только в сборках с поддержкой lz4
+alter_organizations_profile_compression = """
+DO $$
+BEGIN
+    IF current_setting('server_version_num')::INTEGER >= 140000 THEN
+        ALTER TABLE organizations
+            ALTER COLUMN tone_of_voice SET COMPRESSION lz4,
+            ALTER COLUMN brand_rules SET COMPRESSION lz4,
+            ALTER COLUMN compliance_rules SET COMPRESSION lz4,
+            ALTER COLUMN audience_insights SET COMPRESSION lz4,
+            ALTER COLUMN products SET COMPRESSION lz4,
+            ALTER COLUMN locale SET COMPRESSION lz4,
+            ALTER COLUMN additional_info SET COMPRESSION lz4;
+    END IF;
+EXCEPTION
+    WHEN feature_not_supported OR invalid_parameter_value THEN
+        RAISE NOTICE 'lz4 compression is not available, keeping default';
+END
+$$;
+"""
+
+alter_organizations_restore_rub_balance = """
+ALTER TABLE organizations
+    ADD COLUMN IF NOT EXISTS rub_balance NUMERIC NOT NULL DEFAULT 0;
+"""
+
+copy_rub_balance_to_organizations = """
+UPDATE organizations o
+SET rub_balance = b.rub_balance
+FROM organization_balances b
+WHERE b.organization_id = o.id;
+"""
+
+drop_organization_balances_table = """
+DROP TABLE IF EXISTS organization_balances;
+"""
@@ -0,0 +1,154 @@
+from internal import interface
+from internal.migration.base import Migration, MigrationInfo
+
+
+class OrganizationSpendRollupsMigration(Migration):
+
+    def get_info(self) -> MigrationInfo:
+        return MigrationInfo(
+            version="v0_0_7",
+            name="organization_spend_rollups",
+            depends_on="v0_0_6"
+        )
+
+    async def up(self, db: interface.IDB):
+        queries = [
+            create_organization_spend_hourly_table,
+            create_organization_spend_daily_table,
+            create_spend_rollup_function,
+            create_spend_rollup_trigger,
+            backfill_organization_spend_hourly,
+            backfill_organization_spend_daily
+        ]
+
+        await db.multi_query(queries)
+
+    async def down(self, db: interface.IDB):
+        queries = [
+            drop_spend_rollup_trigger,
+            drop_spend_rollup_function,
+            drop_organization_spend_daily_table,
+            drop_organization_spend_hourly_table
+        ]
+
+        await db.multi_query(queries)
+
+create_organization_spend_hourly_table = """
+CREATE TABLE IF NOT EXISTS organization_spend_hourly (
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    bucket_start TIMESTAMP NOT NULL,
+    top_up_rub NUMERIC NOT NULL DEFAULT 0,
+    debit_rub NUMERIC NOT NULL DEFAULT 0,
+    operations_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (organization_id, bucket_start)
+);
+"""
+
+create_organization_spend_daily_table = """
+CREATE TABLE IF NOT EXISTS organization_spend_daily (
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    bucket_start TIMESTAMP NOT NULL,
+    top_up_rub NUMERIC NOT NULL DEFAULT 0,
+    debit_rub NUMERIC NOT NULL DEFAULT 0,
+    operations_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (organization_id, bucket_start)
+);
+"""
+
+# Триггер уровня оператора: пачка операций из одного INSERT агрегируется одним upsert
+# в той же транзакции, что и изменение баланса.
+# created_at - TIMESTAMP во времени TimeZone записавшей сессии; корзины считаются в UTC явно,
+# иначе граница часа и суток зависела бы от настройки сессии
+create_spend_rollup_function = """
+CREATE OR REPLACE FUNCTION balance_operations_spend_rollup() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO organization_spend_hourly AS s (
+        organization_id, bucket_start, top_up_rub, debit_rub, operations_count
+    )
+    SELECT
+        organization_id,
+        date_trunc('hour', created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'top_up'), 0),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'debit'), 0),
+        COUNT(*)
+    FROM new_operations
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (organization_id, bucket_start) DO UPDATE SET
+        top_up_rub = s.top_up_rub + EXCLUDED.top_up_rub,
+        debit_rub = s.debit_rub + EXCLUDED.debit_rub,
+        operations_count = s.operations_count + EXCLUDED.operations_count;
+
+    INSERT INTO organization_spend_daily AS s (
+        organization_id, bucket_start, top_up_rub, debit_rub, operations_count
+    )
+    SELECT
+        organization_id,
+        date_trunc('day', created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'top_up'), 0),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'debit'), 0),
+        COUNT(*)
+    FROM new_operations
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (organization_id, bucket_start) DO UPDATE SET
+        top_up_rub = s.top_up_rub + EXCLUDED.top_up_rub,
+        debit_rub = s.debit_rub + EXCLUDED.debit_rub,
+        operations_count = s.operations_count + EXCLUDED.operations_count;
+
+    RETURN NULL;
+END
+$$;
+"""
+
+create_spend_rollup_trigger = """
+CREATE TRIGGER balance_operations_spend_rollup
+    AFTER INSERT ON balance_operations
+    REFERENCING NEW TABLE AS new_operations
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION balance_operations_spend_rollup();
+"""
+
+# Бэкфилл переводит created_at из TimeZone сессии миграции: она должна совпадать с той, в которой писались операции
+backfill_organization_spend_hourly = """
+INSERT INTO organization_spend_hourly (organization_id, bucket_start, top_up_rub, debit_rub, operations_count)
+SELECT
+    organization_id,
+    date_trunc('hour', created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'),
+    COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'top_up'), 0),
+    COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'debit'), 0),
+    COUNT(*)
+FROM balance_operations
+GROUP BY 1, 2
+ON CONFLICT (organization_id, bucket_start) DO NOTHING;
+"""
+
+backfill_organization_spend_daily = """
+INSERT INTO organization_spend_daily (organization_id, bucket_start, top_up_rub, debit_rub, operations_count)
+SELECT
+    organization_id,
+    date_trunc('day', created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'),
+    COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'top_up'), 0),
+    COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'debit'), 0),
+    COUNT(*)
+FROM balance_operations
+GROUP BY 1, 2
+ON CONFLICT (organization_id, bucket_start) DO NOTHING;
+"""
+
+drop_spend_rollup_trigger = """
+DROP TRIGGER IF EXISTS balance_operations_spend_rollup ON balance_operations;
+"""
+
+drop_spend_rollup_function = """
+DROP FUNCTION IF EXISTS balance_operations_spend_rollup();
+"""
+
+drop_organization_spend_daily_table = """
+DROP TABLE IF EXISTS organization_spend_daily;
+"""
+
+drop_organization_spend_hourly_table = """
+DROP TABLE IF EXISTS organization_spend_hourly;
+"""
@@ -0,0 +1,55 @@
+from internal import interface
+from internal.migration.base import Migration, MigrationInfo
+
+
+class OrganizationsKeysetIndexMigration(Migration):
+
+    def get_info(self) -> MigrationInfo:
+        return MigrationInfo(
+            version="v0_0_8",
+            name="organizations_keyset_index",
+            depends_on="v0_0_7"
+        )
+
+    async def up(self, db: interface.IDB):
+        queries = [
+            fill_organizations_created_at,
+            alter_organizations_created_at_not_null,
+            create_organizations_created_at_id_index
+        ]
+
+        await db.multi_query(queries)
+
+    async def down(self, db: interface.IDB):
+        queries = [
+            drop_organizations_created_at_id_index,
+            alter_organizations_created_at_drop_not_null
+        ]
+
+        await db.multi_query(queries)
+
+# Keyset-пагинация сравнивает (created_at, id), поэтому NULL в created_at недопустим
+fill_organizations_created_at = """
+UPDATE organizations
+SET created_at = CURRENT_TIMESTAMP
+WHERE created_at IS NULL;
+"""
+
+alter_organizations_created_at_not_null = """
+ALTER TABLE organizations
+    ALTER COLUMN created_at SET NOT NULL;
+"""
+
+create_organizations_created_at_id_index = """
+CREATE INDEX IF NOT EXISTS organizations_created_at_id_idx
+    ON organizations (created_at DESC, id DESC);
+"""
+
+drop_organizations_created_at_id_index = """
+DROP INDEX IF EXISTS organizations_created_at_id_idx;
+"""
+
+alter_organizations_created_at_drop_not_null = """
+ALTER TABLE organizations
+    ALTER COLUMN created_at DROP NOT NULL;
+"""
@@ -0,0 +1,159 @@
+from internal import interface
+from internal.migration.base import Migration, MigrationInfo
+
+
+class OrganizationsReplicaNotifyMigration(Migration):
+
+    def get_info(self) -> MigrationInfo:
+        return MigrationInfo(
+            version="v0_0_9",
+            name="organizations_replica_notify",
+            depends_on="v0_0_8"
+        )
+
+    async def up(self, db: interface.IDB):
+        queries = [
+            create_organizations_replica_notify_function,
+            create_organization_balances_replica_notify_function,
+            drop_organizations_replica_notify_insert_trigger,
+            create_organizations_replica_notify_insert_trigger,
+            drop_organizations_replica_notify_update_trigger,
+            create_organizations_replica_notify_update_trigger,
+            drop_organizations_replica_notify_delete_trigger,
+            create_organizations_replica_notify_delete_trigger,
+            drop_organization_balances_replica_notify_trigger,
+            create_organization_balances_replica_notify_trigger
+        ]
+
+        await db.multi_query(queries)
+
+    async def down(self, db: interface.IDB):
+        queries = [
+            drop_organizations_replica_notify_insert_trigger,
+            drop_organizations_replica_notify_update_trigger,
+            drop_organizations_replica_notify_delete_trigger,
+            drop_organization_balances_replica_notify_trigger,
+            drop_organizations_replica_notify_function,
+            drop_organization_balances_replica_notify_function
+        ]
+
+        await db.multi_query(queries)
+
+# Уведомления для in-memory реплики. NOTIFY берет глобальную блокировку на коммите,
+# поэтому триггеры шлют его, только если включено loom_organization.replica_notify = 'on'
+create_organizations_replica_notify_function = """
+CREATE OR REPLACE FUNCTION organizations_replica_notify() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed_ids TEXT;
+    changed_count INTEGER;
+BEGIN
+    IF COALESCE(current_setting('loom_organization.replica_notify', true), 'off') <> 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT string_agg(DISTINCT id::TEXT, ','), COUNT(DISTINCT id)
+    INTO changed_ids, changed_count
+    FROM changed_rows;
+
+    IF changed_count = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    -- Полезная нагрузка NOTIFY ограничена 8000 байтами: большие пачки реплика перечитывает целиком
+    IF changed_count > 500 THEN
+        PERFORM pg_notify('organizations_changed', '*');
+    ELSE
+        PERFORM pg_notify('organizations_changed', changed_ids);
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+create_organization_balances_replica_notify_function = """
+CREATE OR REPLACE FUNCTION organization_balances_replica_notify() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed_ids TEXT;
+    changed_count INTEGER;
+BEGIN
+    IF COALESCE(current_setting('loom_organization.replica_notify', true), 'off') <> 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT string_agg(DISTINCT organization_id::TEXT, ','), COUNT(DISTINCT organization_id)
+    INTO changed_ids, changed_count
+    FROM changed_rows;
+
+    IF changed_count = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    IF changed_count > 500 THEN
+        PERFORM pg_notify('organizations_changed', '*');
+    ELSE
+        PERFORM pg_notify('organizations_changed', changed_ids);
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+drop_organizations_replica_notify_insert_trigger = """
+DROP TRIGGER IF EXISTS organizations_replica_notify_insert ON organizations;
+"""
+
+create_organizations_replica_notify_insert_trigger = """
+CREATE TRIGGER organizations_replica_notify_insert
+    AFTER INSERT ON organizations
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organizations_replica_notify();
+"""
+
+drop_organizations_replica_notify_update_trigger = """
+DROP TRIGGER IF EXISTS organizations_replica_notify_update ON organizations;
+"""
+
+create_organizations_replica_notify_update_trigger = """
+CREATE TRIGGER organizations_replica_notify_update
+    AFTER UPDATE ON organizations
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organizations_replica_notify();
+"""
+
+drop_organizations_replica_notify_delete_trigger = """
+DROP TRIGGER IF EXISTS organizations_replica_notify_delete ON organizations;
+"""
+
+create_organizations_replica_notify_delete_trigger = """
+CREATE TRIGGER organizations_replica_notify_delete
+    AFTER DELETE ON organizations
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organizations_replica_notify();
+"""
+
+drop_organization_balances_replica_notify_trigger = """
+DROP TRIGGER IF EXISTS organization_balances_replica_notify ON organization_balances;
+"""
+
+create_organization_balances_replica_notify_trigger = """
+CREATE TRIGGER organization_balances_replica_notify
+    AFTER UPDATE ON organization_balances
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organization_balances_replica_notify();
+"""
+
+drop_organizations_replica_notify_function = """
+DROP FUNCTION IF EXISTS organizations_replica_notify();
+"""
+
+drop_organization_balances_replica_notify_function = """
+DROP FUNCTION IF EXISTS organization_balances_replica_notify();
+"""
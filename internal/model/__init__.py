@@ -1,3 +1,4 @@
 from internal.model.sql_model import *
 from internal.model.client.loom_authorization import *
-from internal.model.organization import *
\ No newline at end of file
+from internal.model.organization import *
+from internal.model.balance import *
\ No newline at end of file
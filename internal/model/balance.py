@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+BALANCE_OPERATION_TOP_UP = "top_up"
+BALANCE_OPERATION_DEBIT = "debit"
+
+# Имя, которое PostgreSQL дал ограничению UNIQUE на balance_operations.idempotency_key
+BALANCE_OPERATION_IDEMPOTENCY_KEY_CONSTRAINT = "balance_operations_idempotency_key_key"
+
+
+@dataclass
+class BalanceOperation:
+    id: int
+    organization_id: int
+    idempotency_key: str
+    operation_type: str
+    amount_rub: Decimal
+    rub_balance_after: Decimal
+    created_at: datetime
+    replayed: bool = False
+
+    @classmethod
+    def serialize(cls, rows) -> list['BalanceOperation']:
+        return [
+            cls(
+                id=row.id,
+                organization_id=row.organization_id,
+                idempotency_key=row.idempotency_key,
+                operation_type=row.operation_type,
+                amount_rub=row.amount_rub,
+                rub_balance_after=row.rub_balance_after,
+                created_at=row.created_at
+            )
+            for row in rows
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "operation_id": self.id,
+            "organization_id": self.organization_id,
+            "idempotency_key": self.idempotency_key,
+            "operation_type": self.operation_type,
+            "amount_rub": str(self.amount_rub),
+            "rub_balance": str(self.rub_balance_after),
+            "replayed": self.replayed,
+            "created_at": self.created_at.isoformat()
+        }
+
+
+@dataclass
+class BalanceReconciliation:
+    organization_id: int
+    rub_balance: Decimal
+    # Баланс, пересчитанный из последнего снимка и операций журнала после него
+    rebuilt_rub_balance: Decimal
+    snapshot_operation_id: int | None
+
+    @property
+    def matches(self) -> bool:
+        return self.rub_balance == self.rebuilt_rub_balance
+
+    @classmethod
+    def serialize(cls, rows) -> list['BalanceReconciliation']:
+        return [
+            cls(
+                organization_id=row.organization_id,
+                rub_balance=row.rub_balance,
+                rebuilt_rub_balance=row.rebuilt_rub_balance,
+                snapshot_operation_id=row.snapshot_operation_id
+            )
+            for row in rows
+        ]
+
+
+BALANCE_BATCH_STATUS_APPLIED = "applied"
+BALANCE_BATCH_STATUS_REPLAYED = "replayed"
+BALANCE_BATCH_STATUS_CONFLICT = "idempotency_key_conflict"
+BALANCE_BATCH_STATUS_NOT_FOUND = "organization_not_found"
+BALANCE_BATCH_STATUS_INSUFFICIENT_BALANCE = "insufficient_balance"
+
+
+@dataclass
+class BalanceBatchOperation:
+    organization_id: int
+    delta_rub: Decimal
+    idempotency_key: str
+
+    @property
+    def operation_type(self) -> str:
+        return BALANCE_OPERATION_DEBIT if self.delta_rub < 0 else BALANCE_OPERATION_TOP_UP
+
+
+@dataclass
+class BalanceBatchResult:
+    organization_id: int
+    idempotency_key: str
+    status: str
+    operation: BalanceOperation = None
+
+    def to_dict(self) -> dict:
+        return {
+            "organization_id": self.organization_id,
+            "idempotency_key": self.idempotency_key,
+            "status": self.status,
+            "operation_id": self.operation.id if self.operation else None,
+            "rub_balance": str(self.operation.rub_balance_after) if self.operation else None
+        }
+
+
+SPEND_GRANULARITY_HOUR = "hour"
+SPEND_GRANULARITY_DAY = "day"
+
+
+@dataclass
+class SpendBucket:
+    bucket_start: datetime
+    top_up_rub: Decimal
+    debit_rub: Decimal
+    operations_count: int
+
+    @classmethod
+    def serialize(cls, rows) -> list['SpendBucket']:
+        return [
+            cls(
+                bucket_start=row.bucket_start,
+                top_up_rub=row.top_up_rub,
+                debit_rub=row.debit_rub,
+                operations_count=row.operations_count
+            )
+            for row in rows
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "bucket_start": self.bucket_start.isoformat(),
+            "top_up_rub": str(self.top_up_rub),
+            "debit_rub": str(self.debit_rub),
+            "operations_count": self.operations_count
+        }
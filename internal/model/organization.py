@@ -1,7 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
 
+ORGANIZATION_FIELDS = (
+    "id",
+    "name",
+    "rub_balance",
+    "video_cut_description_end_sample",
+    "publication_text_end_sample",
+    "tone_of_voice",
+    "brand_rules",
+    "compliance_rules",
+    "audience_insights",
+    "products",
+    "locale",
+    "additional_info",
+    "created_at",
+)
+
 
 @dataclass
 class Organization:
@@ -18,33 +34,57 @@ class Organization:
     locale: dict
     additional_info: list[str]
     created_at: datetime
+    # Поля, прочитанные из БД при проекции; None - организация загружена целиком
+    loaded_fields: tuple[str, ...] | None = field(default=None, repr=False, compare=False)
 
     @classmethod
-    def serialize(cls, rows) -> list['Organization']:
-        return [
-            cls(
-                id=row.id,
-                name=row.name,
-                rub_balance=Decimal(str(row.rub_balance)),
-                video_cut_description_end_sample=row.video_cut_description_end_sample,
-                publication_text_end_sample=row.publication_text_end_sample,
-                tone_of_voice=row.tone_of_voice or [],
-                brand_rules=row.brand_rules or [],
-                compliance_rules=row.compliance_rules or [],
-                audience_insights=row.audience_insights or [],
-                products=row.products or [],
-                locale=row.locale or {},
-                additional_info=row.additional_info or [],
-                created_at=row.created_at
-            )
-            for row in rows
-        ]
+    def serialize(cls, rows, fields: list[str] = None) -> list['Organization']:
+        # Не выбранные в проекции колонки отсутствуют в строке и остаются пустыми
+        loaded_fields = tuple(fields) if fields else None
+        organizations = []
+        for row in rows:
+            data = row._mapping
+            organizations.append(cls(
+                id=data.get("id"),
+                name=data.get("name"),
+                rub_balance=data.get("rub_balance"),
+                video_cut_description_end_sample=data.get("video_cut_description_end_sample"),
+                publication_text_end_sample=data.get("publication_text_end_sample"),
+                tone_of_voice=data.get("tone_of_voice") or [],
+                brand_rules=data.get("brand_rules") or [],
+                compliance_rules=data.get("compliance_rules") or [],
+                audience_insights=data.get("audience_insights") or [],
+                products=data.get("products") or [],
+                locale=data.get("locale") or {},
+                additional_info=data.get("additional_info") or [],
+                created_at=data.get("created_at"),
+                loaded_fields=loaded_fields
+            ))
+        return organizations
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Organization':
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            rub_balance=Decimal(data["rub_balance"]),
+            video_cut_description_end_sample=data["video_cut_description_end_sample"],
+            publication_text_end_sample=data["publication_text_end_sample"],
+            tone_of_voice=data["tone_of_voice"],
+            brand_rules=data["brand_rules"],
+            compliance_rules=data["compliance_rules"],
+            audience_insights=data["audience_insights"],
+            products=data["products"],
+            locale=data["locale"],
+            additional_info=data["additional_info"],
+            created_at=datetime.fromisoformat(data["created_at"])
+        )
 
     def to_dict(self) -> dict:
-        return {
+        data = {
             "id": self.id,
             "name": self.name,
-            "rub_balance": str(self.rub_balance),
+            "rub_balance": str(self.rub_balance) if self.rub_balance is not None else None,
             "video_cut_description_end_sample": self.video_cut_description_end_sample,
             "publication_text_end_sample": self.publication_text_end_sample,
             "tone_of_voice": self.tone_of_voice,
@@ -54,5 +94,62 @@ class Organization:
             "products": self.products,
             "locale": self.locale,
             "additional_info": self.additional_info,
-            "created_at": self.created_at.isoformat()
-        }
\ No newline at end of file
+            "created_at": self.created_at.isoformat() if self.created_at is not None else None
+        }
+        if self.loaded_fields is None:
+            return data
+
+        return {name: data[name] for name in self.loaded_fields}
+
+@dataclass
+class OrganizationSearchHit:
+    organization: Organization
+    rank: float
+
+    @classmethod
+    def serialize(cls, rows) -> list['OrganizationSearchHit']:
+        return [
+            cls(organization=organization, rank=row.rank)
+            for organization, row in zip(Organization.serialize(rows), rows)
+        ]
+
+
+ORGANIZATION_BULK_STATUS_CREATED = "created"
+ORGANIZATION_BULK_STATUS_UPDATED = "updated"
+ORGANIZATION_BULK_STATUS_DELETED = "deleted"
+ORGANIZATION_BULK_STATUS_NOT_FOUND = "organization_not_found"
+
+
+@dataclass
+class OrganizationUpdate:
+    organization_id: int
+    name: str = None
+    video_cut_description_end_sample: str = None
+    publication_text_end_sample: str = None
+    tone_of_voice: list[str] = None
+    brand_rules: list[str] = None
+    compliance_rules: list[str] = None
+    audience_insights: list[str] = None
+    products: list[dict] = None
+    locale: dict = None
+    additional_info: list[str] = None
+
+    def changes(self) -> dict:
+        # Только заданные поля: None оставляет колонку как есть
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if name != "organization_id" and value is not None
+        }
+
+
+@dataclass
+class OrganizationBulkResult:
+    organization_id: int
+    status: str
+
+    def to_dict(self) -> dict:
+        return {
+            "organization_id": self.organization_id,
+            "status": self.status,
+        }
@@ -3,7 +3,6 @@ CREATE TABLE IF NOT EXISTS organizations (
     id SERIAL PRIMARY KEY,
     
     name TEXT NOT NULL,
-    rub_balance TEXT DEFAULT '0',
     video_cut_description_end_sample TEXT DEFAULT '',
     publication_text_end_sample TEXT DEFAULT '',
     
@@ -14,17 +13,357 @@ CREATE TABLE IF NOT EXISTS organizations (
     products JSONB[] DEFAULT '{}',
     locale JSONB DEFAULT '{}',
     additional_info TEXT[] DEFAULT '{}',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+create_organizations_created_at_id_index = """
+CREATE INDEX IF NOT EXISTS organizations_created_at_id_idx
+    ON organizations (created_at DESC, id DESC);
+"""
+
+create_pg_trgm_extension = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+"""
+
+create_organization_search_document_function = """
+CREATE OR REPLACE FUNCTION organization_search_document(
+    brand_rules TEXT[],
+    audience_insights TEXT[],
+    additional_info TEXT[]
+) RETURNS TSVECTOR
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT setweight(to_tsvector('russian'::regconfig, COALESCE(array_to_string(brand_rules, ' '), '')), 'A') ||
+           setweight(to_tsvector('russian'::regconfig, COALESCE(array_to_string(audience_insights, ' '), '')), 'B') ||
+           setweight(to_tsvector('russian'::regconfig, COALESCE(array_to_string(additional_info, ' '), '')), 'C')
+$$;
+"""
+
+add_organizations_search_document = """
+ALTER TABLE organizations
+    ADD COLUMN IF NOT EXISTS search_document TSVECTOR
+        GENERATED ALWAYS AS (organization_search_document(brand_rules, audience_insights, additional_info)) STORED;
+"""
+
+create_organizations_search_document_index = """
+CREATE INDEX IF NOT EXISTS organizations_search_document_idx
+    ON organizations USING GIN (search_document);
+"""
+
+create_organizations_name_trgm_index = """
+CREATE INDEX IF NOT EXISTS organizations_name_trgm_idx
+    ON organizations USING GIN (lower(name) gin_trgm_ops);
+"""
+create_organization_balances_table = """
+CREATE TABLE IF NOT EXISTS organization_balances (
+    organization_id INTEGER PRIMARY KEY REFERENCES organizations(id) ON DELETE CASCADE,
+    rub_balance NUMERIC NOT NULL DEFAULT 0
+) WITH (
+    fillfactor = 70,
+    autovacuum_vacuum_scale_factor = 0.01
+);
+"""
+
+create_balance_operations_table = """
+CREATE TABLE IF NOT EXISTS balance_operations (
+    id BIGSERIAL PRIMARY KEY,
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    operation_type TEXT NOT NULL,
+    amount_rub NUMERIC NOT NULL,
+    rub_balance_after NUMERIC NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 """
+
+create_balance_operations_organization_index = """
+CREATE INDEX IF NOT EXISTS balance_operations_organization_id_idx
+    ON balance_operations (organization_id, id);
+"""
+
+create_balance_snapshots_table = """
+CREATE TABLE IF NOT EXISTS balance_snapshots (
+    id BIGSERIAL PRIMARY KEY,
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    last_operation_id BIGINT NOT NULL,
+    rub_balance NUMERIC NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+create_balance_snapshots_organization_index = """
+CREATE INDEX IF NOT EXISTS balance_snapshots_organization_id_idx
+    ON balance_snapshots (organization_id, last_operation_id DESC);
+"""
+
+create_organization_spend_hourly_table = """
+CREATE TABLE IF NOT EXISTS organization_spend_hourly (
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    bucket_start TIMESTAMP NOT NULL,
+    top_up_rub NUMERIC NOT NULL DEFAULT 0,
+    debit_rub NUMERIC NOT NULL DEFAULT 0,
+    operations_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (organization_id, bucket_start)
+);
+"""
+
+create_organization_spend_daily_table = """
+CREATE TABLE IF NOT EXISTS organization_spend_daily (
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    bucket_start TIMESTAMP NOT NULL,
+    top_up_rub NUMERIC NOT NULL DEFAULT 0,
+    debit_rub NUMERIC NOT NULL DEFAULT 0,
+    operations_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (organization_id, bucket_start)
+);
+"""
+
+# Корзины в UTC явно: created_at - TIMESTAMP во времени TimeZone записавшей сессии
+create_spend_rollup_function = """
+CREATE OR REPLACE FUNCTION balance_operations_spend_rollup() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO organization_spend_hourly AS s (
+        organization_id, bucket_start, top_up_rub, debit_rub, operations_count
+    )
+    SELECT
+        organization_id,
+        date_trunc('hour', created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'top_up'), 0),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'debit'), 0),
+        COUNT(*)
+    FROM new_operations
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (organization_id, bucket_start) DO UPDATE SET
+        top_up_rub = s.top_up_rub + EXCLUDED.top_up_rub,
+        debit_rub = s.debit_rub + EXCLUDED.debit_rub,
+        operations_count = s.operations_count + EXCLUDED.operations_count;
+
+    INSERT INTO organization_spend_daily AS s (
+        organization_id, bucket_start, top_up_rub, debit_rub, operations_count
+    )
+    SELECT
+        organization_id,
+        date_trunc('day', created_at AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC'),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'top_up'), 0),
+        COALESCE(SUM(amount_rub) FILTER (WHERE operation_type = 'debit'), 0),
+        COUNT(*)
+    FROM new_operations
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (organization_id, bucket_start) DO UPDATE SET
+        top_up_rub = s.top_up_rub + EXCLUDED.top_up_rub,
+        debit_rub = s.debit_rub + EXCLUDED.debit_rub,
+        operations_count = s.operations_count + EXCLUDED.operations_count;
+
+    RETURN NULL;
+END
+$$;
+"""
+
+drop_spend_rollup_trigger = """
+DROP TRIGGER IF EXISTS balance_operations_spend_rollup ON balance_operations;
+"""
+
+create_spend_rollup_trigger = """
+CREATE TRIGGER balance_operations_spend_rollup
+    AFTER INSERT ON balance_operations
+    REFERENCING NEW TABLE AS new_operations
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION balance_operations_spend_rollup();
+"""
+
+# Уведомления для in-memory реплики. NOTIFY берет глобальную блокировку на коммите,
+# поэтому триггеры шлют его, только если включено loom_organization.replica_notify = 'on'
+create_organizations_replica_notify_function = """
+CREATE OR REPLACE FUNCTION organizations_replica_notify() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed_ids TEXT;
+    changed_count INTEGER;
+BEGIN
+    IF COALESCE(current_setting('loom_organization.replica_notify', true), 'off') <> 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT string_agg(DISTINCT id::TEXT, ','), COUNT(DISTINCT id)
+    INTO changed_ids, changed_count
+    FROM changed_rows;
+
+    IF changed_count = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    -- Полезная нагрузка NOTIFY ограничена 8000 байтами: большие пачки реплика перечитывает целиком
+    IF changed_count > 500 THEN
+        PERFORM pg_notify('organizations_changed', '*');
+    ELSE
+        PERFORM pg_notify('organizations_changed', changed_ids);
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+create_organization_balances_replica_notify_function = """
+CREATE OR REPLACE FUNCTION organization_balances_replica_notify() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed_ids TEXT;
+    changed_count INTEGER;
+BEGIN
+    IF COALESCE(current_setting('loom_organization.replica_notify', true), 'off') <> 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT string_agg(DISTINCT organization_id::TEXT, ','), COUNT(DISTINCT organization_id)
+    INTO changed_ids, changed_count
+    FROM changed_rows;
+
+    IF changed_count = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    IF changed_count > 500 THEN
+        PERFORM pg_notify('organizations_changed', '*');
+    ELSE
+        PERFORM pg_notify('organizations_changed', changed_ids);
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+"""
+
+drop_organizations_replica_notify_insert_trigger = """
+DROP TRIGGER IF EXISTS organizations_replica_notify_insert ON organizations;
+"""
+
+create_organizations_replica_notify_insert_trigger = """
+CREATE TRIGGER organizations_replica_notify_insert
+    AFTER INSERT ON organizations
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organizations_replica_notify();
+"""
+
+drop_organizations_replica_notify_update_trigger = """
+DROP TRIGGER IF EXISTS organizations_replica_notify_update ON organizations;
+"""
+
+create_organizations_replica_notify_update_trigger = """
+CREATE TRIGGER organizations_replica_notify_update
+    AFTER UPDATE ON organizations
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organizations_replica_notify();
+"""
+
+drop_organizations_replica_notify_delete_trigger = """
+DROP TRIGGER IF EXISTS organizations_replica_notify_delete ON organizations;
+"""
+
+create_organizations_replica_notify_delete_trigger = """
+CREATE TRIGGER organizations_replica_notify_delete
+    AFTER DELETE ON organizations
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organizations_replica_notify();
+"""
+
+drop_organization_balances_replica_notify_trigger = """
+DROP TRIGGER IF EXISTS organization_balances_replica_notify ON organization_balances;
+"""
+
+create_organization_balances_replica_notify_trigger = """
+CREATE TRIGGER organization_balances_replica_notify
+    AFTER UPDATE ON organization_balances
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION organization_balances_replica_notify();
+"""
+
+drop_organizations_replica_notify_function = """
+DROP FUNCTION IF EXISTS organizations_replica_notify();
+"""
+
+drop_organization_balances_replica_notify_function = """
+DROP FUNCTION IF EXISTS organization_balances_replica_notify();
+"""
+
+drop_organization_search_document_function = """
+DROP FUNCTION IF EXISTS organization_search_document(TEXT[], TEXT[], TEXT[]);
+"""
+
+drop_balance_snapshots_table = """
+DROP TABLE IF EXISTS balance_snapshots;
+"""
+
+drop_balance_operations_table = """
+DROP TABLE IF EXISTS balance_operations;
+"""
+
+drop_spend_rollup_function = """
+DROP FUNCTION IF EXISTS balance_operations_spend_rollup();
+"""
+
+drop_organization_spend_daily_table = """
+DROP TABLE IF EXISTS organization_spend_daily;
+"""
+
+drop_organization_spend_hourly_table = """
+DROP TABLE IF EXISTS organization_spend_hourly;
+"""
+
+drop_organization_balances_table = """
+DROP TABLE IF EXISTS organization_balances;
+"""
+
 drop_organizations_table = """
 DROP TABLE IF EXISTS organizations CASCADE;
 """
 
 create_organization_tables_queries = [
-    create_organizations_table
+    create_organizations_table,
+    create_organizations_created_at_id_index,
+    create_pg_trgm_extension,
+    create_organization_search_document_function,
+    add_organizations_search_document,
+    create_organizations_search_document_index,
+    create_organizations_name_trgm_index,
+    create_organization_balances_table,
+    create_balance_operations_table,
+    create_balance_operations_organization_index,
+    create_balance_snapshots_table,
+    create_balance_snapshots_organization_index,
+    create_organization_spend_hourly_table,
+    create_organization_spend_daily_table,
+    create_spend_rollup_function,
+    drop_spend_rollup_trigger,
+    create_spend_rollup_trigger,
+    create_organizations_replica_notify_function,
+    create_organization_balances_replica_notify_function,
+    drop_organizations_replica_notify_insert_trigger,
+    create_organizations_replica_notify_insert_trigger,
+    drop_organizations_replica_notify_update_trigger,
+    create_organizations_replica_notify_update_trigger,
+    drop_organizations_replica_notify_delete_trigger,
+    create_organizations_replica_notify_delete_trigger,
+    drop_organization_balances_replica_notify_trigger,
+    create_organization_balances_replica_notify_trigger
 ]
 
 drop_queries = [
-    drop_organizations_table
+    drop_organization_spend_daily_table,
+    drop_organization_spend_hourly_table,
+    drop_balance_snapshots_table,
+    drop_balance_operations_table,
+    drop_organization_balances_table,
+    drop_organizations_table,
+    drop_spend_rollup_function,
+    drop_organizations_replica_notify_function,
+    drop_organization_balances_replica_notify_function,
+    drop_organization_search_document_function
 ]
\ No newline at end of file
@@ -0,0 +1,312 @@
+import asyncio
+import bisect
+import json
+import mmap
+import os
+import time
+import traceback
+from datetime import datetime
+
+import orjson
+
+from .sql_query import get_all_organizations, get_organizations_by_ids, get_replica_notify_setting
+from internal import interface, model
+
+REPLICA_CHANNEL = "organizations_changed"
+# Полезная нагрузка уведомления, по которой реплика перечитывает таблицу целиком
+REPLICA_FULL_RESYNC = "*"
+
+
+class OrganizationReplica(interface.IOrganizationReplica):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            db: interface.IDB,
+            refresh_interval_ms: int = 20,
+            full_resync_interval_sec: float = 600.0,
+            reconnect_delay_sec: float = 1.0,
+            snapshot_path: str = None,
+            snapshot_interval_sec: float = 60.0,
+            snapshot_max_age_sec: float = 120.0,
+    ):
+        self.logger = tel.logger()
+        self.meter = tel.meter()
+        self.db = db
+        self.refresh_interval = refresh_interval_ms / 1000
+        self.full_resync_interval_sec = full_resync_interval_sec
+        self.reconnect_delay_sec = reconnect_delay_sec
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval_sec = snapshot_interval_sec
+        self.snapshot_max_age_sec = snapshot_max_age_sec
+
+        self._organizations: dict[int, model.Organization] = {}
+        # Организации от новых к старым, как в get_all_organizations; пересобирается лениво
+        self._ordered: list[model.Organization] | None = None
+        self._ordered_keys: list[tuple[float, int]] | None = None
+
+        self._healthy = False
+        self._dirty_ids: set[int] = set()
+        # Изменения, примененные во время полного чтения, которое может их перезаписать
+        self._resyncing = False
+        self._changed_during_resync: set[int] = set()
+        # Растет с началом каждого полного чтения: точечное чтение, начатое раньше, могло устареть
+        self._resync_generation = 0
+        self._resync_requested = asyncio.Event()
+        self._refresh_scheduled = False
+        self._close_listener = None
+        self._tasks: list[asyncio.Task] = []
+
+        self.size_gauge = self.meter.create_gauge(
+            name="organization.replica.size",
+            unit="{organization}",
+            description="Количество организаций в in-memory реплике"
+        )
+        self.resyncs_counter = self.meter.create_counter(
+            name="organization.replica.resyncs",
+            unit="{resync}",
+            description="Полные перечитывания таблицы по причине: startup, gap, notify, interval"
+        )
+        self.applied_counter = self.meter.create_counter(
+            name="organization.replica.changes",
+            unit="{organization}",
+            description="Точечно примененные изменения организаций"
+        )
+
+    def is_healthy(self) -> bool:
+        return self._healthy
+
+    def get(self, organization_id: int) -> model.Organization | None:
+        return self._organizations.get(organization_id)
+
+    def get_many(self, organization_ids: list[int]) -> list[model.Organization]:
+        organizations = self._organizations
+        return [organizations[organization_id] for organization_id in organization_ids if organization_id in organizations]
+
+    def get_all(
+            self,
+            limit: int = None,
+            after_created_at: datetime = None,
+            after_id: int = None
+    ) -> list[model.Organization]:
+        ordered, ordered_keys = self._ordered_view()
+        start = 0
+        if after_created_at is not None and after_id is not None:
+            # Ключи отсортированы по возрастанию (-created_at, -id): следующая страница - строго после курсора
+            start = bisect.bisect_right(ordered_keys, self._order_key(after_created_at, after_id))
+        end = start + limit if limit is not None else len(ordered)
+        return ordered[start:end]
+
+    async def start(self) -> None:
+        if self.snapshot_path is not None and self._load_snapshot():
+            # Теплый старт: воркер не ждет БД при запуске, но снимок мог отстать от таблицы
+            # на snapshot_max_age_sec, поэтому до первого полного чтения чтения идут в Postgres
+            self._resync_requested.set()
+        else:
+            try:
+                await self._connect()
+                await self._resync("startup")
+            except Exception as err:
+                # Сервис стартует и без реплики: чтения идут в Postgres, фоновый цикл повторит подключение
+                self.logger.error(f"Не удалось загрузить реплику организаций: {str(err)}")
+                await self._disconnect()
+
+        self._tasks.append(asyncio.create_task(self._run()))
+        if self.snapshot_path is not None:
+            self._tasks.append(asyncio.create_task(self._write_snapshots()))
+        self.logger.info("In-memory реплика организаций запущена")
+
+    async def stop(self) -> None:
+        self._healthy = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self._disconnect()
+        self.logger.info("In-memory реплика организаций остановлена")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._close_listener is None:
+                    await self._connect()
+                    # Уведомления, пришедшие без подписки, потеряны - это разрыв
+                    self._resync_requested.set()
+
+                try:
+                    await asyncio.wait_for(self._resync_requested.wait(), timeout=self.full_resync_interval_sec)
+                    reason = "gap" if not self._healthy else "notify"
+                except asyncio.TimeoutError:
+                    reason = "interval"
+
+                self._resync_requested.clear()
+                await self._resync(reason)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self._healthy = False
+                self.logger.error(f"Ошибка синхронизации реплики организаций: {str(err)}", {
+                    "traceback": traceback.format_exc(),
+                })
+                await self._disconnect()
+                await asyncio.sleep(self.reconnect_delay_sec)
+
+    async def _connect(self) -> None:
+        async with self.db.primary():
+            rows = await self.db.select(get_replica_notify_setting, {})
+        if not rows or rows[0][0] != "on":
+            raise RuntimeError("loom_organization.replica_notify is not enabled, replica would go stale")
+
+        self._close_listener = await self.db.listen(REPLICA_CHANNEL, self._on_notify, self._on_disconnect)
+
+    async def _disconnect(self) -> None:
+        close_listener, self._close_listener = self._close_listener, None
+        if close_listener is not None:
+            try:
+                await close_listener()
+            except Exception:
+                pass
+
+    def _on_notify(self, payload: str) -> None:
+        if payload == REPLICA_FULL_RESYNC:
+            self._resync_requested.set()
+            return
+
+        try:
+            self._dirty_ids.update(int(organization_id) for organization_id in payload.split(","))
+        except ValueError:
+            self.logger.warning(f"Некорректное уведомление реплики организаций: {payload}")
+            self._resync_requested.set()
+            return
+
+        # Изменения за интервал применяются одним запросом ANY(:ids)
+        if not self._refresh_scheduled:
+            self._refresh_scheduled = True
+            asyncio.get_running_loop().call_later(
+                self.refresh_interval,
+                lambda: self._tasks.append(asyncio.create_task(self._refresh_dirty()))
+            )
+
+    def _on_disconnect(self) -> None:
+        # Соединение LISTEN потеряно: до переподключения и полного перечитывания реплика не доверенная
+        self._healthy = False
+        self._close_listener = None
+        self._resync_requested.set()
+
+    async def _refresh_dirty(self) -> None:
+        self._refresh_scheduled = False
+        current_task = asyncio.current_task()
+        if current_task in self._tasks:
+            self._tasks.remove(current_task)
+
+        organization_ids, self._dirty_ids = list(self._dirty_ids), set()
+        if not organization_ids:
+            return
+
+        resync_generation = self._resync_generation
+        try:
+            # Уведомление пришло с primary, реплика БД могла еще не догнать это изменение
+            async with self.db.primary():
+                rows = await self.db.select(get_organizations_by_ids, {'organization_ids': organization_ids})
+        except Exception as err:
+            self.logger.error(f"Ошибка применения изменений реплики организаций: {str(err)}")
+            self._healthy = False
+            self._resync_requested.set()
+            return
+
+        if self._resync_generation != resync_generation:
+            # Полное чтение началось после нашего запроса и может быть свежее - перечитываем эти id заново
+            self._on_notify(",".join(str(organization_id) for organization_id in organization_ids))
+            return
+
+        if self._resyncing:
+            self._changed_during_resync.update(organization_ids)
+
+        fresh = {organization.id: organization for organization in model.Organization.serialize(rows)}
+        for organization_id in organization_ids:
+            organization = fresh.get(organization_id)
+            if organization is None:
+                self._organizations.pop(organization_id, None)
+            else:
+                self._organizations[organization_id] = organization
+        self._ordered = None
+        self.applied_counter.add(len(organization_ids))
+        self.size_gauge.set(len(self._organizations))
+
+    async def _resync(self, reason: str) -> None:
+        self._resync_generation += 1
+        self._resyncing = True
+        try:
+            async with self.db.primary():
+                rows = await self.db.select(get_all_organizations, {})
+        finally:
+            self._resyncing = False
+        self._organizations = {organization.id: organization for organization in model.Organization.serialize(rows)}
+        self._ordered = None
+        self._healthy = self._close_listener is not None
+
+        # Точечные изменения, примененные во время чтения, могли быть свежее загруженного - перечитываем их
+        changed_ids, self._changed_during_resync = self._changed_during_resync, set()
+        if changed_ids:
+            self._on_notify(",".join(str(organization_id) for organization_id in changed_ids))
+
+        self.resyncs_counter.add(1, {"reason": reason})
+        self.size_gauge.set(len(self._organizations))
+
+    def _ordered_view(self) -> tuple[list[model.Organization], list[tuple[float, int]]]:
+        if self._ordered is None:
+            ordered = sorted(
+                self._organizations.values(),
+                key=lambda organization: self._order_key(organization.created_at, organization.id)
+            )
+            self._ordered = ordered
+            self._ordered_keys = [self._order_key(organization.created_at, organization.id) for organization in ordered]
+        return self._ordered, self._ordered_keys
+
+    @staticmethod
+    def _order_key(created_at: datetime, organization_id: int) -> tuple[float, int]:
+        return -created_at.timestamp(), -organization_id
+
+    async def _write_snapshots(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval_sec)
+            if not self._healthy:
+                continue
+            try:
+                self._write_snapshot()
+            except Exception as err:
+                self.logger.warning(f"Не удалось записать снимок реплики организаций: {str(err)}")
+
+    def _write_snapshot(self) -> None:
+        snapshot = {
+            "written_at": time.time(),
+            "organizations": [organization.to_dict() for organization in self._organizations.values()],
+        }
+        # Запись через временный файл и rename: читатель никогда не видит недописанный снимок
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _load_snapshot(self) -> bool:
+        try:
+            # orjson разбирает отображение файла через memoryview без копии в bytes
+            with open(self.snapshot_path, "rb") as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+                    memoryview(data) as view:
+                snapshot = orjson.loads(view)
+        except (OSError, ValueError) as err:
+            self.logger.info(f"Снимок реплики организаций не загружен: {str(err)}")
+            return False
+
+        age = time.time() - snapshot["written_at"]
+        if age > self.snapshot_max_age_sec:
+            self.logger.info(f"Снимок реплики организаций устарел на {age:.0f} с, нужна полная загрузка")
+            return False
+
+        self._organizations = {
+            organization["id"]: model.Organization.from_dict(organization)
+            for organization in snapshot["organizations"]
+        }
+        self._ordered = None
+        self.size_gauge.set(len(self._organizations))
+        return True
@@ -1,19 +1,47 @@
+import contextlib
+import dataclasses
 import json
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterator, AsyncContextManager
 
 from .sql_query import *
-from internal import interface, model
+from internal import interface, model, common
 
+from pkg.cache_wrapper import LRUCache, cached_method, invalidate_cached
 from pkg.trace_wrapper import traced_method
 
 
+_BALANCE_BATCH_ATTEMPTS = 3
+
+
 class OrganizationRepo(interface.IOrganizationRepo):
     def __init__(
             self,
             tel: interface.ITelemetry,
             db: interface.IDB,
+            balance_snapshot_interval: int = 100,
+            cache_enabled: bool = False,
+            cache_ttl: float = 5.0,
+            cache_max_size: int = 10000,
+            replica: interface.IOrganizationReplica = None,
+            read_your_writes_sec: float = 0.0,
     ):
         self.tracer = tel.tracer()
+        self.meter = tel.meter()
         self.db = db
+        self.balance_snapshot_interval = balance_snapshot_interval
+        self.cache_enabled = cache_enabled
+        self.cache_ttl = cache_ttl
+        self.cache_max_size = cache_max_size
+        self.replica = replica
+        # Недавно измененные организации читаем из primary, пока реплики БД их не догнали
+        self._recent_writes = LRUCache(maxsize=cache_max_size, ttl=read_your_writes_sec) if read_your_writes_sec else None
+        self._recent_write_until = 0.0
+
+    def transaction(self) -> AsyncContextManager[None]:
+        return self.db.transaction()
 
     @traced_method()
     async def create_organization(self, name: str) -> int:
@@ -22,24 +50,140 @@ class OrganizationRepo(interface.IOrganizationRepo):
         }
 
         organization_id = await self.db.insert(create_organization, args)
+        self._invalidate_organization(organization_id)
 
         return organization_id
 
     @traced_method()
-    async def get_organization_by_id(self, organization_id: int) -> list[model.Organization]:
+    async def create_organizations(self, names: list[str]) -> list[int]:
+        # Одна вставка на всю пачку вместо INSERT на каждую организацию
+        rows = await self.db.update_returning(create_organizations, {'names': names})
+        organization_ids = sorted(row.organization_id for row in rows)
+        for organization_id in organization_ids:
+            self._invalidate_organization(organization_id)
+
+        return organization_ids
+
+    @traced_method()
+    @cached_method(tag_param="organization_id")
+    async def get_organization_by_id(
+            self,
+            organization_id: int,
+            fields: list[str] = None
+    ) -> list[model.Organization]:
+        if self._replica_ready([organization_id]):
+            organization = self.replica.get(organization_id)
+            return self._project([organization], fields) if organization is not None else []
+
         args = {'organization_id': organization_id}
-        rows = await self.db.select(get_organization_by_id, args)
-        organizations = model.Organization.serialize(rows) if rows else []
+        if fields:
+            query, fields = self._projection(get_organization_by_id_projection, fields)
+        else:
+            query = get_organization_by_id
+        async with self._read_scope([organization_id]):
+            rows = await self.db.select(query, args)
+        organizations = model.Organization.serialize(rows, fields) if rows else []
 
         return organizations
 
     @traced_method()
-    async def get_all_organizations(self) -> list[model.Organization]:
-        rows = await self.db.select(get_all_organizations, {})
-        organizations = model.Organization.serialize(rows) if rows else []
+    async def get_organizations_by_ids(
+            self,
+            organization_ids: list[int],
+            fields: list[str] = None
+    ) -> list[model.Organization]:
+        if self._replica_ready(organization_ids):
+            return self._project(self.replica.get_many(list(dict.fromkeys(organization_ids))), fields)
+
+        args = {'organization_ids': list(dict.fromkeys(organization_ids))}
+        if fields:
+            query, fields = self._projection(get_organizations_by_ids_projection, fields)
+        else:
+            query = get_organizations_by_ids
+        async with self._read_scope(args['organization_ids']):
+            rows = await self.db.select(query, args)
+        organizations = model.Organization.serialize(rows, fields) if rows else []
 
         return organizations
 
+    @traced_method()
+    async def get_all_organizations(
+            self,
+            limit: int = None,
+            after_created_at: datetime = None,
+            after_id: int = None,
+            fields: list[str] = None
+    ) -> list[model.Organization]:
+        if self._replica_ready():
+            return self._project(self.replica.get_all(limit, after_created_at, after_id), fields)
+
+        if limit is None:
+            query, projection, args = get_all_organizations, get_all_organizations_projection, {}
+        elif after_created_at is None or after_id is None:
+            query, projection, args = get_organizations_first_page, get_organizations_first_page_projection, {
+                'limit': limit,
+            }
+        else:
+            query, projection, args = get_organizations_next_page, get_organizations_next_page_projection, {
+                'limit': limit,
+                'after_created_at': after_created_at,
+                'after_id': after_id,
+            }
+
+        if fields:
+            # created_at нужен для курсора следующей страницы, даже если его не запросили
+            query, fields = self._projection(projection, fields, extra_columns=("created_at",))
+        async with self._read_scope():
+            rows = await self.db.select(query, args)
+        organizations = model.Organization.serialize(rows, fields) if rows else []
+
+        return organizations
+
+    @traced_method()
+    async def search_organizations(
+            self,
+            query: str,
+            limit: int,
+            after_rank: float = None,
+            after_id: int = None
+    ) -> list[model.OrganizationSearchHit]:
+        args = {
+            'query': query,
+            # Спецсимволы LIKE в запросе пользователя ищутся буквально
+            'name_prefix': query.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",
+            'limit': limit,
+        }
+        if after_rank is None or after_id is None:
+            sql = search_organizations_first_page
+        else:
+            sql = search_organizations_next_page
+            args['after_rank'] = after_rank
+            args['after_id'] = after_id
+
+        rows = await self.db.select(sql, args)
+        hits = model.OrganizationSearchHit.serialize(rows) if rows else []
+
+        return hits
+
+    async def stream_all_organizations(
+            self,
+            chunk_size: int = 1000,
+            fields: list[str] = None
+    ) -> AsyncIterator[list[model.Organization]]:
+        if self._replica_ready():
+            organizations = self.replica.get_all()
+            for start in range(0, len(organizations), chunk_size):
+                yield self._project(organizations[start:start + chunk_size], fields)
+            return
+
+        if fields:
+            query, fields = self._projection(get_all_organizations_projection, fields)
+        else:
+            query = get_all_organizations
+        async with self._read_scope():
+            async for rows in self.db.stream(query, {}, chunk_size):
+                yield model.Organization.serialize(rows, fields)
+
     @traced_method()
     async def update_organization(
             self,
@@ -54,70 +198,255 @@ class OrganizationRepo(interface.IOrganizationRepo):
             products: list[dict] = None,
             locale: dict = None,
             additional_info: list[str] = None,
-    ) -> None:
-        update_fields = []
-        args: dict = {'organization_id': organization_id}
+    ) -> bool:
+        args = {
+            'organization_id': organization_id,
+            'name': name,
+            'video_cut_description_end_sample': video_cut_description_end_sample,
+            'publication_text_end_sample': publication_text_end_sample,
+            'tone_of_voice': tone_of_voice,
+            'brand_rules': brand_rules,
+            'compliance_rules': compliance_rules,
+            'audience_insights': audience_insights,
+            'products': [json.dumps(product) for product in products] if products is not None else None,
+            'locale': json.dumps(locale) if locale is not None else None,
+            'additional_info': additional_info,
+        }
 
-        if name is not None:
-            update_fields.append("name = :name")
-            args['name'] = name
+        if all(value is None for key, value in args.items() if key != 'organization_id'):
+            # Менять нечего - остается только сообщить, существует ли организация
+            return bool(await self.get_existing_organization_ids([organization_id]))
 
-        if video_cut_description_end_sample is not None:
-            update_fields.append("video_cut_description_end_sample = :video_cut_description_end_sample")
-            args['video_cut_description_end_sample'] = video_cut_description_end_sample
+        # Один текст запроса на любой набор полей: None оставляет колонку как есть, план переиспользуется
+        rows = await self.db.update_returning(update_organization, args)
+        if not rows:
+            return False
 
-        if publication_text_end_sample is not None:
-            update_fields.append("publication_text_end_sample = :publication_text_end_sample")
-            args['publication_text_end_sample'] = publication_text_end_sample
+        self._invalidate_organization(organization_id)
+        return True
 
-        if tone_of_voice is not None:
-            update_fields.append("tone_of_voice = :tone_of_voice")
-            args['tone_of_voice'] = tone_of_voice
+    @traced_method()
+    async def delete_organization(self, organization_id: int) -> bool:
+        args = {'organization_id': organization_id}
+        rows = await self.db.update_returning(delete_organization, args)
+        if not rows:
+            return False
 
-        if brand_rules is not None:
-            update_fields.append("brand_rules = :brand_rules")
-            args['brand_rules'] = brand_rules
+        self._invalidate_organization(organization_id)
+        return True
 
-        if compliance_rules is not None:
-            update_fields.append("compliance_rules = :compliance_rules")
-            args['compliance_rules'] = compliance_rules
+    @traced_method()
+    async def update_organizations(self, updates: list[model.OrganizationUpdate]) -> list[int]:
+        args = {
+            'organization_ids': [update.organization_id for update in updates],
+            'patches': [json.dumps(update.changes()) for update in updates],
+        }
+        rows = await self.db.update_returning(update_organizations, args)
+        organization_ids = [row.id for row in rows]
+        for organization_id in organization_ids:
+            self._invalidate_organization(organization_id)
 
-        if audience_insights is not None:
-            update_fields.append("audience_insights = :audience_insights")
-            args['audience_insights'] = audience_insights
+        return organization_ids
 
-        if products is not None:
-            update_fields.append("products = :products")
-            args['products'] = [json.dumps(product) for product in products]
+    @traced_method()
+    async def delete_organizations(self, organization_ids: list[int]) -> list[int]:
+        args = {'organization_ids': organization_ids}
+        rows = await self.db.update_returning(delete_organizations, args)
+        deleted_ids = [row.id for row in rows]
+        for organization_id in deleted_ids:
+            self._invalidate_organization(organization_id)
 
-        if locale is not None:
-            update_fields.append("locale = :locale")
-            args['locale'] = json.dumps(locale)
+        return deleted_ids
 
-        if additional_info is not None:
-            update_fields.append("additional_info = :additional_info")
-            args['additional_info'] = additional_info
+    @traced_method()
+    async def top_up_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str
+    ) -> list[model.BalanceOperation]:
+        args = {
+            'organization_id': organization_id,
+            'amount_rub': amount_rub,
+            'idempotency_key': idempotency_key,
+            'snapshot_interval': self.balance_snapshot_interval
+        }
+        rows = await self.db.update_returning(top_up_balance, args)
+        operations = model.BalanceOperation.serialize(rows) if rows else []
+        if operations:
+            self._invalidate_organization(organization_id)
 
-        if not update_fields:
-            return
+        return operations
 
-        query = f"""
-                UPDATE organizations
-                SET {', '.join(update_fields)}
-                WHERE id = :organization_id;
-                """
+    @traced_method()
+    async def debit_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str,
+            check_balance: bool = False
+    ) -> list[model.BalanceOperation]:
+        args = {
+            'organization_id': organization_id,
+            'amount_rub': amount_rub,
+            'idempotency_key': idempotency_key,
+            'snapshot_interval': self.balance_snapshot_interval
+        }
+        query = debit_balance_checked if check_balance else debit_balance
+        rows = await self.db.update_returning(query, args)
+        operations = model.BalanceOperation.serialize(rows) if rows else []
+        if operations:
+            self._invalidate_organization(organization_id)
 
-        await self.db.update(query, args)
+        return operations
 
     @traced_method()
-    async def delete_organization(self, organization_id: int) -> None:
+    async def apply_balance_batch(
+            self,
+            organization_ids: list[int],
+            deltas_rub: list[Decimal],
+            idempotency_keys: list[str],
+            check_balance: bool = False
+    ) -> list[model.BalanceOperation]:
+        args = {
+            'organization_ids': organization_ids,
+            'deltas_rub': deltas_rub,
+            'idempotency_keys': idempotency_keys,
+            'snapshot_interval': self.balance_snapshot_interval
+        }
+        query = apply_balance_batch_checked if check_balance else apply_balance_batch
+        for attempt in range(_BALANCE_BATCH_ATTEMPTS):
+            try:
+                rows = await self.db.update_returning(query, args)
+                break
+            except common.ErrUniqueViolation as err:
+                # Параллельный запрос закоммитил один из ключей после снимка нашего запроса.
+                # Повтор берет новый снимок, и NOT EXISTS уже отсеет этот ключ
+                if err.constraint != model.BALANCE_OPERATION_IDEMPOTENCY_KEY_CONSTRAINT \
+                        or attempt == _BALANCE_BATCH_ATTEMPTS - 1:
+                    raise
+        operations = model.BalanceOperation.serialize(rows) if rows else []
+        for organization_id in {operation.organization_id for operation in operations}:
+            self._invalidate_organization(organization_id)
+
+        return operations
+
+    @traced_method()
+    async def rebuild_organization_balance(self, organization_id: int) -> model.BalanceReconciliation | None:
         args = {'organization_id': organization_id}
-        await self.db.update(delete_organization, args)
+        async with self.db.primary():
+            rows = await self.db.select(rebuild_organization_balance, args)
+        reconciliations = model.BalanceReconciliation.serialize(rows) if rows else []
+
+        return reconciliations[0] if reconciliations else None
 
     @traced_method()
-    async def update_balance(self, organization_id: int, rub_balance: str) -> None:
+    async def get_balance_operation_by_idempotency_key(self, idempotency_key: str) -> list[model.BalanceOperation]:
+        args = {'idempotency_key': idempotency_key}
+        # Проверка идемпотентности не должна пропустить операцию из-за отставания реплики
+        async with self.db.primary():
+            rows = await self.db.select(get_balance_operation_by_idempotency_key, args)
+        operations = model.BalanceOperation.serialize(rows) if rows else []
+
+        return operations
+
+    @traced_method()
+    async def get_balance_operations_by_idempotency_keys(
+            self,
+            idempotency_keys: list[str]
+    ) -> list[model.BalanceOperation]:
+        args = {'idempotency_keys': idempotency_keys}
+        async with self.db.primary():
+            rows = await self.db.select(get_balance_operations_by_idempotency_keys, args)
+        operations = model.BalanceOperation.serialize(rows) if rows else []
+
+        return operations
+
+    @traced_method()
+    async def get_existing_organization_ids(self, organization_ids: list[int]) -> list[int]:
+        args = {'organization_ids': organization_ids}
+        rows = await self.db.select(get_existing_organization_ids, args)
+
+        return [row.id for row in rows]
+
+    @traced_method()
+    async def get_organization_spend(
+            self,
+            organization_id: int,
+            granularity: str,
+            date_from: datetime,
+            date_to: datetime
+    ) -> list[model.SpendBucket]:
         args = {
             'organization_id': organization_id,
-            'rub_balance': str(rub_balance)
+            'date_from': date_from,
+            'date_to': date_to
         }
-        await self.db.update(update_balance, args)
+        if granularity == model.SPEND_GRANULARITY_HOUR:
+            query = get_organization_spend_hourly
+        else:
+            query = get_organization_spend_daily
+        rows = await self.db.select(query, args)
+        buckets = model.SpendBucket.serialize(rows) if rows else []
+
+        return buckets
+
+    def _invalidate_organization(self, organization_id: int) -> None:
+        # Внутри транзакции сбрасываем кэш после коммита, иначе его заново заполнит старое значение
+        self.db.after_commit(lambda: invalidate_cached(self, "get_organization_by_id", tag=organization_id))
+        if self._recent_writes is not None:
+            self._recent_writes.set(organization_id, True)
+            self._recent_write_until = time.monotonic() + self._recent_writes.ttl
+
+    def _read_scope(self, organization_ids: list[int] = None) -> AsyncContextManager[None]:
+        if self._pinned_to_primary(organization_ids):
+            return self.db.primary()
+        return contextlib.nullcontext()
+
+    def _pinned_to_primary(self, organization_ids: list[int] = None) -> bool:
+        if self._recent_writes is None:
+            return False
+        # Списки не знают своих id: их закрепляет за primary любая недавняя запись
+        if organization_ids is None:
+            return time.monotonic() < self._recent_write_until
+        return any(self._recent_writes.get(organization_id) for organization_id in organization_ids)
+
+    @staticmethod
+    def _projection(
+            query_template: str,
+            fields: list[str],
+            extra_columns: tuple[str, ...] = ()
+    ) -> tuple[str, list[str]]:
+        loaded_fields = OrganizationRepo._loaded_fields(fields)
+        selected = list(dict.fromkeys([*loaded_fields, *extra_columns]))
+
+        columns = ", ".join("b.rub_balance" if name == "rub_balance" else f"o.{name}" for name in selected)
+        join = organization_balance_join if "rub_balance" in selected else ""
+
+        return query_template.format(columns=columns, join=join), loaded_fields
+
+    @staticmethod
+    def _project(organizations: list[model.Organization], fields: list[str] | None) -> list[model.Organization]:
+        if not fields:
+            return organizations
+
+        loaded_fields = tuple(OrganizationRepo._loaded_fields(fields))
+        return [dataclasses.replace(organization, loaded_fields=loaded_fields) for organization in organizations]
+
+    @staticmethod
+    def _loaded_fields(fields: list[str]) -> list[str]:
+        unknown_fields = set(fields) - set(model.ORGANIZATION_FIELDS)
+        if unknown_fields:
+            raise ValueError(f"Unknown organization fields: {', '.join(sorted(unknown_fields))}")
+
+        # id отдается всегда, порядок полей - как в запросе
+        return list(dict.fromkeys(["id", *fields]))
+
+    def _replica_ready(self, organization_ids: list[int] = None) -> bool:
+        # Пока реплика не синхронизирована, чтения идут в Postgres. Недавно измененные организации
+        # закреплены за primary: уведомление об изменении могло еще не дойти до реплики
+        return (
+            self.replica is not None
+            and self.replica.is_healthy()
+            and not self._pinned_to_primary(organization_ids)
+        )
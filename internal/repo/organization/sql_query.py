@@ -1,30 +1,517 @@
 create_organization = """
-INSERT INTO organizations (
-    name
+WITH organization AS (
+    INSERT INTO organizations (
+        name
+    )
+    VALUES (
+        :name
+    )
+    RETURNING id
 )
-VALUES (
-    :name
-)
-RETURNING id;
+INSERT INTO organization_balances (organization_id)
+SELECT id FROM organization
+RETURNING organization_id;
 """
 
+# Колонки перечислены явно: o.* тянул бы служебный search_document в каждое чтение
 get_organization_by_id = """
-SELECT * FROM organizations
-WHERE id = :organization_id;
+SELECT o.id, o.name, o.video_cut_description_end_sample, o.publication_text_end_sample,
+    o.tone_of_voice, o.brand_rules, o.compliance_rules, o.audience_insights,
+    o.products, o.locale, o.additional_info, o.created_at, b.rub_balance
+FROM organizations o
+JOIN organization_balances b ON b.organization_id = o.id
+WHERE o.id = :organization_id;
 """
 
 get_all_organizations = """
-SELECT * FROM organizations
-ORDER BY created_at DESC;
+SELECT o.id, o.name, o.video_cut_description_end_sample, o.publication_text_end_sample,
+    o.tone_of_voice, o.brand_rules, o.compliance_rules, o.audience_insights,
+    o.products, o.locale, o.additional_info, o.created_at, b.rub_balance
+FROM organizations o
+JOIN organization_balances b ON b.organization_id = o.id
+ORDER BY o.created_at DESC, o.id DESC;
+"""
+
+get_organizations_first_page = """
+SELECT o.id, o.name, o.video_cut_description_end_sample, o.publication_text_end_sample,
+    o.tone_of_voice, o.brand_rules, o.compliance_rules, o.audience_insights,
+    o.products, o.locale, o.additional_info, o.created_at, b.rub_balance
+FROM organizations o
+JOIN organization_balances b ON b.organization_id = o.id
+ORDER BY o.created_at DESC, o.id DESC
+LIMIT :limit;
+"""
+
+get_organizations_next_page = """
+SELECT o.id, o.name, o.video_cut_description_end_sample, o.publication_text_end_sample,
+    o.tone_of_voice, o.brand_rules, o.compliance_rules, o.audience_insights,
+    o.products, o.locale, o.additional_info, o.created_at, b.rub_balance
+FROM organizations o
+JOIN organization_balances b ON b.organization_id = o.id
+WHERE (o.created_at, o.id) < (:after_created_at, :after_id)
+ORDER BY o.created_at DESC, o.id DESC
+LIMIT :limit;
+"""
+
+get_organizations_by_ids = """
+SELECT o.id, o.name, o.video_cut_description_end_sample, o.publication_text_end_sample,
+    o.tone_of_voice, o.brand_rules, o.compliance_rules, o.audience_insights,
+    o.products, o.locale, o.additional_info, o.created_at, b.rub_balance
+FROM organizations o
+JOIN organization_balances b ON b.organization_id = o.id
+WHERE o.id = ANY(CAST(:organization_ids AS INTEGER[]));
+"""
+
+# Поиск: префикс и нечеткое совпадение имени по триграммам плюс полнотекстовый поиск по правилам,
+# инсайтам и доп. информации. Ранг сравнивается как FLOAT8, чтобы курсор из Python совпадал точно
+search_organizations_first_page = """
+SELECT * FROM (
+    SELECT o.id, o.name, o.video_cut_description_end_sample, o.publication_text_end_sample,
+        o.tone_of_voice, o.brand_rules, o.compliance_rules, o.audience_insights,
+        o.products, o.locale, o.additional_info, o.created_at, b.rub_balance,
+        CAST(
+            CAST(lower(o.name) LIKE :name_prefix AS INTEGER)
+            + similarity(lower(o.name), lower(:query))
+            + ts_rank(o.search_document, websearch_to_tsquery('russian', :query))
+        AS FLOAT8) AS rank
+    FROM organizations o
+    JOIN organization_balances b ON b.organization_id = o.id
+    WHERE lower(o.name) LIKE :name_prefix
+       OR lower(o.name) % lower(:query)
+       OR o.search_document @@ websearch_to_tsquery('russian', :query)
+) found
+ORDER BY found.rank DESC, found.id DESC
+LIMIT :limit;
+"""
+
+search_organizations_next_page = """
+SELECT * FROM (
+    SELECT o.id, o.name, o.video_cut_description_end_sample, o.publication_text_end_sample,
+        o.tone_of_voice, o.brand_rules, o.compliance_rules, o.audience_insights,
+        o.products, o.locale, o.additional_info, o.created_at, b.rub_balance,
+        CAST(
+            CAST(lower(o.name) LIKE :name_prefix AS INTEGER)
+            + similarity(lower(o.name), lower(:query))
+            + ts_rank(o.search_document, websearch_to_tsquery('russian', :query))
+        AS FLOAT8) AS rank
+    FROM organizations o
+    JOIN organization_balances b ON b.organization_id = o.id
+    WHERE lower(o.name) LIKE :name_prefix
+       OR lower(o.name) % lower(:query)
+       OR o.search_document @@ websearch_to_tsquery('russian', :query)
+) found
+WHERE (found.rank, found.id) < (CAST(:after_rank AS FLOAT8), :after_id)
+ORDER BY found.rank DESC, found.id DESC
+LIMIT :limit;
+"""
+
+# Проекции: {columns} и {join} подставляются из белого списка полей организации
+organization_balance_join = """
+JOIN organization_balances b ON b.organization_id = o.id
+"""
+
+get_organization_by_id_projection = """
+SELECT {columns} FROM organizations o
+{join}
+WHERE o.id = :organization_id;
+"""
+
+get_organizations_by_ids_projection = """
+SELECT {columns} FROM organizations o
+{join}
+WHERE o.id = ANY(CAST(:organization_ids AS INTEGER[]));
+"""
+
+get_all_organizations_projection = """
+SELECT {columns} FROM organizations o
+{join}
+ORDER BY o.created_at DESC, o.id DESC;
+"""
+
+get_organizations_first_page_projection = """
+SELECT {columns} FROM organizations o
+{join}
+ORDER BY o.created_at DESC, o.id DESC
+LIMIT :limit;
+"""
+
+get_organizations_next_page_projection = """
+SELECT {columns} FROM organizations o
+{join}
+WHERE (o.created_at, o.id) < (:after_created_at, :after_id)
+ORDER BY o.created_at DESC, o.id DESC
+LIMIT :limit;
+"""
+
+update_organization = """
+UPDATE organizations
+SET name = COALESCE(:name, name),
+    video_cut_description_end_sample = COALESCE(:video_cut_description_end_sample, video_cut_description_end_sample),
+    publication_text_end_sample = COALESCE(:publication_text_end_sample, publication_text_end_sample),
+    tone_of_voice = COALESCE(:tone_of_voice, tone_of_voice),
+    brand_rules = COALESCE(:brand_rules, brand_rules),
+    compliance_rules = COALESCE(:compliance_rules, compliance_rules),
+    audience_insights = COALESCE(:audience_insights, audience_insights),
+    products = COALESCE(:products, products),
+    locale = COALESCE(:locale, locale),
+    additional_info = COALESCE(:additional_info, additional_info)
+WHERE id = :organization_id
+RETURNING id;
 """
 
 delete_organization = """
 DELETE FROM organizations
-WHERE id = :organization_id;
+WHERE id = :organization_id
+RETURNING id;
+"""
+
+# SERIAL выдает id в порядке вставки строк, поэтому отсортированные id соответствуют порядку имен
+create_organizations = """
+WITH organization AS (
+    INSERT INTO organizations (
+        name
+    )
+    SELECT t.name
+    FROM unnest(CAST(:names AS TEXT[])) WITH ORDINALITY AS t(name, position)
+    ORDER BY t.position
+    RETURNING id
+)
+INSERT INTO organization_balances (organization_id)
+SELECT id FROM organization
+RETURNING organization_id;
+"""
+
+# Отсутствующий в patch ключ оставляет колонку как есть, как COALESCE в update_organization
+update_organizations = """
+UPDATE organizations o
+SET name = COALESCE(t.patch->>'name', o.name),
+    video_cut_description_end_sample = COALESCE(
+        t.patch->>'video_cut_description_end_sample', o.video_cut_description_end_sample
+    ),
+    publication_text_end_sample = COALESCE(t.patch->>'publication_text_end_sample', o.publication_text_end_sample),
+    tone_of_voice = CASE WHEN t.patch->'tone_of_voice' IS NULL THEN o.tone_of_voice
+        ELSE ARRAY(SELECT jsonb_array_elements_text(t.patch->'tone_of_voice')) END,
+    brand_rules = CASE WHEN t.patch->'brand_rules' IS NULL THEN o.brand_rules
+        ELSE ARRAY(SELECT jsonb_array_elements_text(t.patch->'brand_rules')) END,
+    compliance_rules = CASE WHEN t.patch->'compliance_rules' IS NULL THEN o.compliance_rules
+        ELSE ARRAY(SELECT jsonb_array_elements_text(t.patch->'compliance_rules')) END,
+    audience_insights = CASE WHEN t.patch->'audience_insights' IS NULL THEN o.audience_insights
+        ELSE ARRAY(SELECT jsonb_array_elements_text(t.patch->'audience_insights')) END,
+    products = CASE WHEN t.patch->'products' IS NULL THEN o.products
+        ELSE ARRAY(SELECT jsonb_array_elements(t.patch->'products')) END,
+    locale = COALESCE(t.patch->'locale', o.locale),
+    additional_info = CASE WHEN t.patch->'additional_info' IS NULL THEN o.additional_info
+        ELSE ARRAY(SELECT jsonb_array_elements_text(t.patch->'additional_info')) END
+FROM unnest(
+    CAST(:organization_ids AS INTEGER[]),
+    CAST(:patches AS JSONB[])
+) AS t(organization_id, patch)
+WHERE o.id = t.organization_id
+RETURNING o.id;
+"""
+
+delete_organizations = """
+DELETE FROM organizations
+WHERE id = ANY(CAST(:organization_ids AS INTEGER[]))
+RETURNING id;
+"""
+
+# Общее продолжение запросов, меняющих баланс: каждые :snapshot_interval операций организации
+# пишется снимок баланса, от которого rebuild_organization_balance пересчитывает баланс по журналу.
+# Операции этого же запроса не видны в balance_operations, поэтому считаются отдельно по inserted
+_balance_snapshot = """, snapshot AS (
+    INSERT INTO balance_snapshots (organization_id, last_operation_id, rub_balance)
+    SELECT last_inserted.organization_id, last_inserted.id, last_inserted.rub_balance_after
+    FROM (
+        SELECT DISTINCT ON (organization_id) * FROM inserted
+        ORDER BY organization_id, id DESC
+    ) AS last_inserted
+    WHERE (
+        SELECT COUNT(*) FROM balance_operations op
+        WHERE op.organization_id = last_inserted.organization_id
+          AND op.id > COALESCE((
+              SELECT MAX(s.last_operation_id) FROM balance_snapshots s
+              WHERE s.organization_id = last_inserted.organization_id
+          ), 0)
+    ) + (
+        SELECT COUNT(*) FROM inserted i
+        WHERE i.organization_id = last_inserted.organization_id
+    ) >= :snapshot_interval
+)
+SELECT * FROM inserted;
+"""
+
+top_up_balance = """
+WITH updated AS (
+    UPDATE organization_balances
+    SET rub_balance = rub_balance + :amount_rub
+    WHERE organization_id = :organization_id
+      AND NOT EXISTS (
+          SELECT 1 FROM balance_operations
+          WHERE idempotency_key = :idempotency_key
+      )
+    RETURNING organization_id, rub_balance
+), inserted AS (
+    INSERT INTO balance_operations (
+        organization_id,
+        idempotency_key,
+        operation_type,
+        amount_rub,
+        rub_balance_after
+    )
+    SELECT organization_id, :idempotency_key, 'top_up', :amount_rub, rub_balance
+    FROM updated
+    RETURNING *
+)""" + _balance_snapshot
+
+debit_balance = """
+WITH updated AS (
+    UPDATE organization_balances
+    SET rub_balance = rub_balance - :amount_rub
+    WHERE organization_id = :organization_id
+      AND NOT EXISTS (
+          SELECT 1 FROM balance_operations
+          WHERE idempotency_key = :idempotency_key
+      )
+    RETURNING organization_id, rub_balance
+), inserted AS (
+    INSERT INTO balance_operations (
+        organization_id,
+        idempotency_key,
+        operation_type,
+        amount_rub,
+        rub_balance_after
+    )
+    SELECT organization_id, :idempotency_key, 'debit', :amount_rub, rub_balance
+    FROM updated
+    RETURNING *
+)""" + _balance_snapshot
+
+debit_balance_checked = """
+WITH updated AS (
+    UPDATE organization_balances
+    SET rub_balance = rub_balance - :amount_rub
+    WHERE organization_id = :organization_id
+      AND rub_balance >= :amount_rub
+      AND NOT EXISTS (
+          SELECT 1 FROM balance_operations
+          WHERE idempotency_key = :idempotency_key
+      )
+    RETURNING organization_id, rub_balance
+), inserted AS (
+    INSERT INTO balance_operations (
+        organization_id,
+        idempotency_key,
+        operation_type,
+        amount_rub,
+        rub_balance_after
+    )
+    SELECT organization_id, :idempotency_key, 'debit', :amount_rub, rub_balance
+    FROM updated
+    RETURNING *
+)""" + _balance_snapshot
+
+# Баланс после каждой операции считается нарастающим итогом в порядке запроса,
+# от значения, прочитанного под блокировкой строки баланса
+apply_balance_batch = """
+WITH requested AS (
+    SELECT DISTINCT ON (t.idempotency_key) t.organization_id, t.delta_rub, t.idempotency_key, t.position
+    FROM unnest(
+        CAST(:organization_ids AS INTEGER[]),
+        CAST(:deltas_rub AS NUMERIC[]),
+        CAST(:idempotency_keys AS TEXT[])
+    ) WITH ORDINALITY AS t(organization_id, delta_rub, idempotency_key, position)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM balance_operations op
+        WHERE op.idempotency_key = t.idempotency_key
+    )
+    ORDER BY t.idempotency_key, t.position
+), locked AS (
+    SELECT b.organization_id, b.rub_balance FROM organization_balances b
+    WHERE b.organization_id IN (SELECT organization_id FROM requested)
+    ORDER BY b.organization_id
+    FOR UPDATE
+), running AS (
+    SELECT
+        requested.organization_id,
+        requested.delta_rub,
+        requested.idempotency_key,
+        requested.position,
+        locked.rub_balance + SUM(requested.delta_rub) OVER (
+            PARTITION BY requested.organization_id ORDER BY requested.position
+        ) AS rub_balance_after
+    FROM requested
+    JOIN locked ON locked.organization_id = requested.organization_id
+), inserted AS (
+    INSERT INTO balance_operations (
+        organization_id,
+        idempotency_key,
+        operation_type,
+        amount_rub,
+        rub_balance_after
+    )
+    SELECT
+        organization_id,
+        idempotency_key,
+        CASE WHEN delta_rub < 0 THEN 'debit' ELSE 'top_up' END,
+        ABS(delta_rub),
+        rub_balance_after
+    FROM running
+    ORDER BY organization_id, position
+    RETURNING *
+), updated AS (
+    UPDATE organization_balances b
+    SET rub_balance = b.rub_balance + totals.delta_rub
+    FROM (
+        SELECT organization_id, SUM(delta_rub) AS delta_rub
+        FROM running
+        GROUP BY organization_id
+    ) AS totals
+    WHERE b.organization_id = totals.organization_id
+      AND b.organization_id IN (SELECT organization_id FROM locked)
+    RETURNING b.organization_id
+)""" + _balance_snapshot
+
+# Пополнения применяются всегда. Списание проходит, если баланс не уходит в минус ни после него,
+# ни после одного из предыдущих списаний организации в пачке. После первого отказа
+# остальные списания этой организации в пачке тоже отклоняются, пополнения - нет
+apply_balance_batch_checked = """
+WITH requested AS (
+    SELECT DISTINCT ON (t.idempotency_key) t.organization_id, t.delta_rub, t.idempotency_key, t.position
+    FROM unnest(
+        CAST(:organization_ids AS INTEGER[]),
+        CAST(:deltas_rub AS NUMERIC[]),
+        CAST(:idempotency_keys AS TEXT[])
+    ) WITH ORDINALITY AS t(organization_id, delta_rub, idempotency_key, position)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM balance_operations op
+        WHERE op.idempotency_key = t.idempotency_key
+    )
+    ORDER BY t.idempotency_key, t.position
+), locked AS (
+    SELECT b.organization_id, b.rub_balance FROM organization_balances b
+    WHERE b.organization_id IN (SELECT organization_id FROM requested)
+    ORDER BY b.organization_id
+    FOR UPDATE
+), projected AS (
+    SELECT
+        requested.organization_id,
+        requested.delta_rub,
+        requested.idempotency_key,
+        requested.position,
+        locked.rub_balance AS rub_balance_before,
+        locked.rub_balance + SUM(requested.delta_rub) OVER (
+            PARTITION BY requested.organization_id ORDER BY requested.position
+        ) AS rub_balance_projected
+    FROM requested
+    JOIN locked ON locked.organization_id = requested.organization_id
+), accepted AS (
+    SELECT
+        organization_id,
+        delta_rub,
+        idempotency_key,
+        position,
+        rub_balance_before,
+        delta_rub >= 0 OR bool_and(delta_rub >= 0 OR rub_balance_projected >= 0) OVER (
+            PARTITION BY organization_id ORDER BY position
+        ) AS accepted
+    FROM projected
+), running AS (
+    SELECT
+        organization_id,
+        delta_rub,
+        idempotency_key,
+        position,
+        rub_balance_before + SUM(delta_rub) OVER (
+            PARTITION BY organization_id ORDER BY position
+        ) AS rub_balance_after
+    FROM accepted
+    WHERE accepted
+), inserted AS (
+    INSERT INTO balance_operations (
+        organization_id,
+        idempotency_key,
+        operation_type,
+        amount_rub,
+        rub_balance_after
+    )
+    SELECT
+        organization_id,
+        idempotency_key,
+        CASE WHEN delta_rub < 0 THEN 'debit' ELSE 'top_up' END,
+        ABS(delta_rub),
+        rub_balance_after
+    FROM running
+    ORDER BY organization_id, position
+    RETURNING *
+), updated AS (
+    UPDATE organization_balances b
+    SET rub_balance = b.rub_balance + totals.delta_rub
+    FROM (
+        SELECT organization_id, SUM(delta_rub) AS delta_rub
+        FROM running
+        GROUP BY organization_id
+    ) AS totals
+    WHERE b.organization_id = totals.organization_id
+      AND b.organization_id IN (SELECT organization_id FROM locked)
+    RETURNING b.organization_id
+)""" + _balance_snapshot
+
+# Баланс из последнего снимка и операций журнала после него - для сверки с organization_balances
+rebuild_organization_balance = """
+SELECT
+    b.organization_id,
+    b.rub_balance,
+    COALESCE(s.rub_balance, 0) + COALESCE((
+        SELECT SUM(CASE WHEN op.operation_type = 'debit' THEN -op.amount_rub ELSE op.amount_rub END)
+        FROM balance_operations op
+        WHERE op.organization_id = b.organization_id
+          AND op.id > COALESCE(s.last_operation_id, 0)
+    ), 0) AS rebuilt_rub_balance,
+    s.last_operation_id AS snapshot_operation_id
+FROM organization_balances b
+LEFT JOIN LATERAL (
+    SELECT last_operation_id, rub_balance FROM balance_snapshots
+    WHERE organization_id = b.organization_id
+    ORDER BY last_operation_id DESC
+    LIMIT 1
+) s ON TRUE
+WHERE b.organization_id = :organization_id;
+"""
+
+get_balance_operation_by_idempotency_key = """
+SELECT * FROM balance_operations
+WHERE idempotency_key = :idempotency_key;
+"""
+
+get_balance_operations_by_idempotency_keys = """
+SELECT * FROM balance_operations
+WHERE idempotency_key = ANY(CAST(:idempotency_keys AS TEXT[]));
+"""
+
+get_existing_organization_ids = """
+SELECT id FROM organizations
+WHERE id = ANY(CAST(:organization_ids AS INTEGER[]));
+"""
+
+get_organization_spend_hourly = """
+SELECT bucket_start, top_up_rub, debit_rub, operations_count
+FROM organization_spend_hourly
+WHERE organization_id = :organization_id
+  AND bucket_start >= :date_from
+  AND bucket_start < :date_to
+ORDER BY bucket_start;
+"""
+
+get_organization_spend_daily = """
+SELECT bucket_start, top_up_rub, debit_rub, operations_count
+FROM organization_spend_daily
+WHERE organization_id = :organization_id
+  AND bucket_start >= :date_from
+  AND bucket_start < :date_to
+ORDER BY bucket_start;
 """
 
-update_balance = """
-UPDATE organizations 
-SET rub_balance = :rub_balance
-WHERE id = :organization_id;
+get_replica_notify_setting = """
+SELECT current_setting('loom_organization.replica_notify', true);
 """
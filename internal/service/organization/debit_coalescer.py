@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from internal import interface, model, common
+
+
+@dataclass
+class _PendingDebit:
+    idempotency_key: str
+    amount_rub: Decimal
+    future: asyncio.Future
+
+
+class DebitCoalescer(interface.IDebitCoalescer):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            organization_repo: interface.IOrganizationRepo,
+            flush_interval_ms: int = 50,
+            max_batch_size: int = 100,
+            check_balance: bool = False,
+    ):
+        self.logger = tel.logger()
+        self.meter = tel.meter()
+        self.organization_repo = organization_repo
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.check_balance = check_balance
+
+        # Списания, ожидающие сброса, по организациям; ключ идемпотентности -> ожидание
+        self._pending: dict[int, dict[str, _PendingDebit]] = {}
+        self._timers: dict[int, asyncio.Task] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._flush_tasks: set[asyncio.Task] = set()
+
+        self.flush_size_histogram = self.meter.create_histogram(
+            name="balance.debit.write_behind.flush.size",
+            unit="{operation}",
+            description="Количество списаний, объединенных в один UPDATE"
+        )
+        self.flush_duration_histogram = self.meter.create_histogram(
+            name="balance.debit.write_behind.flush.duration",
+            unit="s",
+            description="Длительность сброса накопленных списаний в БД"
+        )
+
+    async def debit(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str
+    ) -> model.BalanceOperation | None:
+        batch = self._pending.setdefault(organization_id, {})
+
+        # Повтор ключа внутри еще не сброшенной пачки ждет тот же результат
+        pending = batch.get(idempotency_key)
+        if pending is None:
+            pending = _PendingDebit(
+                idempotency_key=idempotency_key,
+                amount_rub=amount_rub,
+                future=asyncio.get_running_loop().create_future()
+            )
+            batch[idempotency_key] = pending
+        elif pending.amount_rub != amount_rub:
+            # Повтор с другой суммой - конфликт, как и при повторе уже записанной операции
+            self.logger.warning("Ключ идемпотентности уже использован для другой операции")
+            raise common.ErrIdempotencyKeyConflict()
+
+        if len(batch) >= self.max_batch_size:
+            timer = self._timers.pop(organization_id, None)
+            if timer is not None:
+                timer.cancel()
+            flush_task = asyncio.create_task(self._flush(organization_id), context=contextvars.Context())
+            self._flush_tasks.add(flush_task)
+            flush_task.add_done_callback(self._flush_tasks.discard)
+        elif organization_id not in self._timers:
+            # Сброс общий для многих запросов: дедлайн и транзакция первого из них к нему не относятся
+            self._timers[organization_id] = asyncio.create_task(
+                self._flush_later(organization_id),
+                context=contextvars.Context()
+            )
+
+        # Вызывающий получает ответ только после коммита своей пачки
+        return await asyncio.shield(pending.future)
+
+    async def start(self) -> None:
+        # Таймеры сброса создаются лениво при первом списании
+        pass
+
+    async def stop(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+        await asyncio.gather(
+            *self._flush_tasks,
+            *(self._flush(organization_id) for organization_id in list(self._pending)),
+            return_exceptions=True
+        )
+
+    async def _flush_later(self, organization_id: int) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._timers.pop(organization_id, None)
+        await self._flush(organization_id)
+
+    async def _flush(self, organization_id: int) -> None:
+        batch = self._pending.pop(organization_id, None)
+        if not batch:
+            return
+
+        lock = self._locks.setdefault(organization_id, asyncio.Lock())
+        async with lock:
+            pending_debits = list(batch.values())
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                operations = await self.organization_repo.apply_balance_batch(
+                    organization_ids=[organization_id] * len(pending_debits),
+                    deltas_rub=[-pending.amount_rub for pending in pending_debits],
+                    idempotency_keys=[pending.idempotency_key for pending in pending_debits],
+                    check_balance=self.check_balance
+                )
+            except Exception as err:
+                status = "error"
+                self.logger.error(f"Ошибка сброса накопленных списаний: {str(err)}")
+                # Ошибка одного ключа не должна ронять всю пачку: каждый вызывающий повторит списание по одному
+                for pending in pending_debits:
+                    if not pending.future.done():
+                        pending.future.set_result(None)
+                return
+            finally:
+                attributes = {"status": status}
+                self.flush_size_histogram.record(len(pending_debits), attributes)
+                self.flush_duration_histogram.record(time.perf_counter() - start, attributes)
+
+            # Списания без результата (повтор ключа, нет организации, не хватило средств)
+            # сервис доводит до конца по одному
+            operations_by_key = {operation.idempotency_key: operation for operation in operations}
+            for pending in pending_debits:
+                if not pending.future.done():
+                    pending.future.set_result(operations_by_key.get(pending.idempotency_key))
@@ -0,0 +1,35 @@
+from internal import interface
+from pkg.cache_wrapper import LRUCache
+
+
+class MissingOrganizationCache(interface.IMissingOrganizationCache):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            ttl_sec: float = 5.0,
+            max_size: int = 100000,
+    ):
+        self.meter = tel.meter()
+        # id организаций, которых недавно не нашли; TTL ограничивает рассинхронизацию между воркерами
+        self.missing = LRUCache(maxsize=max_size, ttl=ttl_sec)
+
+        self.requests_counter = self.meter.create_counter(
+            name="organization.negative_cache.requests",
+            unit="{request}",
+            description="Проверки несуществующих организаций: hit - ответ без БД, miss - запрос ушел в БД"
+        )
+
+    def is_missing(self, organization_id: int) -> bool:
+        missing = self.missing.get(organization_id, False)
+        self.requests_counter.add(1, {"result": "hit" if missing else "miss"})
+        return missing
+
+    def generation(self, organization_id: int) -> tuple[int, int]:
+        return self.missing.generation(organization_id)
+
+    def remember(self, organization_id: int, generation: tuple[int, int]) -> None:
+        # Создание организации во время чтения сменит поколение, и промах не запомнится
+        self.missing.set_if_generation(organization_id, True, organization_id, generation)
+
+    def forget(self, organization_id: int) -> None:
+        self.missing.invalidate(organization_id)
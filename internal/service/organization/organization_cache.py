@@ -0,0 +1,195 @@
+import asyncio
+import time
+import traceback
+from typing import Awaitable, Callable
+
+from internal import interface, model
+from pkg.cache_wrapper import LRUCache
+
+# Меняется при несовместимом изменении формата значения в Redis
+CACHE_SCHEMA_VERSION = 1
+
+
+class OrganizationCache(interface.IOrganizationCache):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            redis: interface.IRedis,
+            key_prefix: str = "loom-organization",
+            ttl_sec: int = 300,
+            local_ttl_sec: float = 30.0,
+            local_max_size: int = 10000,
+            invalidation_channel: str = "loom-organization:invalidate",
+            unavailable_backoff_sec: float = 5.0,
+            missing_organization_cache: interface.IMissingOrganizationCache = None,
+    ):
+        self.logger = tel.logger()
+        self.meter = tel.meter()
+        self.redis = redis
+        self.key_prefix = f"{key_prefix}:v{CACHE_SCHEMA_VERSION}"
+        self.ttl_sec = ttl_sec
+        self.invalidation_channel = invalidation_channel
+        self.unavailable_backoff_sec = unavailable_backoff_sec
+        # Промахи других воркеров сбрасываются тем же сообщением, что и L1: иначе после создания
+        # организации они отвечали бы 404 до истечения TTL
+        self.missing_organization_cache = missing_organization_cache
+
+        # L1 в памяти воркера; копии во всех воркерах сбрасываются сообщением из канала инвалидации
+        self.local = LRUCache(maxsize=local_max_size, ttl=local_ttl_sec)
+        self._unavailable_until = 0.0
+        # Без подписки инвалидации из других воркеров не доходят, и L1 не используется
+        self._listening = False
+        self._task: asyncio.Task | None = None
+        # Инвалидации, которые не удалось записать в Redis; повторяются после паузы
+        self._pending_invalidations: set[int] = set()
+        self._retry_task: asyncio.Task | None = None
+
+        self.requests_counter = self.meter.create_counter(
+            name="organization.cache.requests",
+            unit="{request}",
+            description="Чтения организации через общий кэш по уровню: local, redis, miss, bypass"
+        )
+        self.invalidations_counter = self.meter.create_counter(
+            name="organization.cache.invalidations",
+            unit="{message}",
+            description="Инвалидации общего кэша: published - отправлены, received - получены из канала"
+        )
+
+    async def get_or_load(
+            self,
+            organization_id: int,
+            load: Callable[[], Awaitable[model.Organization | None]]
+    ) -> model.Organization | None:
+        if not self._redis_available() or not await self._flush_invalidations():
+            self.requests_counter.add(1, {"level": "bypass"})
+            return await load()
+
+        organization = self.local.get(organization_id) if self._listening else None
+        if organization is not None:
+            self.requests_counter.add(1, {"level": "local"})
+            return organization
+
+        # Запоминаем версию до чтения из БД: запись, пришедшая позже, сделает наше значение устаревшим
+        local_generation = self.local.generation(organization_id)
+        try:
+            version, cached = await self.redis.mget(
+                self._version_key(organization_id),
+                self._data_key(organization_id)
+            )
+        except Exception as err:
+            self._mark_unavailable(err)
+            self.requests_counter.add(1, {"level": "bypass"})
+            return await load()
+
+        version = int(version or 0)
+        if isinstance(cached, dict) and cached.get("version") == version:
+            organization = model.Organization.from_dict(cached["organization"])
+            self.local.set_if_generation(organization_id, organization, organization_id, local_generation)
+            self.requests_counter.add(1, {"level": "redis"})
+            return organization
+
+        self.requests_counter.add(1, {"level": "miss"})
+        organization = await load()
+        if organization is None:
+            return None
+
+        try:
+            await self.redis.set(
+                self._data_key(organization_id),
+                {"version": version, "organization": organization.to_dict()},
+                ttl=self.ttl_sec
+            )
+        except Exception as err:
+            self._mark_unavailable(err)
+        self.local.set_if_generation(organization_id, organization, organization_id, local_generation)
+
+        return organization
+
+    async def invalidate(self, *organization_ids: int) -> None:
+        for organization_id in organization_ids:
+            self.local.invalidate(organization_id)
+
+        # Без новой версии в Redis другие воркеры отдавали бы старое значение до истечения ttl,
+        # поэтому id остаются в очереди, пока INCR и PUBLISH не пройдут
+        self._pending_invalidations.update(organization_ids)
+        if self._redis_available():
+            await self._flush_invalidations()
+
+    async def _flush_invalidations(self) -> bool:
+        try:
+            for organization_id in list(self._pending_invalidations):
+                # Новая версия делает недействительными и уже записанное значение,
+                # и значение, которое параллельный читатель сейчас несет из БД
+                await self.redis.incr(self._version_key(organization_id))
+                await self.redis.publish(self.invalidation_channel, organization_id)
+                self._pending_invalidations.discard(organization_id)
+                self.invalidations_counter.add(1, {"direction": "published"})
+        except Exception as err:
+            self._mark_unavailable(err)
+            return False
+        return True
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+        self._retry_task = asyncio.create_task(self._retry_invalidations())
+        self.logger.info("Подписка на инвалидации кэша организаций запущена")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._retry_task.cancel()
+        await asyncio.gather(self._task, self._retry_task, return_exceptions=True)
+        self._task = None
+        self._retry_task = None
+        self.logger.info("Подписка на инвалидации кэша организаций остановлена")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for organization_id in self.redis.subscribe(
+                        self.invalidation_channel,
+                        on_subscribed=self._on_subscribed
+                ):
+                    self.local.invalidate(int(organization_id))
+                    if self.missing_organization_cache is not None:
+                        self.missing_organization_cache.forget(int(organization_id))
+                    self.invalidations_counter.add(1, {"direction": "received"})
+            except asyncio.CancelledError:
+                self._listening = False
+                raise
+            except Exception as err:
+                self.logger.warning(f"Потеряна подписка на инвалидации кэша организаций: {str(err)}", {
+                    "traceback": traceback.format_exc(),
+                })
+
+            self._listening = False
+            # Пока подписки не было, сообщения могли потеряться - локальные копии больше не доверенные
+            self.local.invalidate()
+            await asyncio.sleep(self.unavailable_backoff_sec)
+
+    def _on_subscribed(self) -> None:
+        # До подтверждения подписки L1 мог набрать значения, инвалидации которых не дошли
+        self.local.invalidate()
+        self._listening = True
+
+    async def _retry_invalidations(self) -> None:
+        # Повтор нужен и без входящих запросов: иначе другие воркеры не узнают о записи
+        while True:
+            await asyncio.sleep(self.unavailable_backoff_sec)
+            if self._pending_invalidations and self._redis_available():
+                await self._flush_invalidations()
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def _mark_unavailable(self, err: Exception) -> None:
+        # Redis недоступен - на время паузы все чтения идут напрямую в Postgres
+        self._unavailable_until = time.monotonic() + self.unavailable_backoff_sec
+        self.logger.warning(f"Redis недоступен, кэш организаций отключен на {self.unavailable_backoff_sec} с: {str(err)}")
+
+    def _version_key(self, organization_id: int) -> str:
+        return f"{self.key_prefix}:organization:{organization_id}:version"
+
+    def _data_key(self, organization_id: int) -> str:
+        return f"{self.key_prefix}:organization:{organization_id}"
@@ -0,0 +1,98 @@
+import asyncio
+import contextvars
+
+from internal import interface, model
+
+
+class OrganizationLoader(interface.IOrganizationLoader):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            organization_repo: interface.IOrganizationRepo,
+            max_batch_size: int = 1000,
+    ):
+        self.logger = tel.logger()
+        self.meter = tel.meter()
+        self.organization_repo = organization_repo
+        self.max_batch_size = max_batch_size
+
+        # Запросы к БД, которые еще не вернулись; новые ожидающие того же id ждут тот же результат
+        self._in_flight: dict[int, asyncio.Future] = {}
+        # (id, ожидание), запрошенные в текущем витке цикла событий и еще не отправленные в БД.
+        # Ожидание фиксируется здесь: clear() может убрать id из _in_flight до отправки пачки
+        self._pending: list[tuple[int, asyncio.Future]] = []
+        self._dispatch_scheduled = False
+        self._batch_tasks: set[asyncio.Task] = set()
+
+        self.requests_counter = self.meter.create_counter(
+            name="organization.loader.requests",
+            unit="{request}",
+            description="Запросы организации по id: shared - присоединились к идущему запросу, loaded - ушли в БД"
+        )
+        self.batch_size_histogram = self.meter.create_histogram(
+            name="organization.loader.batch.size",
+            unit="{organization}",
+            description="Количество id, объединенных в один запрос ANY(:ids)"
+        )
+
+    async def load(self, organization_id: int) -> model.Organization | None:
+        future = self._in_flight.get(organization_id)
+        if future is not None:
+            self.requests_counter.add(1, {"result": "shared"})
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._in_flight[organization_id] = future
+        self._pending.append((organization_id, future))
+        self.requests_counter.add(1, {"result": "loaded"})
+
+        # call_soon выполнится после всех корутин, готовых в текущем витке, и соберет их id в один запрос.
+        # Пачка обслуживает разные запросы, поэтому не наследует контекст (и транзакцию) первого из них
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            loop.call_soon(self._dispatch, context=contextvars.Context())
+
+        return await asyncio.shield(future)
+
+    def clear(self, organization_id: int) -> None:
+        # После записи новые чтения не должны присоединяться к запросу, начатому до нее.
+        # Уже ожидающие получат результат своей пачки - _load_batch держит их ожидания сам
+        self._in_flight.pop(organization_id, None)
+
+    def _dispatch(self) -> None:
+        self._dispatch_scheduled = False
+        pending, self._pending = self._pending, []
+
+        for start in range(0, len(pending), self.max_batch_size):
+            batch_task = asyncio.create_task(
+                self._load_batch(pending[start:start + self.max_batch_size])
+            )
+            self._batch_tasks.add(batch_task)
+            batch_task.add_done_callback(self._batch_tasks.discard)
+
+    async def _load_batch(self, pending: list[tuple[int, asyncio.Future]]) -> None:
+        # После clear() тот же id может попасть в пачку дважды с разными ожиданиями
+        organization_ids = list(dict.fromkeys(organization_id for organization_id, _ in pending))
+        self.batch_size_histogram.record(len(organization_ids))
+
+        try:
+            organizations = await self.organization_repo.get_organizations_by_ids(organization_ids)
+        except Exception as err:
+            self.logger.error(f"Ошибка пакетной загрузки организаций: {str(err)}")
+            for organization_id, future in pending:
+                self._forget(organization_id, future)
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        organizations_by_id = {organization.id: organization for organization in organizations}
+        for organization_id, future in pending:
+            self._forget(organization_id, future)
+            if not future.done():
+                future.set_result(organizations_by_id.get(organization_id))
+
+    def _forget(self, organization_id: int, future: asyncio.Future) -> None:
+        # clear() мог уже заменить запись более новым запросом - его не трогаем
+        if self._in_flight.get(organization_id) is future:
+            del self._in_flight[organization_id]
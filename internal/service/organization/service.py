@@ -1,4 +1,7 @@
+import uuid
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from typing import AsyncIterator
 
 from internal import interface, model, common
 
@@ -10,33 +13,93 @@ class OrganizationService(interface.IOrganizationService):
             self,
             tel: interface.ITelemetry,
             organization_repo: interface.IOrganizationRepo,
+            check_sufficient_balance: bool = False,
+            debit_coalescer: interface.IDebitCoalescer = None,
+            organization_loader: interface.IOrganizationLoader = None,
+            organization_cache: interface.IOrganizationCache = None,
+            missing_organization_cache: interface.IMissingOrganizationCache = None,
     ):
         self.tracer = tel.tracer()
         self.logger = tel.logger()
         self.organization_repo = organization_repo
+        self.check_sufficient_balance = check_sufficient_balance
+        self.debit_coalescer = debit_coalescer
+        self.organization_loader = organization_loader
+        self.organization_cache = organization_cache
+        self.missing_organization_cache = missing_organization_cache
 
     @traced_method()
     async def create_organization(self, name: str) -> int:
         organization_id = await self.organization_repo.create_organization(
             name=name
         )
+        if self.missing_organization_cache is not None:
+            self.missing_organization_cache.forget(organization_id)
+        # Другие воркеры могли запомнить этот id как несуществующий
+        await self._invalidate_organization(organization_id)
         return organization_id
 
     @traced_method()
-    async def get_organization_by_id(self, organization_id: int) -> model.Organization:
-        organizations = await self.organization_repo.get_organization_by_id(organization_id)
-        if not organizations:
+    async def get_organization_by_id(self, organization_id: int, fields: list[str] = None) -> model.Organization:
+        organization = await self._load_organization(organization_id, fields)
+        if organization is None:
             self.logger.warning("Организация не найдена")
             raise common.ErrOrganizationNotFound()
 
-        organization = organizations[0]
         return organization
 
     @traced_method()
-    async def get_all_organizations(self) -> list[model.Organization]:
-        organizations = await self.organization_repo.get_all_organizations()
+    async def get_organizations_by_ids(
+            self,
+            organization_ids: list[int],
+            fields: list[str] = None
+    ) -> list[model.Organization | None]:
+        organizations = await self.organization_repo.get_organizations_by_ids(organization_ids, fields)
+
+        # Порядок как в запросе, ненайденные id - None
+        organizations_by_id = {organization.id: organization for organization in organizations}
+        return [organizations_by_id.get(organization_id) for organization_id in organization_ids]
+
+    @traced_method()
+    async def get_all_organizations(
+            self,
+            limit: int = None,
+            after_created_at: datetime = None,
+            after_id: int = None,
+            fields: list[str] = None
+    ) -> list[model.Organization]:
+        organizations = await self.organization_repo.get_all_organizations(
+            limit=limit,
+            after_created_at=after_created_at,
+            after_id=after_id,
+            fields=fields
+        )
         return organizations
 
+    @traced_method()
+    async def search_organizations(
+            self,
+            query: str,
+            limit: int,
+            after_rank: float = None,
+            after_id: int = None
+    ) -> list[model.OrganizationSearchHit]:
+        hits = await self.organization_repo.search_organizations(
+            query=query,
+            limit=limit,
+            after_rank=after_rank,
+            after_id=after_id
+        )
+        return hits
+
+    async def stream_all_organizations(
+            self,
+            chunk_size: int = 1000,
+            fields: list[str] = None
+    ) -> AsyncIterator[list[model.Organization]]:
+        async for organizations in self.organization_repo.stream_all_organizations(chunk_size, fields):
+            yield organizations
+
     @traced_method()
     async def update_organization(
             self,
@@ -52,12 +115,13 @@ class OrganizationService(interface.IOrganizationService):
             locale: dict = None,
             additional_info: list[str] = None,
     ) -> None:
-        organizations = await self.organization_repo.get_organization_by_id(organization_id)
-        if not organizations:
+        if self._is_known_missing(organization_id):
             self.logger.warning("Организация не найдена")
             raise common.ErrOrganizationNotFound()
+        missing_generation = self._missing_generation(organization_id)
 
-        await self.organization_repo.update_organization(
+        # Существование проверяет сам UPDATE ... RETURNING id, без отдельного SELECT
+        updated = await self.organization_repo.update_organization(
             organization_id=organization_id,
             name=name,
             video_cut_description_end_sample=video_cut_description_end_sample,
@@ -70,51 +134,420 @@ class OrganizationService(interface.IOrganizationService):
             locale=locale,
             additional_info=additional_info
         )
+        if not updated:
+            self._remember_missing(organization_id, missing_generation)
+            self.logger.warning("Организация не найдена")
+            raise common.ErrOrganizationNotFound()
+
+        await self._invalidate_organization(organization_id)
 
     @traced_method()
     async def delete_organization(self, organization_id: int) -> None:
-        organizations = await self.organization_repo.get_organization_by_id(organization_id)
-        if not organizations:
+        if self._is_known_missing(organization_id):
             self.logger.warning("Организация не найдена")
             raise common.ErrOrganizationNotFound()
+        missing_generation = self._missing_generation(organization_id)
 
-        await self.organization_repo.delete_organization(organization_id)
+        if not await self.organization_repo.delete_organization(organization_id):
+            self._remember_missing(organization_id, missing_generation)
+            self.logger.warning("Организация не найдена")
+            raise common.ErrOrganizationNotFound()
+
+        await self._invalidate_organization(organization_id)
 
     @traced_method()
-    async def top_up_balance(self, organization_id: int, amount_rub: Decimal) -> None:
-        # Проверяем, что организация существует
-        organizations = await self.organization_repo.get_organization_by_id(organization_id)
-        if not organizations:
+    async def create_organizations(self, names: list[str]) -> list[model.OrganizationBulkResult]:
+        if not names:
+            return []
+
+        organization_ids = await self.organization_repo.create_organizations(names)
+        if self.missing_organization_cache is not None:
+            for organization_id in organization_ids:
+                self.missing_organization_cache.forget(organization_id)
+        await self._invalidate_organization(*organization_ids)
+
+        return [
+            model.OrganizationBulkResult(
+                organization_id=organization_id,
+                status=model.ORGANIZATION_BULK_STATUS_CREATED
+            )
+            for organization_id in organization_ids
+        ]
+
+    @traced_method()
+    async def update_organizations(
+            self,
+            updates: list[model.OrganizationUpdate]
+    ) -> list[model.OrganizationBulkResult]:
+        if not updates:
+            return []
+
+        # Повторы одной организации сливаются: UPDATE ... FROM применяет к строке только одну запись
+        merged: dict[int, dict] = {}
+        for update in updates:
+            merged.setdefault(update.organization_id, {}).update(update.changes())
+
+        organization_ids = [
+            organization_id for organization_id in merged if not self._is_known_missing(organization_id)
+        ]
+        missing_generations = {
+            organization_id: self._missing_generation(organization_id) for organization_id in organization_ids
+        }
+
+        updated_ids = set()
+        if organization_ids:
+            updated_ids = set(await self.organization_repo.update_organizations([
+                model.OrganizationUpdate(organization_id=organization_id, **merged[organization_id])
+                for organization_id in organization_ids
+            ]))
+
+        for organization_id in organization_ids:
+            if organization_id not in updated_ids:
+                self._remember_missing(organization_id, missing_generations[organization_id])
+        await self._invalidate_organization(*updated_ids)
+
+        return [
+            model.OrganizationBulkResult(
+                organization_id=update.organization_id,
+                status=model.ORGANIZATION_BULK_STATUS_UPDATED
+                if update.organization_id in updated_ids else model.ORGANIZATION_BULK_STATUS_NOT_FOUND
+            )
+            for update in updates
+        ]
+
+    @traced_method()
+    async def delete_organizations(self, organization_ids: list[int]) -> list[model.OrganizationBulkResult]:
+        if not organization_ids:
+            return []
+
+        unique_ids = [
+            organization_id
+            for organization_id in dict.fromkeys(organization_ids)
+            if not self._is_known_missing(organization_id)
+        ]
+        missing_generations = {
+            organization_id: self._missing_generation(organization_id) for organization_id in unique_ids
+        }
+
+        deleted_ids = set()
+        if unique_ids:
+            deleted_ids = set(await self.organization_repo.delete_organizations(unique_ids))
+
+        for organization_id in unique_ids:
+            if organization_id not in deleted_ids:
+                self._remember_missing(organization_id, missing_generations[organization_id])
+        await self._invalidate_organization(*deleted_ids)
+
+        return [
+            model.OrganizationBulkResult(
+                organization_id=organization_id,
+                status=model.ORGANIZATION_BULK_STATUS_DELETED
+                if organization_id in deleted_ids else model.ORGANIZATION_BULK_STATUS_NOT_FOUND
+            )
+            for organization_id in organization_ids
+        ]
+
+    @traced_method()
+    async def top_up_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str = None
+    ) -> model.BalanceOperation:
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+        if self._is_known_missing(organization_id):
             self.logger.warning("Организация не найдена")
             raise common.ErrOrganizationNotFound()
+        missing_generation = self._missing_generation(organization_id)
 
-        organization = organizations[0]
+        # Баланс и запись в журнале меняются одним UPDATE ... RETURNING, без предварительного SELECT
+        try:
+            operations = await self.organization_repo.top_up_balance(
+                organization_id=organization_id,
+                amount_rub=amount_rub,
+                idempotency_key=idempotency_key
+            )
+        except common.ErrUniqueViolation as err:
+            # Параллельный запрос с тем же ключом успел закоммитить операцию раньше
+            if err.constraint != model.BALANCE_OPERATION_IDEMPOTENCY_KEY_CONSTRAINT:
+                raise
+            operations = await self.organization_repo.get_balance_operation_by_idempotency_key(idempotency_key)
+            if not operations:
+                raise
+            return self._replay_balance_operation(
+                operations[0], organization_id, model.BALANCE_OPERATION_TOP_UP, amount_rub
+            )
 
-        rub_balance = organization.rub_balance + amount_rub
+        if operations:
+            await self._invalidate_organization(organization_id)
+            return operations[0]
 
-        await self.organization_repo.update_balance(
-            organization_id=organization_id,
-            rub_balance=str(rub_balance)
+        operations = await self.organization_repo.get_balance_operation_by_idempotency_key(idempotency_key)
+        if operations:
+            return self._replay_balance_operation(
+                operations[0], organization_id, model.BALANCE_OPERATION_TOP_UP, amount_rub
+            )
+
+        self._remember_missing(organization_id, missing_generation)
+        self.logger.warning("Организация не найдена")
+        raise common.ErrOrganizationNotFound()
+
+    @traced_method()
+    async def debit_balance(
+            self,
+            organization_id: int,
+            amount_rub: Decimal,
+            idempotency_key: str = None
+    ) -> model.BalanceOperation:
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+        if self._is_known_missing(organization_id):
+            self.logger.warning("Организация не найдена")
+            raise common.ErrOrganizationNotFound()
+        missing_generation = self._missing_generation(organization_id)
+
+        # Write-behind: списание уходит в общую пачку по организации
+        if self.debit_coalescer is not None:
+            operation = await self.debit_coalescer.debit(organization_id, amount_rub, idempotency_key)
+            if operation is not None:
+                await self._invalidate_organization(organization_id)
+                return operation
+
+        try:
+            operations = await self.organization_repo.debit_balance(
+                organization_id=organization_id,
+                amount_rub=amount_rub,
+                idempotency_key=idempotency_key,
+                check_balance=self.check_sufficient_balance
+            )
+        except common.ErrUniqueViolation as err:
+            if err.constraint != model.BALANCE_OPERATION_IDEMPOTENCY_KEY_CONSTRAINT:
+                raise
+            operations = await self.organization_repo.get_balance_operation_by_idempotency_key(idempotency_key)
+            if not operations:
+                raise
+            return self._replay_balance_operation(
+                operations[0], organization_id, model.BALANCE_OPERATION_DEBIT, amount_rub
+            )
+
+        if operations:
+            await self._invalidate_organization(organization_id)
+            return operations[0]
+
+        # Пустой RETURNING: повтор по ключу, нет организации или не хватило средств.
+        # Обе проверки идут одним соединением с primary: реплика могла не догнать организацию
+        async with self.organization_repo.transaction():
+            operations = await self.organization_repo.get_balance_operation_by_idempotency_key(idempotency_key)
+            organization_exists = operations or bool(
+                await self.organization_repo.get_existing_organization_ids([organization_id])
+            )
+        if operations:
+            return self._replay_balance_operation(
+                operations[0], organization_id, model.BALANCE_OPERATION_DEBIT, amount_rub
+            )
+
+        if not organization_exists:
+            self._remember_missing(organization_id, missing_generation)
+            self.logger.warning("Организация не найдена")
+            raise common.ErrOrganizationNotFound()
+
+        self.logger.warning("Недостаточно средств на балансе организации")
+        raise common.ErrInsufficientBalance()
+
+    @traced_method()
+    async def apply_balance_batch(
+            self,
+            operations: list[model.BalanceBatchOperation]
+    ) -> list[model.BalanceBatchResult]:
+        if not operations:
+            return []
+
+        # Повторы ключа внутри запроса сводятся к первому вхождению
+        first_by_key: dict[str, model.BalanceBatchOperation] = {}
+        for operation in operations:
+            first_by_key.setdefault(operation.idempotency_key, operation)
+        unique_operations = list(first_by_key.values())
+
+        applied = await self.organization_repo.apply_balance_batch(
+            organization_ids=[operation.organization_id for operation in unique_operations],
+            deltas_rub=[operation.delta_rub for operation in unique_operations],
+            idempotency_keys=[operation.idempotency_key for operation in unique_operations],
+            check_balance=self.check_sufficient_balance
         )
+        applied_by_key = {operation.idempotency_key: operation for operation in applied}
+        await self._invalidate_organization(*{operation.organization_id for operation in applied})
+
+        # Дополнительные запросы нужны только для элементов, которые не были применены
+        stored_by_key = {}
+        existing_organization_ids = set()
+        missing_keys = [key for key in first_by_key if key not in applied_by_key]
+        if missing_keys:
+            # Оба запроса - одно соединение с primary вместо двух из пула
+            async with self.organization_repo.transaction():
+                stored = await self.organization_repo.get_balance_operations_by_idempotency_keys(missing_keys)
+                stored_by_key = {operation.idempotency_key: operation for operation in stored}
+
+                unresolved_organization_ids = {
+                    first_by_key[key].organization_id for key in missing_keys if key not in stored_by_key
+                }
+                if unresolved_organization_ids:
+                    existing_organization_ids = set(
+                        await self.organization_repo.get_existing_organization_ids(list(unresolved_organization_ids))
+                    )
+
+        results = []
+        for operation in operations:
+            key = operation.idempotency_key
+            ledger_operation = applied_by_key.get(key) or stored_by_key.get(key)
+
+            if ledger_operation is not None:
+                replayed = key not in applied_by_key or operation is not first_by_key[key]
+                if not replayed:
+                    status = model.BALANCE_BATCH_STATUS_APPLIED
+                elif self._matches_balance_operation(
+                        ledger_operation,
+                        operation.organization_id,
+                        operation.operation_type,
+                        abs(operation.delta_rub)
+                ):
+                    status = model.BALANCE_BATCH_STATUS_REPLAYED
+                else:
+                    status = model.BALANCE_BATCH_STATUS_CONFLICT
+                    ledger_operation = None
+            elif operation.delta_rub < 0 and operation.organization_id in existing_organization_ids:
+                # Проверка средств отклоняет только списания, пополнения применяются всегда
+                status = model.BALANCE_BATCH_STATUS_INSUFFICIENT_BALANCE
+            else:
+                status = model.BALANCE_BATCH_STATUS_NOT_FOUND
+
+            results.append(model.BalanceBatchResult(
+                organization_id=operation.organization_id,
+                idempotency_key=key,
+                status=status,
+                operation=ledger_operation
+            ))
+
+        return results
 
     @traced_method()
-    async def debit_balance(self, organization_id: int, amount_rub: Decimal) -> None:
-        # Проверяем, что организация существует
-        organizations = await self.organization_repo.get_organization_by_id(organization_id)
-        if not organizations:
+    async def get_organization_spend(
+            self,
+            organization_id: int,
+            granularity: str = model.SPEND_GRANULARITY_DAY,
+            date_from: datetime = None,
+            date_to: datetime = None
+    ) -> list[model.SpendBucket]:
+        if self._is_known_missing(organization_id):
             self.logger.warning("Организация не найдена")
             raise common.ErrOrganizationNotFound()
 
-        organization = organizations[0]
+        missing_generation = self._missing_generation(organization_id)
+        if not await self.organization_repo.get_existing_organization_ids([organization_id]):
+            self._remember_missing(organization_id, missing_generation)
+            self.logger.warning("Организация не найдена")
+            raise common.ErrOrganizationNotFound()
 
-        rub_balance = organization.rub_balance - amount_rub
+        # bucket_start хранится как TIMESTAMP в UTC: aware-значения приводим к UTC и отбрасываем зону
+        date_to = _naive_utc(date_to) if date_to is not None else datetime.now(timezone.utc).replace(tzinfo=None)
+        date_from = _naive_utc(date_from) if date_from is not None else None
+        if date_from is None:
+            if granularity == model.SPEND_GRANULARITY_HOUR:
+                date_from = date_to - timedelta(hours=48)
+            else:
+                date_from = date_to - timedelta(days=30)
 
-        # # Проверяем, что у организации достаточно средств
-        # current_balance = organizations[0].rub_balance
-        # if current_balance < amount_rub:
-        #     raise common.ErrInsufficientBalance()
+        if date_from >= date_to:
+            self.logger.warning("Некорректный интервал трат организации")
+            raise common.ErrInvalidDateRange()
 
-        await self.organization_repo.update_balance(
+        buckets = await self.organization_repo.get_organization_spend(
             organization_id=organization_id,
-            rub_balance=str(rub_balance)
+            granularity=granularity,
+            date_from=date_from,
+            date_to=date_to
         )
+        return buckets
+
+    def _replay_balance_operation(
+            self,
+            operation: model.BalanceOperation,
+            organization_id: int,
+            operation_type: str,
+            amount_rub: Decimal
+    ) -> model.BalanceOperation:
+        if not self._matches_balance_operation(operation, organization_id, operation_type, amount_rub):
+            self.logger.warning("Ключ идемпотентности уже использован для другой операции")
+            raise common.ErrIdempotencyKeyConflict()
+
+        self.logger.info("Повтор операции с балансом, возвращаем сохраненный результат")
+        operation.replayed = True
+        return operation
+
+    async def _load_organization(self, organization_id: int, fields: list[str] = None) -> model.Organization | None:
+        # Недавно не найденные id отвечаем без запроса в БД
+        if self._is_known_missing(organization_id):
+            return None
+        missing_generation = self._missing_generation(organization_id)
+
+        if fields:
+            organizations = await self.organization_repo.get_organization_by_id(organization_id, fields)
+            organization = organizations[0] if organizations else None
+        elif self.organization_cache is not None:
+            organization = await self.organization_cache.get_or_load(
+                organization_id,
+                lambda: self._load_organization_from_db(organization_id)
+            )
+        else:
+            organization = await self._load_organization_from_db(organization_id)
+
+        if organization is None:
+            self._remember_missing(organization_id, missing_generation)
+        return organization
+
+    async def _load_organization_from_db(self, organization_id: int) -> model.Organization | None:
+        # Загрузчик объединяет одновременные запросы одной и разных организаций в один SELECT
+        if self.organization_loader is not None:
+            return await self.organization_loader.load(organization_id)
+
+        organizations = await self.organization_repo.get_organization_by_id(organization_id)
+        return organizations[0] if organizations else None
+
+    def _is_known_missing(self, organization_id: int) -> bool:
+        return self.missing_organization_cache is not None and self.missing_organization_cache.is_missing(
+            organization_id
+        )
+
+    def _missing_generation(self, organization_id: int) -> tuple[int, int] | None:
+        if self.missing_organization_cache is None:
+            return None
+        return self.missing_organization_cache.generation(organization_id)
+
+    def _remember_missing(self, organization_id: int, generation: tuple[int, int] | None) -> None:
+        if self.missing_organization_cache is not None:
+            self.missing_organization_cache.remember(organization_id, generation)
+
+    async def _invalidate_organization(self, *organization_ids: int) -> None:
+        if self.organization_loader is not None:
+            for organization_id in organization_ids:
+                self.organization_loader.clear(organization_id)
+
+        # Инвалидация публикуется всем воркерам, чтобы они сбросили свои копии
+        if self.organization_cache is not None and organization_ids:
+            await self.organization_cache.invalidate(*organization_ids)
+
+    @staticmethod
+    def _matches_balance_operation(
+            operation: model.BalanceOperation,
+            organization_id: int,
+            operation_type: str,
+            amount_rub: Decimal
+    ) -> bool:
+        return (operation.organization_id == organization_id and
+                operation.operation_type == operation_type and
+                operation.amount_rub == amount_rub)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # Значение без зоны считается уже заданным в UTC
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
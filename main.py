@@ -3,15 +3,25 @@ from contextvars import ContextVar
 import uvicorn
 
 from infrastructure.pg.pg import PG
+from infrastructure.pg.asyncpg_db import AsyncpgDB
+from infrastructure.pg.statement import register_statements
+from infrastructure.redis_client.redis_client import RedisClient
 from infrastructure.telemetry.telemetry import Telemetry, AlertManager
 
 from pkg.client.internal.loom_authorization.client import LoomAuthorizationClient
 
 from internal.controller.http.middlerware.middleware import HttpMiddleware
 from internal.controller.http.handler.organization.handler import OrganizationController
+from internal.controller.redis_stream.balance.consumer import BalanceStreamConsumer
 
 from internal.service.organization.service import OrganizationService
+from internal.service.organization.debit_coalescer import DebitCoalescer
+from internal.service.organization.organization_loader import OrganizationLoader
+from internal.service.organization.organization_cache import OrganizationCache
+from internal.service.organization.missing_organization_cache import MissingOrganizationCache
 from internal.repo.organization.repo import OrganizationRepo
+from internal.repo.organization.replica import OrganizationReplica
+from internal.repo.organization import sql_query as organization_sql_query
 
 from internal.app.http.app import NewHTTP
 from internal.config.config import Config
@@ -19,6 +29,10 @@ from internal.config.config import Config
 cfg = Config()
 
 log_context: ContextVar[dict] = ContextVar('log_context', default={})
+request_deadline: ContextVar[float | None] = ContextVar('request_deadline', default=None)
+
+# Имена запросов для span'ов, метрик и лога медленных запросов
+register_statements(organization_sql_query, "organization")
 
 alert_manager = AlertManager(
     cfg.alert_tg_bot_token,
@@ -46,36 +60,170 @@ tel = Telemetry(
 )
 
 # Инициализация клиентов
-db = PG(tel, cfg.db_user, cfg.db_pass, cfg.db_host, cfg.db_port, cfg.db_name)
+if cfg.db_driver == "asyncpg":
+    db = AsyncpgDB(
+        tel,
+        cfg.db_user,
+        cfg.db_pass,
+        cfg.db_host,
+        cfg.db_port,
+        cfg.db_name,
+        deadline=request_deadline,
+    )
+else:
+    db = PG(
+        tel,
+        cfg.db_user,
+        cfg.db_pass,
+        cfg.db_host,
+        cfg.db_port,
+        cfg.db_name,
+        replica_hosts=cfg.db_replica_hosts,
+        read_your_writes_sec=cfg.db_read_your_writes_sec,
+        max_replica_lag_sec=cfg.db_max_replica_lag_sec,
+        deadline=request_deadline,
+        slow_query_ms=cfg.db_slow_query_ms,
+        explain_sample_rate=cfg.db_explain_sample_rate,
+        statement_timeout_sec=cfg.db_statement_timeout_sec or None,
+    )
+redis_client = RedisClient(cfg.redis_host, cfg.redis_port, cfg.redis_db, cfg.redis_password)
 
 # Инициализация внешних клиентов
 loom_authorization_client = LoomAuthorizationClient(
     tel=tel,
     host=cfg.loom_authorization_host,
     port=cfg.loom_authorization_port,
-    log_context=log_context
+    log_context=log_context,
+    request_deadline=request_deadline
 )
 
 # Инициализация репозиториев
-organization_repo = OrganizationRepo(tel, db)
+organization_replica = None
+if cfg.replica_enabled:
+    organization_replica = OrganizationReplica(
+        tel=tel,
+        db=db,
+        full_resync_interval_sec=cfg.replica_full_resync_interval_sec,
+        snapshot_path=cfg.replica_snapshot_path,
+    )
+
+organization_repo = OrganizationRepo(
+    tel,
+    db,
+    cfg.balance_snapshot_interval,
+    cache_enabled=cfg.organization_cache_enabled,
+    cache_ttl=cfg.organization_cache_ttl_sec,
+    cache_max_size=cfg.organization_cache_max_size,
+    replica=organization_replica,
+    read_your_writes_sec=cfg.db_read_your_writes_sec if cfg.db_replica_hosts else 0.0,
+)
 
 # Инициализация сервисов
+debit_coalescer = None
+if cfg.debit_write_behind_enabled:
+    debit_coalescer = DebitCoalescer(
+        tel=tel,
+        organization_repo=organization_repo,
+        flush_interval_ms=cfg.debit_write_behind_flush_interval_ms,
+        max_batch_size=cfg.debit_write_behind_max_batch_size,
+        check_balance=cfg.check_sufficient_balance,
+    )
+
+organization_loader = None
+if cfg.organization_loader_enabled:
+    organization_loader = OrganizationLoader(
+        tel=tel,
+        organization_repo=organization_repo,
+        max_batch_size=cfg.organization_loader_max_batch_size,
+    )
+
+missing_organization_cache = None
+if cfg.missing_organization_cache_enabled:
+    missing_organization_cache = MissingOrganizationCache(
+        tel=tel,
+        ttl_sec=cfg.missing_organization_cache_ttl_sec,
+        max_size=cfg.missing_organization_cache_max_size,
+    )
+
+organization_cache = None
+if cfg.shared_cache_enabled:
+    organization_cache = OrganizationCache(
+        tel=tel,
+        redis=redis_client,
+        ttl_sec=cfg.shared_cache_ttl_sec,
+        local_ttl_sec=cfg.shared_cache_local_ttl_sec,
+        invalidation_channel=cfg.shared_cache_invalidation_channel,
+        missing_organization_cache=missing_organization_cache,
+    )
+
 organization_service = OrganizationService(
     tel=tel,
     organization_repo=organization_repo,
+    check_sufficient_balance=cfg.check_sufficient_balance,
+    debit_coalescer=debit_coalescer,
+    organization_loader=organization_loader,
+    organization_cache=organization_cache,
+    missing_organization_cache=missing_organization_cache,
 )
 
 # Инициализация контроллеров
-organization_controller = OrganizationController(tel, organization_service, cfg.interserver_secret_key)
+organization_controller = OrganizationController(
+    tel,
+    organization_service,
+    cfg.interserver_secret_key,
+    cfg.balance_batch_max_size,
+    cfg.organizations_stream_chunk_size,
+    cfg.organizations_batch_max_size,
+    cfg.organizations_bulk_max_size,
+)
+
+# Инициализация фоновых обработчиков
+background_workers = []
+if cfg.db_replica_hosts and isinstance(db, PG):
+    # Проверка отставания реплик; до первой проверки чтения идут в primary
+    background_workers.append(db)
+
+if organization_replica is not None:
+    background_workers.append(organization_replica)
+
+if debit_coalescer is not None:
+    background_workers.append(debit_coalescer)
+
+if organization_cache is not None:
+    background_workers.append(organization_cache)
+
+if cfg.balance_stream_enabled:
+    background_workers.append(BalanceStreamConsumer(
+        tel=tel,
+        redis=redis_client,
+        organization_service=organization_service,
+        stream=cfg.balance_stream_name,
+        group=cfg.balance_stream_group,
+        dead_letter_stream=cfg.balance_stream_dead_letter_name,
+        batch_size=cfg.balance_stream_batch_size,
+        block_ms=cfg.balance_stream_block_ms,
+        max_attempts=cfg.balance_stream_max_attempts,
+        claim_min_idle_ms=cfg.balance_stream_claim_min_idle_ms,
+        claim_interval_sec=cfg.balance_stream_claim_interval_sec,
+    ))
 
 # Инициализация middleware
-http_middleware = HttpMiddleware(tel, loom_authorization_client, cfg.prefix, log_context)
+http_middleware = HttpMiddleware(
+    tel,
+    loom_authorization_client,
+    cfg.prefix,
+    log_context,
+    request_deadline=request_deadline,
+    request_timeout_sec=cfg.request_timeout_sec,
+    route_timeouts_sec=cfg.route_timeouts_sec,
+)
 
 app = NewHTTP(
     db=db,
     organization_controller=organization_controller,
     http_middleware=http_middleware,
     prefix=cfg.prefix,
+    background_workers=background_workers,
 )
 
 if __name__ == "__main__":
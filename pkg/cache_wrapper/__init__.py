@@ -0,0 +1 @@
+from pkg.cache_wrapper.cache_wrapper import cached_method, invalidate_cached, LRUCache
\ No newline at end of file
@@ -0,0 +1,225 @@
+import inspect
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable
+
+from opentelemetry import trace
+
+_MISSING = object()
+
+
+# Ограниченный по размеру LRU-кэш с необязательным TTL и инвалидацией по тегу
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, on_evict: Callable[[str], None] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+
+        # ключ -> (момент истечения, тег, значение)
+        self._entries: OrderedDict[Hashable, tuple[float | None, Hashable, Any]] = OrderedDict()
+        self._keys_by_tag: dict[Hashable, set[Hashable]] = {}
+        # Поколения растут при инвалидации: значение, прочитанное до нее, не попадет в кэш.
+        # Поколение тега - отметка общих часов в момент его инвалидации; тегов хранится не больше
+        # maxsize, а у вытесненного и никогда не сброшенного тега поколение - нижняя граница
+        self._generation = 0
+        self._tag_clock = 0
+        self._tag_floor = 0
+        self._tag_generations: OrderedDict[Hashable, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        expires_at, _, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key, "ttl")
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, tag: Hashable = None) -> None:
+        if key in self._entries:
+            self._remove(key, None)
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (expires_at, tag, value)
+        if tag is not None:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.maxsize:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key, "size")
+
+    def generation(self, tag: Hashable = None) -> tuple[int, int]:
+        return self._generation, self._tag_generations.get(tag, self._tag_floor)
+
+    def set_if_generation(self, key: Hashable, value: Any, tag: Hashable, generation: tuple[int, int]) -> bool:
+        if self.generation(tag) != generation:
+            return False
+        self.set(key, value, tag)
+        return True
+
+    def invalidate(self, tag: Hashable = None) -> None:
+        if tag is None:
+            self._generation += 1
+            for key in list(self._entries):
+                self._remove(key, "invalidate")
+            return
+
+        self._tag_clock += 1
+        self._tag_generations[tag] = self._tag_clock
+        self._tag_generations.move_to_end(tag)
+        while len(self._tag_generations) > self.maxsize:
+            # Граница не меньше поколения вытесненного тега, поэтому его поколение не вернется
+            # к значению, снятому до инвалидации; у остальных тегов без записи поколение тоже
+            # сдвинется, и их чтения в полете просто не попадут в кэш
+            _, evicted_generation = self._tag_generations.popitem(last=False)
+            self._tag_floor = max(self._tag_floor, evicted_generation)
+        for key in list(self._keys_by_tag.get(tag, ())):
+            self._remove(key, "invalidate")
+
+    def _remove(self, key: Hashable, reason: str | None) -> None:
+        _, tag, _ = self._entries.pop(key)
+        if tag is not None:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+        if reason is not None and self.on_evict is not None:
+            self.on_evict(reason)
+
+
+class _MethodCache:
+    def __init__(self, owner: Any, name: str, maxsize: int, ttl: float | None):
+        self.name = name
+        self.attributes = {"cache.name": name}
+
+        meter = getattr(owner, "meter", None)
+        self.hits_counter = None
+        self.misses_counter = None
+        self.evictions_counter = None
+        if meter is not None:
+            self.hits_counter = meter.create_counter(
+                name="cache.hits",
+                unit="{request}",
+                description="Обращения к кэшу метода, обслуженные из памяти"
+            )
+            self.misses_counter = meter.create_counter(
+                name="cache.misses",
+                unit="{request}",
+                description="Обращения к кэшу метода, ушедшие в исходный метод"
+            )
+            self.evictions_counter = meter.create_counter(
+                name="cache.evictions",
+                unit="{entry}",
+                description="Вытесненные записи кэша метода по причине: size, ttl, invalidate"
+            )
+
+        self.storage = LRUCache(maxsize=maxsize, ttl=ttl, on_evict=self._record_eviction)
+
+    def record(self, hit: bool) -> None:
+        counter = self.hits_counter if hit else self.misses_counter
+        if counter is not None:
+            counter.add(1, self.attributes)
+
+    def _record_eviction(self, reason: str) -> None:
+        if self.evictions_counter is not None:
+            self.evictions_counter.add(1, {**self.attributes, "reason": reason})
+
+
+def cached_method(
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        tag_param: str = None,
+        exclude_params: set[str] = None
+):
+    # Ключ кэша строится из аргументов вызова, tag_param - аргумент для сброса через invalidate_cached.
+    # Экземпляр переопределяет параметры атрибутами cache_enabled, cache_max_size и cache_ttl
+    if exclude_params is None:
+        exclude_params = {'self', 'cls'}
+
+    def decorator(func: Callable) -> Callable:
+        if not inspect.iscoroutinefunction(func):
+            raise TypeError("cached_method supports only async methods")
+
+        sig = inspect.signature(func)
+
+        @wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            if not getattr(self, "cache_enabled", True):
+                return await func(self, *args, **kwargs)
+
+            method_cache = _get_method_cache(self, func.__name__, maxsize, ttl)
+
+            bound_args = sig.bind(self, *args, **kwargs)
+            bound_args.apply_defaults()
+            key = tuple(
+                (param_name, _make_hashable(param_value))
+                for param_name, param_value in bound_args.arguments.items()
+                if param_name not in exclude_params
+            )
+            tag = _make_hashable(bound_args.arguments.get(tag_param)) if tag_param else None
+
+            span = trace.get_current_span()
+            value = method_cache.storage.get(key, _MISSING)
+            if value is not _MISSING:
+                method_cache.record(hit=True)
+                span.set_attribute("cache.hit", True)
+                return value
+
+            method_cache.record(hit=False)
+            span.set_attribute("cache.hit", False)
+
+            generation = method_cache.storage.generation(tag)
+            result = await func(self, *args, **kwargs)
+            method_cache.storage.set_if_generation(key, result, tag, generation)
+
+            return result
+
+        return async_wrapper
+
+    return decorator
+
+
+def invalidate_cached(instance: Any, method_name: str, tag: Hashable = None) -> None:
+    # Без тега сбрасываются все записи метода
+    method_cache = instance.__dict__.get("_method_caches", {}).get(method_name)
+    if method_cache is None:
+        return
+    method_cache.storage.invalidate(_make_hashable(tag) if tag is not None else None)
+
+
+def _get_method_cache(instance: Any, name: str, maxsize: int, ttl: float | None) -> _MethodCache:
+    method_caches = instance.__dict__.setdefault("_method_caches", {})
+    method_cache = method_caches.get(name)
+    if method_cache is None:
+        method_cache = _MethodCache(
+            owner=instance,
+            name=f"{instance.__class__.__name__}.{name}",
+            maxsize=getattr(instance, "cache_max_size", maxsize),
+            ttl=getattr(instance, "cache_ttl", ttl),
+        )
+        method_caches[name] = method_cache
+    return method_cache
+
+
+def _make_hashable(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_make_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _make_hashable(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return frozenset(_make_hashable(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
@@ -1,3 +1,4 @@
+import time
 from contextvars import ContextVar
 from datetime import datetime, timedelta
 from typing import Optional, Callable
@@ -11,7 +12,7 @@ from tenacity import (
 )
 from opentelemetry import propagate
 
-from internal import interface
+from internal import interface, common
 
 
 class CircuitBreaker:
@@ -141,6 +142,7 @@ class AsyncHTTPClient:
         circuit_breaker_timeout: int = 60,
         logger: Optional[interface.IOtelLogger] = None,
         log_context: Optional[ContextVar[dict]] = None,
+        deadline: Optional[ContextVar[Optional[float]]] = None,
     ):
         protocol = "https" if use_https else "http"
         self.base_url = f"{protocol}://{host}:{port}{prefix}"
@@ -150,6 +152,9 @@ class AsyncHTTPClient:
         self.use_tracing = use_tracing
         self.logger = logger
         self.log_context = log_context
+        # Дедлайн входящего запроса (time.monotonic()): таймаут и повторы укладываются в остаток бюджета
+        self.deadline = deadline
+        self.timeout = timeout
 
         # Retry параметры
         self.retry_attempts = retry_attempts
@@ -203,14 +208,31 @@ class AsyncHTTPClient:
         if self.use_tracing:
             propagate.inject(headers)
 
+        # Передаем остаток бюджета дальше, чтобы upstream тоже не работал впустую
+        remaining = self._remaining()
+        if remaining is not None:
+            headers[common.REQUEST_TIMEOUT_MS_HEADER] = str(max(int(remaining * 1000), 0))
+
         return headers
 
+    def _remaining(self) -> Optional[float]:
+        deadline = self.deadline.get() if self.deadline else None
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
     async def _execute_request(
         self, method: str, url: str, **kwargs
     ) -> httpx.Response:
         headers = self._prepare_headers(kwargs.pop("headers", None))
         cookies = {**self.default_cookies, **kwargs.pop("cookies", {})}
 
+        remaining = self._remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise common.ErrDeadlineExceeded()
+            kwargs["timeout"] = min(kwargs.get("timeout") or self.timeout, remaining)
+
         async def _make_request():
             response = await self.session.request(
                 method, url, headers=headers, cookies=cookies, **kwargs
@@ -229,8 +251,25 @@ class AsyncHTTPClient:
         if self.retry_attempts <= 1:
             return await self._execute_request(method, url, **kwargs)
 
+        last_attempt_duration = 0.0
+
+        def stop_on_deadline(retry_state: RetryCallState) -> bool:
+            # Повтор не начинаем, если пауза и еще одна такая же попытка не успеют до дедлайна
+            remaining = self._remaining()
+            if remaining is None:
+                return False
+            next_wait = min(
+                max(2 ** (retry_state.attempt_number - 1), self.retry_min_wait),
+                self.retry_max_wait
+            )
+            if remaining > next_wait + last_attempt_duration:
+                return False
+            if self.logger:
+                self.logger.warning(f"Request {method} {url} not retried: deadline budget exhausted")
+            return True
+
         retry_strategy = AsyncRetrying(
-            stop=stop_after_attempt(self.retry_attempts),
+            stop=stop_after_attempt(self.retry_attempts) | stop_on_deadline,
             wait=wait_exponential(
                 multiplier=1,
                 min=self.retry_min_wait,
@@ -244,6 +283,7 @@ class AsyncHTTPClient:
         async for attempt in retry_strategy:
             with attempt:
                 attempt_num = attempt.retry_state.attempt_number
+                attempt_started = time.monotonic()
                 try:
                     response = await self._execute_request(method, url, **kwargs)
 
@@ -256,6 +296,7 @@ class AsyncHTTPClient:
                     return response
 
                 except Exception as err:
+                    last_attempt_duration = time.monotonic() - attempt_started
                     if self.logger and attempt_num < self.retry_attempts:
                         self.logger.warning(
                             f"Request {method} {url} failed (attempt {attempt_num}/{self.retry_attempts}): "
@@ -15,6 +15,7 @@ class LoomAuthorizationClient(interface.ILoomAuthorizationClient):
             host: str,
             port: int,
             log_context: ContextVar[dict],
+            request_deadline: ContextVar[float | None] = None,
     ):
         logger = tel.logger()
         self.client = AsyncHTTPClient(
@@ -23,7 +24,8 @@ class LoomAuthorizationClient(interface.ILoomAuthorizationClient):
             prefix="/api/authorization",
             use_tracing=True,
             logger=logger,
-            log_context=log_context
+            log_context=log_context,
+            deadline=request_deadline
         )
         self.tracer = tel.tracer()
 
@@ -0,0 +1,143 @@
+import json
+from typing import Any
+
+
+class Instrument:
+    def add(self, amount, attributes=None):
+        pass
+
+    def record(self, amount, attributes=None):
+        pass
+
+    def set(self, amount, attributes=None):
+        pass
+
+
+class Meter:
+    def create_counter(self, **kwargs):
+        return Instrument()
+
+    def create_histogram(self, **kwargs):
+        return Instrument()
+
+    def create_gauge(self, **kwargs):
+        return Instrument()
+
+
+class Logger:
+    def debug(self, message, fields=None):
+        pass
+
+    def info(self, message, fields=None):
+        pass
+
+    def warning(self, message, fields=None):
+        pass
+
+    def error(self, message, fields=None):
+        pass
+
+
+class Telemetry:
+    def meter(self):
+        return Meter()
+
+    def logger(self):
+        return Logger()
+
+
+class FakeRedisStream:
+    """Стримы и группы потребителей Redis в памяти: PEL, XACK, XAUTOCLAIM по времени простоя."""
+
+    def __init__(self):
+        self.streams: dict[str, list[tuple[str, dict]]] = {}
+        # (stream, group) -> последний выданный номер записи и PEL: id -> [consumer, delivered_at_ms]
+        self.groups: dict[tuple[str, str], dict] = {}
+        self.now_ms = 0
+        self._sequence = 0
+
+    def advance(self, ms: int) -> None:
+        self.now_ms += ms
+
+    def entries(self, stream: str) -> list[tuple[str, dict]]:
+        return list(self.streams.get(stream, []))
+
+    def pending(self, stream: str, group: str) -> dict[str, str]:
+        return {entry_id: consumer for entry_id, (consumer, _) in self.groups[(stream, group)]["pel"].items()}
+
+    async def xadd(self, stream: str, fields: dict, maxlen: int = None) -> str:
+        self._sequence += 1
+        entry_id = f"{self._sequence}-0"
+        self.streams.setdefault(stream, []).append((entry_id, {
+            key: value if isinstance(value, str) else json.dumps(value) for key, value in fields.items()
+        }))
+        return entry_id
+
+    async def xgroup_create(self, stream: str, group: str, start_id: str = "0") -> None:
+        self.streams.setdefault(stream, [])
+        self.groups.setdefault((stream, group), {"last": _sequence(start_id), "pel": {}})
+
+    async def xreadgroup(
+            self,
+            stream: str,
+            group: str,
+            consumer: str,
+            start_id: str = ">",
+            count: int = 100,
+            block_ms: int = None
+    ) -> list[tuple[str, dict]]:
+        state = self.groups[(stream, group)]
+        if start_id == ">":
+            entries = [entry for entry in self.streams[stream] if _sequence(entry[0]) > state["last"]][:count]
+            for entry_id, _ in entries:
+                state["last"] = _sequence(entry_id)
+                state["pel"][entry_id] = [consumer, self.now_ms]
+            return entries
+
+        # Повторное чтение своего PEL
+        return [
+            entry for entry in self.streams[stream]
+            if _sequence(entry[0]) > _sequence(start_id)
+            and state["pel"].get(entry[0], [None])[0] == consumer
+        ][:count]
+
+    async def xack(self, stream: str, group: str, *entry_ids: str) -> int:
+        pel = self.groups[(stream, group)]["pel"]
+        return sum(pel.pop(entry_id, None) is not None for entry_id in entry_ids)
+
+    async def xautoclaim(
+            self,
+            stream: str,
+            group: str,
+            consumer: str,
+            min_idle_ms: int,
+            start_id: str = "0-0",
+            count: int = 100
+    ) -> tuple[str, list[tuple[str, dict]]]:
+        pel = self.groups[(stream, group)]["pel"]
+        claimed = []
+        for entry_id, fields in self.streams[stream]:
+            if len(claimed) == count:
+                return entry_id, claimed
+            owner = pel.get(entry_id)
+            if owner is None or _sequence(entry_id) < _sequence(start_id):
+                continue
+            if self.now_ms - owner[1] >= min_idle_ms:
+                pel[entry_id] = [consumer, self.now_ms]
+                claimed.append((entry_id, fields))
+        return "0-0", claimed
+
+    async def xinfo_groups(self, stream: str) -> list[dict[str, Any]]:
+        return [
+            {
+                "name": group,
+                "pending": len(state["pel"]),
+                "lag": sum(_sequence(entry_id) > state["last"] for entry_id, _ in self.streams[stream]),
+            }
+            for (group_stream, group), state in self.groups.items()
+            if group_stream == stream
+        ]
+
+
+def _sequence(entry_id: str) -> int:
+    return int(entry_id.split("-")[0])
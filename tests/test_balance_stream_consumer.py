@@ -0,0 +1,181 @@
+import asyncio
+
+from fakes import FakeRedisStream, Telemetry
+from internal import model
+from internal.controller.redis_stream.balance.consumer import BalanceStreamConsumer
+
+STREAM = "debits"
+GROUP = "organization"
+DEAD_LETTER = "debits:dead-letter"
+
+
+class _Service:
+    def __init__(self, failing_organization_ids=(), fail_times: int = 0):
+        self.failing_organization_ids = set(failing_organization_ids)
+        self.fail_times = fail_times
+        self.applied: list[model.BalanceBatchOperation] = []
+
+    async def apply_balance_batch(self, operations):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("database unavailable")
+        if any(operation.organization_id in self.failing_organization_ids for operation in operations):
+            raise RuntimeError("invalid input for batch")
+
+        self.applied.extend(operations)
+        return [
+            model.BalanceBatchResult(
+                organization_id=operation.organization_id,
+                idempotency_key=operation.idempotency_key,
+                status=model.BALANCE_BATCH_STATUS_APPLIED
+            )
+            for operation in operations
+        ]
+
+
+def _consumer(redis, service, consumer="worker-1", max_attempts=3):
+    return BalanceStreamConsumer(
+        tel=Telemetry(),
+        redis=redis,
+        organization_service=service,
+        stream=STREAM,
+        group=GROUP,
+        dead_letter_stream=DEAD_LETTER,
+        max_attempts=max_attempts,
+        consumer=consumer,
+        claim_min_idle_ms=1000,
+    )
+
+
+async def _deliver(redis, consumer, start_id=">"):
+    entries = await redis.xreadgroup(STREAM, GROUP, consumer.consumer, start_id=start_id)
+    await consumer._process(entries)
+
+
+async def _setup(*messages):
+    redis = FakeRedisStream()
+    await redis.xgroup_create(STREAM, GROUP)
+    for fields in messages:
+        await redis.xadd(STREAM, fields)
+    return redis
+
+
+def _dead_letter_errors(redis):
+    return {fields["source_id"]: fields["error"] for _, fields in redis.entries(DEAD_LETTER)}
+
+
+def test_applied_messages_are_acked():
+    async def scenario():
+        redis = await _setup(
+            {"organization_id": "1", "amount_rub": "10.5", "idempotency_key": "a"},
+            {"organization_id": "2", "amount_rub": "3"},
+        )
+        service = _Service()
+        await _deliver(redis, _consumer(redis, service))
+        return redis, service
+
+    redis, service = asyncio.run(scenario())
+
+    assert [(operation.organization_id, str(operation.delta_rub)) for operation in service.applied] == [
+        (1, "-10.5"), (2, "-3")
+    ]
+    # Ключ по умолчанию - id записи стрима
+    assert service.applied[1].idempotency_key == f"{STREAM}:2-0"
+    assert redis.pending(STREAM, GROUP) == {}
+    assert redis.entries(DEAD_LETTER) == []
+
+
+def test_failed_batch_stays_pending_and_is_retried():
+    async def scenario():
+        redis = await _setup({"organization_id": "1", "amount_rub": "1"})
+        # Падают и батч, и поштучное применение
+        service = _Service(fail_times=2)
+        consumer = _consumer(redis, service)
+
+        try:
+            await _deliver(redis, consumer)
+        except RuntimeError:
+            pass
+        pending_after_failure = redis.pending(STREAM, GROUP)
+
+        await _deliver(redis, consumer, start_id="0")
+        return redis, service, pending_after_failure
+
+    redis, service, pending_after_failure = asyncio.run(scenario())
+
+    assert pending_after_failure == {"1-0": "worker-1"}
+    assert len(service.applied) == 1
+    assert redis.pending(STREAM, GROUP) == {}
+
+
+def test_message_exceeding_max_attempts_goes_to_dead_letter():
+    async def scenario():
+        redis = await _setup({"organization_id": "1", "amount_rub": "1"})
+        service = _Service(failing_organization_ids={1})
+        consumer = _consumer(redis, service, max_attempts=2)
+
+        for start_id in (">", "0"):
+            try:
+                await _deliver(redis, consumer, start_id=start_id)
+            except RuntimeError:
+                pass
+        return redis
+
+    redis = asyncio.run(scenario())
+
+    assert _dead_letter_errors(redis) == {"1-0": "max attempts exceeded"}
+    assert redis.pending(STREAM, GROUP) == {}
+
+
+def test_poison_message_does_not_hold_the_batch():
+    async def scenario():
+        redis = await _setup(
+            {"organization_id": "1", "amount_rub": "1"},
+            {"organization_id": "13", "amount_rub": "1"},
+            {"organization_id": "99999999999", "amount_rub": "1"},
+            {"organization_id": "2", "amount_rub": "-5"},
+            {"organization_id": "3", "amount_rub": "NaN"},
+            {"organization_id": "4", "amount_rub": "2"},
+        )
+        service = _Service(failing_organization_ids={13})
+        consumer = _consumer(redis, service)
+
+        try:
+            await _deliver(redis, consumer)
+        except RuntimeError:
+            pass
+        return redis, service
+
+    redis, service = asyncio.run(scenario())
+
+    assert sorted(operation.organization_id for operation in service.applied) == [1, 4]
+    # Значения вне диапазона отсеиваются до запроса в БД
+    assert _dead_letter_errors(redis) == {
+        "3-0": "invalid message: organization_id out of range",
+        "4-0": "invalid message: amount_rub out of range",
+        "5-0": "invalid message: amount_rub out of range",
+    }
+    # Сообщение, которое падает в БД, ждет повтора одно
+    assert redis.pending(STREAM, GROUP) == {"2-0": "worker-1"}
+
+
+def test_entries_of_dead_consumer_are_claimed():
+    async def scenario():
+        redis = await _setup({"organization_id": "1", "amount_rub": "1"})
+        service = _Service()
+        await redis.xreadgroup(STREAM, GROUP, "crashed-worker", start_id=">")
+
+        consumer = _consumer(redis, service)
+        await consumer._claim_stale()
+        not_yet_idle = list(service.applied)
+
+        redis.advance(1000)
+        consumer._claimed_at = float("-inf")
+        await consumer._claim_stale()
+        return redis, service, not_yet_idle
+
+    redis, service, not_yet_idle = asyncio.run(scenario())
+
+    assert not_yet_idle == []
+    assert [operation.organization_id for operation in service.applied] == [1]
+    assert redis.pending(STREAM, GROUP) == {}
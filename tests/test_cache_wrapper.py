@@ -0,0 +1,25 @@
+from pkg.cache_wrapper import LRUCache
+
+
+def test_tag_generations_are_bounded():
+    cache = LRUCache(maxsize=2)
+    for tag in range(100):
+        cache.set(tag, "value", tag)
+        cache.invalidate(tag)
+
+    assert len(cache._tag_generations) == 2
+
+
+def test_read_started_before_invalidation_of_evicted_tag_is_not_cached():
+    cache = LRUCache(maxsize=2)
+    generation = cache.generation("a")
+
+    # Инвалидация тега и его вытеснение другими тегами
+    cache.invalidate("a")
+    cache.invalidate("b")
+    cache.invalidate("c")
+
+    assert "a" not in cache._tag_generations
+    assert not cache.set_if_generation("key", "stale", "a", generation)
+    assert cache.set_if_generation("key", "fresh", "a", cache.generation("a"))
+    assert cache.get("key") == "fresh"
@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+from internal.service.organization.organization_loader import OrganizationLoader
+
+
+class _Instrument:
+    def add(self, amount, attributes=None):
+        pass
+
+    def record(self, amount, attributes=None):
+        pass
+
+
+class _Meter:
+    def create_counter(self, **kwargs):
+        return _Instrument()
+
+    def create_histogram(self, **kwargs):
+        return _Instrument()
+
+
+class _Logger:
+    def error(self, message, fields=None):
+        pass
+
+
+class _Telemetry:
+    def meter(self):
+        return _Meter()
+
+    def logger(self):
+        return _Logger()
+
+
+class _Repo:
+    def __init__(self):
+        self.calls = []
+
+    async def get_organizations_by_ids(self, organization_ids, fields=None):
+        self.calls.append(list(organization_ids))
+        await asyncio.sleep(0)
+        return [SimpleNamespace(id=organization_id) for organization_id in organization_ids]
+
+
+def test_clear_before_dispatch_resolves_waiters():
+    async def scenario():
+        repo = _Repo()
+        loader = OrganizationLoader(_Telemetry(), repo)
+
+        first = asyncio.create_task(loader.load(5))
+        await asyncio.sleep(0)
+        # Запись завершилась в том же витке, до отправки пачки
+        loader.clear(5)
+        second = asyncio.create_task(loader.load(5))
+
+        results = await asyncio.wait_for(asyncio.gather(first, second), timeout=1)
+        return repo, loader, results
+
+    repo, loader, results = asyncio.run(scenario())
+
+    assert [organization.id for organization in results] == [5, 5]
+    # Чтение после записи не присоединяется к запросу, начатому до нее
+    assert repo.calls == [[5], [5]]
+    assert loader._in_flight == {}